@@ -0,0 +1,301 @@
+"""
+WebSocket Load Generator
+Opens many concurrent research clients against ResearchWebSocketServer and
+replays a query mix to measure connection ceiling, latency and server memory.
+Each query carries a "ref" the server echoes, so replies are matched to the
+query that caused them; pushes and late replies are counted, not timed.
+
+Usage:
+    python backend/load_test.py --url ws://localhost:5001 --clients 1000 --duration 3600 --queries queries.jsonl
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from pathlib import Path
+from typing import Dict, Any, List
+
+import websockets
+
+from roma_agents import wire_codec
+
+DEFAULT_QUERIES = [
+    "btc price",
+    "eth price",
+    "check sol",
+    "bitcoin news",
+    "crypto news today",
+    "what is ethereum",
+    "should i buy btc",
+    "btc vs eth",
+]
+
+
+def load_queries(path: str) -> List[str]:
+    """Load a query mix from a JSONL file (query/content/title/body fields) or plain text lines"""
+    if not path:
+        return list(DEFAULT_QUERIES)
+
+    queries = []
+    for line in Path(path).read_text(encoding='utf-8').splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            queries.append(line)
+            continue
+        if isinstance(record, dict):
+            for field in ('query', 'content', 'title', 'body'):
+                if record.get(field):
+                    queries.append(str(record[field]))
+                    break
+        elif isinstance(record, str):
+            queries.append(record)
+    return queries or list(DEFAULT_QUERIES)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (0 for empty input)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values) if values else 0.0,
+    }
+
+
+class LoadGenerator:
+    """Drives N concurrent WebSocket clients and collects latency/memory samples"""
+
+    def __init__(self, url: str, clients: int, duration: float, queries: List[str],
+                 ramp: float = 10.0, think_time: float = 5.0, timeout: float = 60.0,
+                 stats_interval: float = 10.0, subprotocol: str = None):
+        self.url = url
+        self.clients = clients
+        self.duration = duration
+        self.queries = queries
+        self.ramp = ramp
+        self.think_time = think_time
+        self.timeout = timeout
+        self.stats_interval = stats_interval
+        self.subprotocols = [subprotocol] if subprotocol else None
+
+        self.connect_times: List[float] = []
+        self.latencies: List[float] = []
+        self.frame_sizes: List[int] = []
+        self.loop_lags: List[float] = []
+        self.server_samples: List[Dict[str, Any]] = []
+        self.open_connections = 0
+        self.peak_connections = 0
+        self.connect_errors = 0
+        self.request_errors = 0
+        self.busy = 0
+        self.timeouts = 0
+        self.unsolicited = 0  # pushes (price_update, image_job...) and late replies to earlier queries
+        self._stop_at = 0.0
+
+    async def run(self) -> Dict[str, Any]:
+        """Run the load test and return the final report"""
+        print(f"[LOAD] Target: {self.url} | Clients: {self.clients} | Duration: {self.duration}s | Queries: {len(self.queries)}")
+        self._stop_at = time.monotonic() + self.duration
+
+        monitors = [
+            asyncio.create_task(self._measure_loop_lag()),
+            asyncio.create_task(self._poll_server_stats()),
+            asyncio.create_task(self._print_progress()),
+        ]
+        workers = []
+        for i in range(self.clients):
+            delay = self.ramp * i / max(1, self.clients)
+            workers.append(asyncio.create_task(self._client(i, delay)))
+
+        await asyncio.gather(*workers, return_exceptions=True)
+        for task in monitors:
+            task.cancel()
+        await asyncio.gather(*monitors, return_exceptions=True)
+        return self.report()
+
+    async def _client(self, index: int, delay: float):
+        """One simulated user: connect, then send queries with think time until the deadline"""
+        await asyncio.sleep(delay)
+        user = f"load-{index:06d}"
+        rng = random.Random(index)
+
+        start = time.monotonic()
+        try:
+            websocket = await asyncio.wait_for(
+                websockets.connect(
+                    self.url, max_size=None, subprotocols=self.subprotocols,
+                    # Admission limits are per client address: give each simulated user its own
+                    additional_headers={'X-Forwarded-For': f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}"}
+                ), self.timeout
+            )
+        except Exception as e:
+            self.connect_errors += 1
+            if self.connect_errors <= 5:
+                print(f"[LOAD] Connect error ({user}): {e}")
+            return
+        self.connect_times.append(time.monotonic() - start)
+        self.open_connections += 1
+        self.peak_connections = max(self.peak_connections, self.open_connections)
+
+        try:
+            sequence = 0
+            while time.monotonic() < self._stop_at:
+                sequence += 1
+                ref = f"{user}-{sequence}"
+                message = {
+                    'type': 'research_request',
+                    'tool': 'research',
+                    'content': rng.choice(self.queries),
+                    'user': user,
+                    'ref': ref,
+                }
+                sent_at = time.monotonic()
+                await websocket.send(wire_codec.encode(message, websocket.subprotocol))
+                reply = await self._await_reply(websocket, ref, sent_at + self.timeout)
+                if reply is None:
+                    self.timeouts += 1
+                else:
+                    frame, data = reply
+                    if data.get('type') == 'busy':
+                        self.busy += 1  # load shedding is not a fast success
+                    elif data.get('type') == 'error' or data.get('has_error'):
+                        self.request_errors += 1
+                    else:
+                        self.latencies.append(time.monotonic() - sent_at)
+                        self.frame_sizes.append(len(frame.encode('utf-8') if isinstance(frame, str) else frame))
+                await asyncio.sleep(rng.expovariate(1 / self.think_time) if self.think_time > 0 else 0)
+        except websockets.exceptions.ConnectionClosed:
+            self.request_errors += 1
+        finally:
+            self.open_connections -= 1
+            await websocket.close()
+
+    async def _await_reply(self, websocket, ref: str, deadline: float):
+        """Drain frames until the reply carrying this ref arrives; None on timeout"""
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                frame = await asyncio.wait_for(websocket.recv(), remaining)
+            except asyncio.TimeoutError:
+                return None
+            try:
+                data = wire_codec.decode(frame)
+            except ValueError:
+                self.request_errors += 1
+                continue
+            if isinstance(data, dict) and data.get('ref') == ref:
+                return frame, data
+            self.unsolicited += 1
+
+    async def _measure_loop_lag(self, interval: float = 0.1):
+        """Client-side event-loop lag, so a saturated generator doesn't get blamed on the server"""
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            self.loop_lags.append(max(0.0, time.monotonic() - expected))
+
+    async def _poll_server_stats(self):
+        """Sample server memory and state sizes over a dedicated control connection"""
+        try:
+            async with websockets.connect(self.url, max_size=None) as websocket:
+                while True:
+                    await websocket.send(json.dumps({'type': 'stats'}))
+                    reply = json.loads(await asyncio.wait_for(websocket.recv(), self.timeout))
+                    if reply.get('type') == 'stats':
+                        reply['elapsed'] = self.duration - (self._stop_at - time.monotonic())
+                        self.server_samples.append(reply)
+                    await asyncio.sleep(self.stats_interval)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[LOAD] Server stats unavailable: {e}")
+
+    async def _print_progress(self):
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            latest = self.server_samples[-1] if self.server_samples else {}
+            print(f"[LOAD] open={self.open_connections} peak={self.peak_connections} "
+                  f"responses={len(self.latencies)} p95={percentile(self.latencies[-1000:], 95):.3f}s "
+                  f"timeouts={self.timeouts} busy={self.busy} errors={self.request_errors} "
+                  f"server_rss={latest.get('rss_bytes', 0) / 1e6:.1f}MB "
+                  f"history_users={latest.get('conversation_users', 'n/a')}")
+
+    def report(self) -> Dict[str, Any]:
+        memory = [s.get('rss_bytes', 0) for s in self.server_samples]
+        history = [s.get('conversation_users', 0) for s in self.server_samples]
+        return {
+            'url': self.url,
+            'clients': self.clients,
+            'duration': self.duration,
+            'peak_connections': self.peak_connections,
+            'connect_errors': self.connect_errors,
+            'request_errors': self.request_errors,
+            'busy': self.busy,
+            'timeouts': self.timeouts,
+            'unsolicited_frames': self.unsolicited,
+            'connect_time': summarize(self.connect_times),
+            'latency': summarize(self.latencies),
+            'frame_bytes': summarize([float(s) for s in self.frame_sizes]),
+            'client_loop_lag': summarize(self.loop_lags),
+            'server_rss_start': memory[0] if memory else None,
+            'server_rss_end': memory[-1] if memory else None,
+            'server_rss_growth': (memory[-1] - memory[0]) if len(memory) > 1 else None,
+            'conversation_users_end': history[-1] if history else None,
+            'server_samples': self.server_samples,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket load generator for ResearchWebSocketServer")
+    parser.add_argument('--url', default='ws://localhost:5001')
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=60.0, help="Seconds to keep sending (use hours for soak tests)")
+    parser.add_argument('--ramp', type=float, default=10.0, help="Seconds over which clients connect")
+    parser.add_argument('--think-time', type=float, default=5.0, help="Mean seconds between a client's queries")
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--stats-interval', type=float, default=10.0)
+    parser.add_argument('--queries', default='', help="JSONL/text file with the query mix")
+    parser.add_argument('--subprotocol', default='', help="Request a wire encoding, e.g. roma.msgpack")
+    parser.add_argument('--report', default='', help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    generator = LoadGenerator(
+        url=args.url,
+        clients=args.clients,
+        duration=args.duration,
+        queries=load_queries(args.queries),
+        ramp=args.ramp,
+        think_time=args.think_time,
+        timeout=args.timeout,
+        stats_interval=args.stats_interval,
+        subprotocol=args.subprotocol or None,
+    )
+    report = asyncio.run(generator.run())
+
+    summary = {k: v for k, v in report.items() if k != 'server_samples'}
+    print("=" * 60)
+    print(json.dumps(summary, indent=2))
+    print("=" * 60)
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2), encoding='utf-8')
+        print(f"[LOAD] Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
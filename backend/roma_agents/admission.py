@@ -0,0 +1,234 @@
+"""
+Admission Control
+Bounds the work the WebSocket edge accepts before it reaches ROMA:
+- per-client token bucket (request rate) and per-client concurrency, keyed on
+  the client address so reconnecting doesn't refill the bucket (the 'user'
+  field is client-supplied and shared by every visitor of the web app, so it
+  is only a log label); a client's tabs/connections share one budget
+- a global token bucket capping the total request rate
+- global concurrency with a reserved share for cheap work: heavy classes
+  (ROMA planning, images) may only hold ADMISSION_HEAVY_SHARE of the slots
+- a short priority wait queue (cheap < standard < roma < image)
+- graceful degradation: when heavy slots are full but the server isn't,
+  ROMA queries run as a single atomic step instead of a full plan
+Rejected requests get an immediate decision with a retry_after hint.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import re
+import time
+from typing import Dict, Any
+
+from roma_agents.atomizer import keyword_is_atomic
+
+MAX_BUCKETS = 10000  # idle (refilled) client buckets are pruned above this
+
+PRIORITIES = {'cheap': 0, 'standard': 1, 'roma': 2, 'image': 3}
+HEAVY = {'roma', 'image'}
+
+# Initial per-class service time guesses (seconds), refined by an EWMA
+DEFAULT_LATENCY = {'cheap': 1.0, 'standard': 3.0, 'roma': 15.0, 'image': 5.0}
+
+_IMAGE_RE = re.compile(
+    r'\b(create|generate|make)\b.*\b(image|picture|art|logo|meme)\b|\bdraw\b|\b(image|picture|logo) of\b'
+    r'|\btao (hinh|anh)\b|tạo (hình|ảnh)|\bvẽ\b',
+    re.IGNORECASE
+)
+_CHEAP_RE = re.compile(r'\b(price|gia|giá|cost|value|news|tin tuc|tin tức)\b', re.IGNORECASE)
+
+
+def classify_priority(query: str) -> str:
+    """Cheap, local guess of how expensive a query will be (no LLM call)"""
+    if _IMAGE_RE.search(query):
+        return 'image'
+    atomic, _ = keyword_is_atomic(query)
+    if not atomic:
+        return 'roma'
+    if _CHEAP_RE.search(query):
+        return 'cheap'
+    return 'standard'
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consume one token; returns 0 on success, else seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def idle(self, now: float) -> bool:
+        """Refilled to burst: forgetting it changes nothing for the client"""
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int = None, heavy_share: float = None, per_user: int = None,
+                 user_rate: float = None, user_burst: float = None, global_rate: float = None, global_burst: float = None,
+                 max_wait: float = None, max_waiters: int = None):
+        self.max_concurrent = max_concurrent or int(os.getenv('ADMISSION_MAX_CONCURRENT', 32))
+        self.heavy_limit = max(1, int(self.max_concurrent * (heavy_share or float(os.getenv('ADMISSION_HEAVY_SHARE', 0.5)))))
+        self.per_user = per_user or int(os.getenv('ADMISSION_PER_USER', 2))
+        self.user_rate = user_rate or float(os.getenv('ADMISSION_USER_RATE', 1.0))
+        self.user_burst = user_burst or float(os.getenv('ADMISSION_USER_BURST', 5))
+        self.global_bucket = TokenBucket(global_rate or float(os.getenv('ADMISSION_GLOBAL_RATE', 20)),
+                                         global_burst or float(os.getenv('ADMISSION_GLOBAL_BURST', 40)))
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv('ADMISSION_MAX_WAIT', 2.0))
+        self.max_waiters = max_waiters or int(os.getenv('ADMISSION_MAX_WAITERS', 100))
+
+        self.in_flight = 0
+        self.heavy_in_flight = 0
+        self.user_in_flight: Dict[str, int] = {}
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.latency = dict(DEFAULT_LATENCY)
+        self._waiters = []  # heap of (priority, seq, future, cls)
+        self._seq = itertools.count()
+
+        self.admitted = {cls: 0 for cls in PRIORITIES}
+        self.rejected: Dict[str, int] = {}
+        self.degraded = 0
+
+    def _can_start(self, cls: str) -> bool:
+        if self.in_flight >= self.max_concurrent:
+            return False
+        return cls not in HEAVY or self.heavy_in_flight < self.heavy_limit
+
+    def _start(self, cls: str):
+        self.in_flight += 1
+        if cls in HEAVY:
+            self.heavy_in_flight += 1
+
+    def _reject(self, user: str, cls: str, reason: str, retry_after: float) -> Dict[str, Any]:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        print(f"[ADMISSION] Busy ({reason}) client={user} class={cls} retry_after={retry_after:.1f}s")
+        return {'admitted': False, 'reason': reason, 'priority': cls, 'retry_after': round(min(30.0, max(1.0, retry_after)), 1)}
+
+    async def acquire(self, user: str, cls: str, label: str = None) -> Dict[str, Any]:
+        """
+        user is the rate/concurrency key (one per client address); label is only logged.
+        Returns {'admitted': True, 'degraded': bool, ...} or a rejection with retry_after
+        """
+        user_log = f"{user} ({label[:16]})" if label else user
+        bucket = self.buckets.get(user)
+        if bucket is None:
+            if len(self.buckets) >= MAX_BUCKETS:
+                self._prune()
+            bucket = self.buckets[user] = TokenBucket(self.user_rate, self.user_burst)
+        wait = bucket.take()
+        if wait:
+            return self._reject(user_log, cls, 'rate_limited', wait)
+        wait = self.global_bucket.take()
+        if wait:
+            bucket.refund()  # the server was full, not this client
+            return self._reject(user_log, cls, 'global_rate_limited', wait)
+
+        if self.user_in_flight.get(user, 0) >= self.per_user:
+            return self._reject(user_log, cls, 'user_concurrency', self.latency[cls])
+
+        run_as = cls
+        if not self._can_start(cls) and cls == 'roma' and self._can_start('standard'):
+            # Heavy slots are full: answer with one atomic step instead of a plan
+            run_as = 'standard'
+            self.degraded += 1
+
+        if not self._can_start(run_as):
+            if self.max_wait <= 0 or len(self._waiters) >= self.max_waiters:
+                return self._reject(user_log, cls, 'overloaded', self._retry_hint(cls))
+            future = asyncio.get_running_loop().create_future()
+            entry = (PRIORITIES[run_as], next(self._seq), future, run_as)
+            heapq.heappush(self._waiters, entry)
+            self.user_in_flight[user] = self.user_in_flight.get(user, 0) + 1
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                cancelled = isinstance(e, asyncio.CancelledError)
+                if future.done():
+                    # Admitted right at the deadline; a cancelled caller hands the slot back
+                    if cancelled:
+                        self.release({'admitted': True, 'user': user, 'run_as': run_as, 'started': time.monotonic()})
+                        raise
+                else:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._decrement_user(user)
+                    if cancelled:
+                        raise
+                    return self._reject(user_log, cls, 'overloaded', self._retry_hint(cls))
+            # _wake() already counted the slot for us
+        else:
+            self._start(run_as)
+            self.user_in_flight[user] = self.user_in_flight.get(user, 0) + 1
+
+        self.admitted[cls] += 1
+        return {'admitted': True, 'user': user, 'priority': cls, 'run_as': run_as,
+                'degraded': run_as != cls, 'started': time.monotonic()}
+
+    def release(self, decision: Dict[str, Any]):
+        if not decision.get('admitted'):
+            return
+        run_as = decision['run_as']
+        self.in_flight -= 1
+        if run_as in HEAVY:
+            self.heavy_in_flight -= 1
+        self._decrement_user(decision['user'])
+
+        elapsed = time.monotonic() - decision['started']
+        self.latency[run_as] = 0.8 * self.latency[run_as] + 0.2 * elapsed
+        self._wake()
+
+    def _prune(self):
+        now = time.monotonic()
+        self.buckets = {user: bucket for user, bucket in self.buckets.items() if not bucket.idle(now)}
+
+    def _decrement_user(self, user: str):
+        remaining = self.user_in_flight.get(user, 0) - 1
+        if remaining > 0:
+            self.user_in_flight[user] = remaining
+        else:
+            self.user_in_flight.pop(user, None)
+
+    def _wake(self):
+        """Hand free slots to waiters in priority order; a blocked heavy waiter doesn't block cheap ones"""
+        for entry in sorted(self._waiters):
+            if self.in_flight >= self.max_concurrent:
+                break
+            _, _, future, cls = entry
+            if self._can_start(cls) and not future.done():
+                self._waiters.remove(entry)
+                self._start(cls)
+                future.set_result(True)
+        heapq.heapify(self._waiters)
+
+    def _retry_hint(self, cls: str) -> float:
+        """Rough time until a slot frees up for this class"""
+        ahead = 1 + sum(1 for p, *_ in self._waiters if p <= PRIORITIES[cls])
+        slots = self.heavy_limit if cls in HEAVY else self.max_concurrent
+        return self.latency[cls] * ahead / slots
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'in_flight': self.in_flight,
+            'heavy_in_flight': self.heavy_in_flight,
+            'waiting': len(self._waiters),
+            'max_concurrent': self.max_concurrent,
+            'clients': len(self.buckets),
+            'heavy_limit': self.heavy_limit,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'degraded': self.degraded,
+            'latency_ewma': {k: round(v, 2) for k, v in self.latency.items()}
+        }
@@ -1,12 +1,22 @@
 import asyncio
 import aiohttp
+import calendar
 import json
 import os
+import time
 from typing import Dict, Any, List
-from dotenv import load_dotenv
+from roma_agents import providers
+from roma_agents.batch_router import BatchRouter
+from roma_agents.feed_scheduler import CORE_FEEDS
+from roma_agents.headline_scorer import HeadlineScorer, aggregate as headline_tone
+from roma_agents.llm_router import LLMRouter
+from roma_agents.news_clusters import NewsClusterIndex, source_of
+from roma_agents.prompts import PROMPTS, TokenUsage
+from roma_agents.warm_cache import TTLCache, normalize_key
+
+# Load environment variables from .env file (no-op if the server already did)
+providers.load_env()
 
-# Load environment variables from .env file
-load_dotenv()  # Load API keys from .env
 
 class APIIntegrations:
     def __init__(self):
@@ -16,6 +26,26 @@ class APIIntegrations:
         self.fal_api_key = os.getenv('FAL_API_KEY')
         self.gemini_api_key = os.getenv('GOOGLE_API_KEY')  # Railway uses GOOGLE_API_KEY
         
+        self.token_usage = TokenUsage()  # Per-stage prompt/completion tokens
+        self.llm = LLMRouter(self.openai_api_key, self.gemini_api_key)  # Picks the provider per call by latency/cost
+        
+        # combined: one LLM call returns route + entities; separate: route, then extract coin
+        self.router_mode = os.getenv('ROUTER_MODE', 'combined').lower()
+        
+        # In-memory caches (persisted across restarts by WarmCacheSnapshot)
+        self.price_cache = TTLCache('prices', float(os.getenv('PRICE_CACHE_TTL', 30)))
+        self.news_cache = TTLCache('news', float(os.getenv('NEWS_CACHE_TTL', 300)), capacity=200)
+        self.coin_index = TTLCache('coin_index', float(os.getenv('COIN_INDEX_TTL', 7 * 24 * 3600)), capacity=5000)
+        
+        # Local sentiment/event scoring of headlines at ingestion (no LLM)
+        self.headline_scorer = HeadlineScorer()
+        # Syndicated copies of one story collapse into a cluster (MinHash/LSH over title shingles)
+        self.news_clusters = NewsClusterIndex()
+        self.feed_scheduler = None  # FeedScheduler, set by the server when feeds are polled in the background
+        
+        # Opt-in: coalesce concurrent routing calls into one LLM request
+        self.batch_router = BatchRouter(self) if os.getenv('ROUTER_BATCH', '').lower() in ('1', 'true', 'yes') else None
+        
         # Debug: Check if keys are loaded
         print("[DEBUG] API Keys Status:")
         print(f"  GOOGLE_API_KEY: {'Loaded (' + self.gemini_api_key[:20] + '...)' if self.gemini_api_key else 'NOT FOUND'}")
@@ -31,116 +61,128 @@ class APIIntegrations:
         print(f"  🎨 fal.ai Image: {'✓' if self.fal_api_key else '✗'}")
         print("============================================================")
 
-    async def analyze_context_with_openai(self, query: str) -> Dict[str, Any]:
-        """BRAIN: OpenAI routes queries and decides what info to send to other functions"""
-        if not self.openai_api_key:
+    async def route_query(self, query: str) -> Dict[str, Any]:
+        """Route a query, through the batch router when ROUTER_BATCH is enabled"""
+        if self.batch_router is not None and self.openai_api_key:
+            return await self.batch_router.route(query)
+        return await self.route_single(query)
+
+    async def route_single(self, query: str) -> Dict[str, Any]:
+        """One unbatched routing call in the configured ROUTER_MODE (also the batch fallback)"""
+        if self.router_mode == 'combined':
+            return await self.classify_query_with_openai(query)
+        return await self.analyze_context_with_openai(query)
+
+    async def classify_query_with_openai(self, query: str) -> Dict[str, Any]:
+        """BRAIN (combined mode): route + coin IDs/timeframe/image description in a single call"""
+        if not self.llm.available('routing'):
             return {'success': False, 'error': 'OpenAI API key required for routing', 'api_source': 'None'}
         
-        print(f"[API CALL] OpenAI: Analyzing context for query: {query[:50]}...")
+        print(f"[API CALL] LLM: Classifying (route + entities) query: {query[:50]}...")
         
-        url = "https://api.openai.com/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {self.openai_api_key}",
-            "Content-Type": "application/json"
-        }
+        user_content = f"Query: {query}"
+        try:
+            response = await self.llm.complete(
+                'routing', PROMPTS.messages('route_extract', user_content), max_tokens=200, temperature=0.1, json_mode=True
+            )
+            if response['success']:
+                self.token_usage.record('route_extract', response, response['latency'], PROMPTS.estimate('route_extract', user_content))
+                result = json.loads(response['content'])
+                print(f"[BRAIN] {response['api_source']} combined result: {result}")
+                return self.combined_route_result(result, 'OpenAI Brain (combined)')
+            print(f"[API CALL] LLM: Combined classify failed ({response.get('error')}), using separate routing")
+        except Exception as e:
+            print(f"[API CALL] LLM: Combined classify failed ({str(e)}), using separate routing")
         
-        system_prompt = """You are an AI routing expert. Route queries to the most appropriate API.
-
-Available APIs:
-1. CoinGecko - ONLY for specific price/market cap/volume queries: "price", "giá", "market cap"
-2. Perplexity AI - For explanations, definitions, deep analysis, research, "what is", "explain", "why", "how", "should I"
-3. OpenAI - For summarizing, combining info from multiple sources
-4. fal.ai - For image generation
-5. rss_news - For latest news: "news", "tin tức"
-
-ROUTING RULES (in priority order):
-1. X/Twitter URLs ("x.com", "twitter.com"): → twitter_analysis
-2. Price queries ("price", "check", "value", single coin ticker like "btc", "eth"): → coingecko
-3. News requests ("news", "updates", "latest"): → rss_news
-4. Questions/definitions ("what is", "explain", "how"): → perplexity
-5. Image generation ("create image", "generate"): → falai
-6. Vague/unclear queries: → ask_user
-
-IMPORTANT: 
-- "check [coin]" → coingecko (e.g., "check btc", "check eth")
-- Single tickers → coingecko (e.g., "btc", "eth", "sol")
-- Coin + "news" → rss_news (e.g., "btc news")
-
-RESPONSE LANGUAGE:
-- ALWAYS respond in English (never Vietnamese)
+        return await self.analyze_context_with_openai(query)
 
-Return ONLY JSON:
-{
-    "selected_api": "coingecko|perplexity|falai|rss_news|twitter_analysis|ask_user",
-    "reason": "Why this API",
-    "confidence": 0.0-1.0,
-    "clarification": "For ask_user only, IN ENGLISH"
-}
-
-Examples:
-- "https://x.com/user/status/123" → {"selected_api": "twitter_analysis", "reason": "X/Twitter URL", "confidence": 0.95}
-- "bitcoin price" → {"selected_api": "coingecko", "reason": "Price query", "confidence": 0.95}
-- "check btc" → {"selected_api": "coingecko", "reason": "Check price", "confidence": 0.95}
-- "btc" → {"selected_api": "coingecko", "reason": "Quick price check", "confidence": 0.9}
-- "eth market cap" → {"selected_api": "coingecko", "reason": "Market data query", "confidence": 0.9}
-- "what is ethereum" → {"selected_api": "perplexity", "reason": "Definition needed", "confidence": 0.9}
-- "btc news" → {"selected_api": "rss_news", "reason": "Latest news", "confidence": 0.9}
-- "create image bitcoin" → {"selected_api": "falai", "reason": "Image generation", "confidence": 0.9}"""
-        
-        payload = {
-            "model": "gpt-4o-mini",
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Query: {query}"}
-            ],
-            "max_tokens": 150,
-            "temperature": 0.1
+    @staticmethod
+    def combined_route_result(result: Dict[str, Any], api_source: str) -> Dict[str, Any]:
+        """Normalize a route_extract answer (single or one batch entry) into the routing result shape"""
+        entities = result.get('entities') or {}
+        coin_ids = entities.get('coin_ids') or []
+        if isinstance(coin_ids, str):
+            coin_ids = [coin_ids]
+        return {
+            'success': True,
+            'selected_api': result.get('selected_api', 'perplexity'),
+            'reason': result.get('reason', 'Default routing'),
+            'confidence': result.get('confidence', 0.7),
+            'clarification': result.get('clarification', ''),
+            'entities': {
+                'coin_ids': [str(c).strip().lower() for c in coin_ids if str(c).strip()],
+                'timeframe': entities.get('timeframe'),
+                'image_description': entities.get('image_description')
+            },
+            'api_source': api_source
         }
+
+    async def analyze_context_with_openai(self, query: str) -> Dict[str, Any]:
+        """BRAIN: OpenAI routes queries and decides what info to send to other functions"""
+        if not self.llm.available('routing'):
+            return {'success': False, 'error': 'OpenAI API key required for routing', 'api_source': 'None'}
         
+        print(f"[API CALL] LLM: Analyzing context for query: {query[:50]}...")
+        
+        user_content = f"Query: {query}"
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, json=payload) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        content = data['choices'][0]['message']['content'].strip()
-                        
-                        # Parse JSON response
-                        try:
-                            result = json.loads(content)
-                            print(f"[BRAIN] OpenAI routing result: {result}")
-                            return {
-                                'success': True,
-                                'selected_api': result.get('selected_api', 'perplexity'),
-                                'reason': result.get('reason', 'Default routing'),
-                                'confidence': result.get('confidence', 0.7),
-                                'clarification': result.get('clarification', ''),
-                                'api_source': 'OpenAI Brain'
-                            }
-                        except json.JSONDecodeError:
-                            print(f"[API CALL] OpenAI: Failed to parse JSON response: {content}")
-                            return {
-                                'success': False,
-                                'error': 'Invalid JSON response from OpenAI',
-                                'api_source': 'OpenAI GPT-4.1 Mini'
-                            }
-                    else:
-                        error_text = await response.text()
-                        print(f"[API CALL] OpenAI: HTTP {response.status}: {error_text}")
-                        return {
-                            'success': False,
-                            'error': f'OpenAI API error: {response.status} - {error_text}',
-                            'api_source': 'OpenAI GPT-4.1 Mini'
-                        }
+            response = await self.llm.complete('routing', PROMPTS.messages('routing', user_content), max_tokens=150, temperature=0.1)
+            if not response['success']:
+                print(f"[API CALL] LLM: Routing failed: {response.get('error')}")
+                return {'success': False, 'error': response.get('error'), 'api_source': response.get('api_source')}
+            self.token_usage.record('routing', response, response['latency'], PROMPTS.estimate('routing', user_content))
+            content = response['content']
+            
+            # Parse JSON response
+            try:
+                result = json.loads(content)
+                print(f"[BRAIN] {response['api_source']} routing result: {result}")
+                return {
+                    'success': True,
+                    'selected_api': result.get('selected_api', 'perplexity'),
+                    'reason': result.get('reason', 'Default routing'),
+                    'confidence': result.get('confidence', 0.7),
+                    'clarification': result.get('clarification', ''),
+                    'api_source': 'OpenAI Brain'
+                }
+            except json.JSONDecodeError:
+                print(f"[API CALL] LLM: Failed to parse JSON response: {content}")
+                return {
+                    'success': False,
+                    'error': f"Invalid JSON response from {response['api_source']}",
+                    'api_source': response['api_source']
+                }
         except Exception as e:
             error_msg = str(e)
-            print(f"[API CALL] OpenAI: Exception: {error_msg}")
-            return {'success': False, 'error': error_msg, 'api_source': 'OpenAI GPT-4.1 Mini'}
+            print(f"[API CALL] LLM: Exception: {error_msg}")
+            return {'success': False, 'error': error_msg, 'api_source': 'OpenAI Brain'}
 
+    def ingest_feed(self, feed_url: str, feed) -> int:
+        """Score a parsed feed, cache it and add it to the story clusters; returns new entries"""
+        # Keep the 30 newest entries per feed (for 7-day coverage)
+        entries = []
+        for entry in feed.entries[:30]:
+            # feedparser parses RSS and Atom/ISO dates alike; the string is only for display
+            parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+            entries.append({
+                'title': entry.get('title', '').encode('utf-8', errors='ignore').decode('utf-8'),
+                'link': entry.get('link', ''),
+                'published': entry.get('published') or entry.get('updated', ''),
+                'published_ts': float(calendar.timegm(parsed)) if parsed else None
+            })
+        if not entries:
+            return 0
+        # Score the whole feed batch once; the scores live in the cache with the entries
+        for entry, scores in zip(entries, self.headline_scorer.score([e['title'] for e in entries])):
+            entry.update(scores)
+        self.news_cache.put(feed_url, entries)
+        return self.news_clusters.add(entries, source_of(feed_url))
+    
     async def get_rss_news(self, query: str) -> Dict[str, Any]:
         """OPTIMIZED: Fast, accurate, cost-free RSS news"""
         print(f"[RSS] Fetching news for: {query[:50]}...")
         
-        import feedparser
+        feedparser = providers.load('feedparser')
         import re
         
         # STEP 1: Simple coin extraction (NO OpenAI - Save cost!)
@@ -173,13 +215,8 @@ Examples:
                 print(f"[RSS] Detected coin: {coin_name}")
                 break
         
-        # STEP 2: Top 4 RSS feeds only (Fast & Reliable)
-        rss_feeds = [
-            'https://coindesk.com/arc/outboundfeeds/rss/',
-            'https://cointelegraph.com/rss',
-            'https://decrypt.co/feed',
-            'https://www.theblock.co/rss.xml'
-        ]
+        # STEP 2: Background scheduler keeps the clusters fresh; otherwise fetch the 4 core feeds now
+        rss_feeds = [] if self.feed_scheduler and self.feed_scheduler.ready else CORE_FEEDS
         
         # STEP 3: Build regex pattern for coin-specific filtering
         coin_regex = None
@@ -190,74 +227,49 @@ Examples:
         coin_specific_news = []
         
         try:
-            # STEP 4: Fetch from feeds (30 entries each = 120 total for better 7-day coverage)
-            for feed_url in rss_feeds:
+            # STEP 4: Fetch from feeds (30 entries each = 120 total for better 7-day coverage).
+            # Uncached feeds are fetched and parsed together in worker threads, never on the event loop
+            cached = {feed_url: self.news_cache.get(feed_url) for feed_url in rss_feeds}
+            missing = [feed_url for feed_url, entries in cached.items() if entries is None]
+            timeout = float(os.getenv('FEED_TIMEOUT', 20))
+            fetched = await asyncio.gather(
+                *(asyncio.wait_for(asyncio.to_thread(feedparser.parse, feed_url), timeout) for feed_url in missing),
+                return_exceptions=True
+            )
+            for feed_url, feed in zip(missing, fetched):
                 try:
-                    feed = feedparser.parse(feed_url)
-                    if not feed.entries:
-                        continue
-                    print(f"[RSS] Parsing {feed_url}: {len(feed.entries)} entries")
-                    
-                    # Process 30 newest entries per feed (for 7-day coverage)
-                    for entry in feed.entries[:30]:
-                        title = entry.get('title', '').encode('utf-8', errors='ignore').decode('utf-8')
-                        link = entry.get('link', '')
-                        published = entry.get('published', '')
-                        
-                        # STEP 5: Strict coin-specific filter using regex
-                        if coin_name and coin_regex:
-                            if re.search(coin_regex, title, re.IGNORECASE):
-                                coin_specific_news.append({
-                                    'title': title,
-                                    'link': link,
-                                    'published': published
-                                })
-                                print(f"[RSS] ✓ MATCH: {title[:50]}...")
-                        else:
-                            # General crypto news (no specific coin)
-                            if any(kw in title.lower() for kw in ['crypto', 'bitcoin', 'blockchain']):
-                                all_news.append({
-                                    'title': title,
-                                    'link': link,
-                                    'published': published
-                                })
-                        
+                    if isinstance(feed, BaseException):
+                        raise feed
+                    self.ingest_feed(feed_url, feed)
                 except Exception as feed_error:
-                    print(f"[RSS] Error: {feed_error}")
-                    continue
-            
-            # STEP 6: Filter by date (last 7 days only)
-            from datetime import datetime, timedelta
-            from dateutil import parser as date_parser
-            
-            one_week_ago = datetime.now() - timedelta(days=7)
-            recent_news = []
-            
-            for news in coin_specific_news:
-                try:
-                    pub_date = date_parser.parse(news['published'])
-                    if pub_date.replace(tzinfo=None) >= one_week_ago:
-                        recent_news.append(news)
-                except:
-                    # If can't parse date, include it anyway
-                    recent_news.append(news)
+                    print(f"[RSS] Error: {feed_url}: {feed_error!r}")
+            for feed_url, entries in cached.items():
+                if entries is not None:
+                    print(f"[RSS] Parsing {feed_url}: {len(entries)} cached entries")
+                    # Already-indexed links are skipped, so re-reading a cached feed is cheap
+                    self.news_clusters.add(entries, source_of(feed_url))
             
-            coin_specific_news = recent_news
+            # STEP 5: Filter distinct stories (one representative per cluster)
+            for story in self.news_clusters.stories():
+                title = story['title']
+                if coin_name and coin_regex:
+                    # Strict coin-specific filter using regex
+                    if re.search(coin_regex, title, re.IGNORECASE):
+                        coin_specific_news.append(story)
+                        print(f"[RSS] ✓ MATCH: {title[:50]}...")
+                elif any(kw in title.lower() for kw in ['crypto', 'bitcoin', 'blockchain']):
+                    # General crypto news (no specific coin)
+                    all_news.append(story)
             
-            # STEP 7: Deduplication
-            seen_titles = set()
-            unique_coin_news = []
-            for news in coin_specific_news:
-                title_lower = news['title'].lower().strip()
-                if title_lower not in seen_titles:
-                    seen_titles.add(title_lower)
-                    unique_coin_news.append(news)
+            # STEP 6: Filter by date (last 7 days only); undated entries were stamped at ingestion, so they stay
+            one_week_ago = time.time() - 7 * 24 * 3600
+            coin_specific_news = [news for news in coin_specific_news if news['published_ts'] >= one_week_ago]
             
-            coin_specific_news = unique_coin_news
+            # STEP 7: Deduplication happens at ingestion (news_clusters), stories are already distinct
             print(f"[RSS] Found {len(coin_specific_news)} unique {coin_name.upper() if coin_name else 'crypto'} news (last 7 days)")
             
             # STEP 8: Sort by newest
-            coin_specific_news.sort(key=lambda x: x['published'], reverse=True)
+            coin_specific_news.sort(key=lambda x: x['published_ts'], reverse=True)
             
             # STEP 9: Smart selection
             if coin_name:
@@ -272,6 +284,8 @@ Examples:
                     return {
                         'success': True,
                         'content': f"**No {coin_name.upper()} News Found**\n\nNo news about {coin_name.upper()} in the last 7 days from major sources.\n\n💡 Try:\n- `{coin_name} price` - Check price\n- `crypto news` - General crypto news",
+                        'articles': [],
+                        'coin': coin_name,
                         'api_source': 'RSS News'
                     }
             else:
@@ -286,6 +300,12 @@ Examples:
                     content += f" ({len(all_news)} found in last 7 days)"
             content += "**\n\n"
             
+            tone = headline_tone(all_news)
+            if tone:
+                counts = tone['counts']
+                content += (f"Sentiment: **{tone['label']}** ({tone['mean']:+.2f}) - {counts['bullish']} bullish, "
+                            f"{counts['neutral']} neutral, {counts['bearish']} bearish\n\n")
+            
             for i, news in enumerate(all_news, 1):
                 clean_title = (news['title']
                              .replace('\u2019', "'")
@@ -293,8 +313,13 @@ Examples:
                              .replace('\n', ' ')
                              .strip())
                 content += f"{i}. **[{clean_title}]({news['link']})**\n"
-                if news.get('published'):
-                    content += f"   📅 {news['published']}\n\n"
+                details = [f"📅 {news['published']}"] if news.get('published') else []
+                if 'sentiment' in news:
+                    details.append(f"{news['label']} ({news['sentiment']:+.2f}) · {news['event']}")
+                if news.get('source_count', 1) > 1:
+                    details.append(f"{news['source_count']} sources")
+                if details:
+                    content += f"   {' · '.join(details)}\n\n"
             
             # Add helpful message if not enough news
             if coin_name and len(all_news) < 5:
@@ -304,6 +329,9 @@ Examples:
             return {
                 'success': True,
                 'content': content,
+                'articles': all_news,  # structured headlines (template synthesis)
+                'sentiment': tone,
+                'coin': coin_name,
                 'api_source': 'RSS News (Last 7 Days)'
             }
         
@@ -314,6 +342,11 @@ Examples:
     
     async def get_coingecko_data(self, coin_symbol: str) -> Dict[str, Any]:
         """Fetch coin data from CoinGecko API"""
+        cached = self.price_cache.get(coin_symbol)
+        if cached:
+            print(f"[API CALL] CoinGecko: Cache hit - {coin_symbol}")
+            return cached
+        
         print(f"[API CALL] CoinGecko: Fetching data for {coin_symbol}")
         url = f"https://api.coingecko.com/api/v3/simple/price"
         params = {
@@ -336,7 +369,7 @@ Examples:
                         if coin_symbol in data:
                             coin_data = data[coin_symbol]
                             print(f"[API CALL] CoinGecko: Success - {coin_symbol} = ${coin_data.get('usd', 0)}")
-                            return {
+                            result = {
                                 'success': True,
                                 'name': coin_symbol.replace('-', ' ').title(),
                                 'symbol': coin_symbol.upper(),
@@ -346,6 +379,8 @@ Examples:
                                 'change_24h': coin_data.get('usd_24h_change', 0),
                                 'api_source': 'CoinGecko API'
                             }
+                            self.price_cache.put(coin_symbol, result)
+                            return result
                         else:
                             return {'success': False, 'error': f'Coin "{coin_symbol}" not found', 'api_source': 'CoinGecko API'}
                     else:
@@ -355,6 +390,103 @@ Examples:
             print(f"[API CALL] CoinGecko: EXCEPTION - {str(e)}")
             return {'success': False, 'error': str(e), 'api_source': 'CoinGecko API'}
     
+    async def get_coingecko_prices(self, coin_ids: List[str]) -> Dict[str, Any]:
+        """Fetch prices for many coins in one /simple/price call (used by live subscriptions)"""
+        if not coin_ids:
+            return {'success': True, 'prices': {}, 'api_source': 'CoinGecko API'}
+
+        url = "https://api.coingecko.com/api/v3/simple/price"
+        params = {
+            'ids': ','.join(coin_ids),
+            'vs_currencies': 'usd',
+            'include_market_cap': 'true',
+            'include_24hr_vol': 'true',
+            'include_24hr_change': 'true',
+            'include_last_updated_at': 'true'
+        }
+
+        headers = {}
+        if self.coingecko_api_key:
+            headers['x-cg-demo-api-key'] = self.coingecko_api_key
+
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(url, params=params, headers=headers) as response:
+                    if response.status != 200:
+                        return {'success': False, 'error': f'CoinGecko error: {response.status}', 'api_source': 'CoinGecko API'}
+                    data = await response.json()
+                    prices = {
+                        coin_id: {
+                            'price': coin_data.get('usd', 0),
+                            'market_cap': coin_data.get('usd_market_cap', 0),
+                            'volume': coin_data.get('usd_24h_vol', 0),
+                            'change_24h': coin_data.get('usd_24h_change', 0),
+                            'last_updated_at': coin_data.get('last_updated_at')
+                        }
+                        for coin_id, coin_data in data.items()
+                    }
+                    return {'success': True, 'prices': prices, 'api_source': 'CoinGecko API'}
+        except Exception as e:
+            print(f"[API CALL] CoinGecko batch: EXCEPTION - {str(e)}")
+            return {'success': False, 'error': str(e), 'api_source': 'CoinGecko API'}
+
+    async def get_coingecko_markets(self, limit: int = 10) -> Dict[str, Any]:
+        """Top coins by market cap in one /coins/markets call, shaped like get_coingecko_prices()"""
+        url = "https://api.coingecko.com/api/v3/coins/markets"
+        params = {'vs_currency': 'usd', 'order': 'market_cap_desc', 'per_page': limit, 'page': 1}
+
+        headers = {}
+        if self.coingecko_api_key:
+            headers['x-cg-demo-api-key'] = self.coingecko_api_key
+
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(url, params=params, headers=headers) as response:
+                    if response.status != 200:
+                        return {'success': False, 'error': f'CoinGecko error: {response.status}', 'api_source': 'CoinGecko API'}
+                    data = await response.json()
+                    prices = {
+                        coin['id']: {
+                            'price': coin.get('current_price') or 0,
+                            'market_cap': coin.get('market_cap') or 0,
+                            'volume': coin.get('total_volume') or 0,
+                            'change_24h': coin.get('price_change_percentage_24h') or 0,
+                            'last_updated_at': None
+                        }
+                        for coin in data if coin.get('id')
+                    }
+                    return {'success': True, 'prices': prices, 'api_source': 'CoinGecko API'}
+        except Exception as e:
+            print(f"[API CALL] CoinGecko markets: EXCEPTION - {str(e)}")
+            return {'success': False, 'error': str(e), 'api_source': 'CoinGecko API'}
+
+    async def get_coingecko_market_chart(self, coin_id: str, start: float, end: float) -> Dict[str, Any]:
+        """Historical prices/market caps/volumes between two unix timestamps (hourly for ranges of 1-90 days)"""
+        url = f"https://api.coingecko.com/api/v3/coins/{coin_id}/market_chart/range"
+        params = {'vs_currency': 'usd', 'from': int(start), 'to': int(end)}
+
+        headers = {}
+        if self.coingecko_api_key:
+            headers['x-cg-demo-api-key'] = self.coingecko_api_key
+
+        print(f"[API CALL] CoinGecko: market_chart {coin_id} ({(end - start) / 86400:.1f}d)")
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(url, params=params, headers=headers) as response:
+                    if response.status != 200:
+                        return {'success': False, 'error': f'CoinGecko error: {response.status}', 'api_source': 'CoinGecko API'}
+                    data = await response.json()
+                    return {
+                        'success': True,
+                        'prices': data.get('prices', []),
+                        'market_caps': data.get('market_caps', []),
+                        'total_volumes': data.get('total_volumes', []),
+                        'api_source': 'CoinGecko API'
+                    }
+        except Exception as e:
+            print(f"[API CALL] CoinGecko market_chart: EXCEPTION - {str(e)}")
+            return {'success': False, 'error': str(e), 'api_source': 'CoinGecko API'}
+
     async def generate_image_with_fal(self, prompt: str) -> Dict[str, Any]:
         """Generate image using fal-client library (per official docs)"""
         if not self.fal_api_key:
@@ -363,35 +495,29 @@ Examples:
         print(f"[IMAGE] FLUX.1 [dev]: {prompt[:50]}...")
         
         try:
-            import fal_client
-            
-            # Set API key as per docs
-            os.environ['FAL_KEY'] = self.fal_api_key
+            # Async queue API with an explicit key: no executor thread, no os.environ mutation
+            fal_client = providers.load('fal_client')
+            client = providers.fal_async_client(self.fal_api_key)
+            handle = await client.submit(
+                "fal-ai/flux/dev",
+                arguments={
+                    "prompt": prompt,
+                    "image_size": "landscape_4_3",
+                    "num_inference_steps": 28,
+                    "guidance_scale": 3.5,
+                    "num_images": 1,
+                    "enable_safety_checker": True,
+                    "output_format": "jpeg"
+                }
+            )
             
-            # Callback for progress updates (per docs)
-            def on_queue_update(update):
-                if isinstance(update, fal_client.InProgress):
-                    for log in update.logs:
+            # Progress logs (per docs)
+            async for event in handle.iter_events(with_logs=True):
+                if isinstance(event, fal_client.InProgress):
+                    for log in event.logs or []:
                         print(f"[IMAGE] 📝 {log.get('message', '')}")
             
-            # Subscribe with logging (per docs example)
-            result = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: fal_client.subscribe(
-                    "fal-ai/flux/dev",
-                    arguments={
-                        "prompt": prompt,
-                        "image_size": "landscape_4_3",
-                        "num_inference_steps": 28,
-                        "guidance_scale": 3.5,
-                        "num_images": 1,
-                        "enable_safety_checker": True,
-                        "output_format": "jpeg"
-                    },
-                    with_logs=True,
-                    on_queue_update=on_queue_update
-                )
-            )
+            result = await handle.get()
             
             # Parse result per docs output schema
             if result and 'images' in result:
@@ -421,121 +547,65 @@ Examples:
             return {'success': False, 'error': str(e), 'api_source': 'fal.ai'}
     
     async def analyze_with_openai(self, content: str, context: str = "") -> Dict[str, Any]:
-        """Analyze content with OpenAI"""
-        if not self.openai_api_key:
+        """Analyze content with the synthesis LLM"""
+        if not self.llm.available('synthesis'):
             return {'success': False, 'error': 'OpenAI API key not available', 'api_source': 'OpenAI'}
         
-        print(f"[API CALL] OpenAI: Analyzing content...")
-        url = "https://api.openai.com/v1/chat/completions"
-        headers = {"Authorization": f"Bearer {self.openai_api_key}", "Content-Type": "application/json"}
-        payload = {
-            "model": "gpt-4o-mini",
-            "messages": [
-                {"role": "system", "content": "You are a neutral crypto analyst. Provide concise, factual analysis in 2-3 sentences. Match the language of the content."},
-                {"role": "user", "content": f"Analyze: {content}\n\nContext: {context}"}
-            ],
-            "max_tokens": 300,
-            "temperature": 0.1
-        }
-        
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, json=payload) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        analysis = data['choices'][0]['message']['content']
-                        print(f"[API CALL] OpenAI: Success")
-                        return {'success': True, 'analysis': analysis, 'api_source': 'OpenAI GPT-4o-mini'}
-                    else:
-                        return {'success': False, 'error': f'OpenAI error: {response.status}', 'api_source': 'OpenAI'}
-        except Exception as e:
-            print(f"[API CALL] OpenAI: EXCEPTION - {str(e)}")
-            return {'success': False, 'error': str(e), 'api_source': 'OpenAI'}
+        print(f"[API CALL] LLM: Analyzing content...")
+        user_content = f"Analyze: {content}\n\nContext: {context}"
+        response = await self.llm.complete('synthesis', PROMPTS.messages('synthesis', user_content), max_tokens=300, temperature=0.1)
+        if not response['success']:
+            print(f"[API CALL] LLM: Synthesis failed - {response.get('error')}")
+            return {'success': False, 'error': response.get('error'), 'api_source': response.get('api_source')}
+        self.token_usage.record('synthesis', response, response['latency'], PROMPTS.estimate('synthesis', user_content))
+        print(f"[API CALL] {response['api_source']}: Success")
+        return {'success': True, 'analysis': response['content'], 'api_source': response['api_source']}
     
     async def extract_coin_name_with_openai(self, query: str) -> Dict[str, Any]:
-        """Use OpenAI GPT-4o-mini to extract coin name and map to CoinGecko coin ID"""
-        if not self.openai_api_key:
+        """Extract coin name with the extraction LLM and map to CoinGecko coin ID"""
+        if not self.llm.available('extraction'):
             return {'success': False, 'error': 'OpenAI API key not available', 'api_source': 'OpenAI'}
         
-        print(f"[API CALL] OpenAI: Extracting coin name from: {query[:50]}...")
-        
-        url = "https://api.openai.com/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {self.openai_api_key}",
-            "Content-Type": "application/json"
-        }
+        cached = self.coin_index.get(normalize_key(query))
+        if cached:
+            print(f"[API CALL] OpenAI: Coin index hit: {cached['coin_id']}")
+            return cached
         
-        system_prompt = """You are a cryptocurrency expert. Extract the coin name from user queries and map it to the correct CoinGecko coin ID.
-
-Return ONLY a JSON response with this exact format:
-{
-    "coin_id": "coingecko-coin-id",
-    "coin_name": "Full coin name",
-    "confidence": 0.0-1.0
-}
-
-Common mappings:
-- "btc" = "bitcoin"
-- "eth" = "ethereum" 
-- "sol" = "solana"
-- "sui" = "sui"
-- "ada" = "cardano"
-- "dot" = "polkadot"
-- "link" = "chainlink"
-- "arb" = "arbitrum"
-- "op" = "optimism"
-- "matic" = "matic-network"
-- "avax" = "avalanche-2"
-
-Use standard CoinGecko coin IDs. If unsure, return confidence < 0.7."""
-        
-        payload = {
-            "model": "gpt-4o-mini",
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Query: {query}"}
-            ],
-            "max_tokens": 100,
-            "temperature": 0.1
-        }
+        print(f"[API CALL] LLM: Extracting coin name from: {query[:50]}...")
         
+        user_content = f"Query: {query}"
         try:
-            import aiohttp
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, json=payload) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        content = data['choices'][0]['message']['content'].strip()
-                        
-                        # Parse JSON response
-                        try:
-                            result = json.loads(content)
-                            print(f"[API CALL] OpenAI: Coin extraction result: {result}")
-                            return {
-                                'success': True,
-                                'coin_id': result.get('coin_id', ''),
-                                'coin_name': result.get('coin_name', ''),
-                                'confidence': result.get('confidence', 0.7),
-                                'api_source': 'OpenAI GPT-4o-mini'
-                            }
-                        except json.JSONDecodeError:
-                            print(f"[API CALL] OpenAI: Failed to parse JSON: {content}")
-                            return {
-                                'success': False,
-                                'error': 'Invalid JSON response from OpenAI',
-                                'api_source': 'OpenAI GPT-4o-mini'
-                            }
-                    else:
-                        error_text = await response.text()
-                        print(f"[API CALL] OpenAI: HTTP {response.status}: {error_text}")
-                        return {
-                            'success': False,
-                            'error': f'OpenAI API error: {response.status}',
-                            'api_source': 'OpenAI GPT-4o-mini'
-                        }
+            response = await self.llm.complete('extraction', PROMPTS.messages('coin_extraction', user_content), max_tokens=100, temperature=0.1)
+            if not response['success']:
+                print(f"[API CALL] LLM: Coin extraction failed: {response.get('error')}")
+                return {'success': False, 'error': response.get('error'), 'api_source': response.get('api_source')}
+            self.token_usage.record('coin_extraction', response, response['latency'], PROMPTS.estimate('coin_extraction', user_content))
+            content = response['content']
+            
+            # Parse JSON response
+            try:
+                result = json.loads(content)
+                print(f"[API CALL] {response['api_source']}: Coin extraction result: {result}")
+                extraction = {
+                    'success': True,
+                    'coin_id': result.get('coin_id', ''),
+                    'coin_name': result.get('coin_name', ''),
+                    'confidence': result.get('confidence', 0.7),
+                    'api_source': response['api_source']
+                }
+                if extraction['coin_id']:
+                    self.coin_index.put(normalize_key(query), extraction)
+                return extraction
+            except json.JSONDecodeError:
+                print(f"[API CALL] LLM: Failed to parse JSON: {content}")
+                return {
+                    'success': False,
+                    'error': f"Invalid JSON response from {response['api_source']}",
+                    'api_source': response['api_source']
+                }
         except Exception as e:
             error_msg = str(e)
-            print(f"[API CALL] OpenAI: Exception: {error_msg}")
+            print(f"[API CALL] LLM: Exception: {error_msg}")
             return {'success': False, 'error': error_msg, 'api_source': 'OpenAI GPT-4o-mini'}
     
     async def analyze_twitter_post(self, url: str) -> Dict[str, Any]:
@@ -550,14 +620,9 @@ Use standard CoinGecko coin IDs. If unsure, return confidence < 0.7."""
         
         tweet_id = tweet_match.group(1)
         
-        # Try Gemini first
-        if self.gemini_api_key:
-            try:
-                import google.generativeai as genai
-                genai.configure(api_key=self.gemini_api_key)
-                model = genai.GenerativeModel('gemini-1.5-flash')
-                
-                prompt = f"""Analyze this X/Twitter post URL: {url}
+        # Gemini (primary) or OpenAI (backup), whichever is currently faster goes first
+        if self.llm.available('twitter'):
+            prompt = f"""Analyze this X/Twitter post URL: {url}
 
 Provide concise analysis in 3-4 sentences covering:
 - Content summary
@@ -568,47 +633,16 @@ Provide concise analysis in 3-4 sentences covering:
 ALWAYS respond in English.
 
 Note: Since I cannot directly access X/Twitter, provide general analysis guidance for posts about crypto."""
-                
-                response = model.generate_content(prompt, generation_config={'temperature': 0.3, 'max_output_tokens': 200})
-                content = response.text.strip()
-                print(f"[TWITTER] Gemini analysis success")
-                
+            
+            response = await self.llm.complete('twitter', [{"role": "user", "content": prompt}], max_tokens=200, temperature=0.3)
+            if response['success']:
+                print(f"[TWITTER] {response['api_source']} analysis success")
                 return {
                     'success': True,
-                    'content': f"🐦 **X/Twitter Post Analysis**\n\n**URL:** {url}\n\n{content}\n\n💡 _Always verify crypto information from multiple sources._",
-                    'api_source': 'Gemini Analysis'
-                }
-                
-            except Exception as e:
-                print(f"[TWITTER] Gemini failed: {e}")
-        
-        # Fallback to OpenAI
-        if self.openai_api_key:
-            try:
-                import aiohttp
-                url_api = "https://api.openai.com/v1/chat/completions"
-                headers = {"Authorization": f"Bearer {self.openai_api_key}", "Content-Type": "application/json"}
-                payload = {
-                    "model": "gpt-4o-mini",
-                    "messages": [{"role": "user", "content": f"Analyze this X/Twitter post for crypto insights: {url}. Provide 3-4 sentence analysis covering content, market implications, and credibility."}],
-                    "max_tokens": 200,
-                    "temperature": 0.3
+                    'content': f"🐦 **X/Twitter Post Analysis**\n\n**URL:** {url}\n\n{response['content']}\n\n💡 _Always verify crypto information from multiple sources._",
+                    'api_source': f"{response['api_source']} Analysis"
                 }
-                
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url_api, headers=headers, json=payload) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            analysis = data['choices'][0]['message']['content']
-                            print(f"[TWITTER] OpenAI backup success")
-                            
-                            return {
-                                'success': True,
-                                'content': f"🐦 **X/Twitter Post Analysis**\n\n**URL:** {url}\n\n{analysis}\n\n💡 _Always verify crypto information from multiple sources._",
-                                'api_source': 'OpenAI Analysis'
-                            }
-            except Exception as e:
-                print(f"[TWITTER] OpenAI backup failed: {e}")
+            print(f"[TWITTER] LLM analysis failed: {response.get('error')}")
         
         # Final fallback
         return {
@@ -0,0 +1,363 @@
+"""
+Adaptive Atomizer
+Local, NumPy-only classifier that predicts whether a query is atomic (direct
+execution) or complex (planner -> subtasks -> synthesis) and which route it
+will take, with temperature-calibrated confidence.
+
+Features are hashed word uni/bi-grams + character trigrams; the model is a
+softmax regression trained offline from reviewed traffic:
+
+    python -m roma_agents.atomizer train --data labeled.jsonl --out atomizer_model.npz
+    python -m roma_agents.atomizer eval  --data labeled.jsonl --model atomizer_model.npz
+
+Training lines are JSON: {"query": "...", "atomic": true, "route": "coingecko"}
+
+ATOMIZER_LOG_PATH collects unlabeled candidates ({"query", "predicted_atomic",
+"predicted_route", "label_source": "predicted"}). They are the system's own
+decisions, so train() ignores them until a reviewer sets "atomic" / "route".
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Any, List, Tuple, Optional
+
+import numpy as np
+
+DEFAULT_DIM = 2 ** 14
+
+# Keyword fallback, matched on word boundaries ("how" must not match "show", "top" not "stop")
+COMPLEX_KEYWORDS = [
+    'should i', 'worth', 'buy',  # Investment/purchase questions
+    'why', 'how', 'analyze', 'compare',  # Analysis requests
+    'where', 'which',  # Location/selection questions
+    'trend', 'future', 'predict', 'forecast',  # Predictions
+    'best coin', 'top', 'which coin'  # Comparisons
+]
+SIMPLE_KEYWORDS = ['price', 'gia', 'check', 'cost', 'value', 'news', 'tin tuc']
+_COMPLEX_RE = re.compile(r'\b(' + '|'.join(re.escape(k) for k in COMPLEX_KEYWORDS) + r')\b')
+_SIMPLE_RE = re.compile(r'\b(' + '|'.join(re.escape(k) for k in SIMPLE_KEYWORDS) + r')\b')
+
+
+def featurize(query: str, dim: int = DEFAULT_DIM) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed n-gram features as (indices, L2-normalized values)"""
+    text = ' '.join(re.findall(r'\w+', query.lower()))
+    words = text.split()
+    grams = [f'w:{w}' for w in words]
+    grams += [f'b:{a} {b}' for a, b in zip(words, words[1:])]
+    padded = f' {text} '
+    grams += [f'c:{padded[i:i + 3]}' for i in range(len(padded) - 2)]
+    if not grams:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+    hashed = np.fromiter((zlib.crc32(g.encode('utf-8')) % dim for g in grams), dtype=np.int64, count=len(grams))
+    indices, counts = np.unique(hashed, return_counts=True)
+    values = counts.astype(np.float32)
+    values /= np.linalg.norm(values)
+    return indices, values
+
+
+def _dense(rows: List[Tuple[np.ndarray, np.ndarray]], dim: int) -> np.ndarray:
+    X = np.zeros((len(rows), dim), dtype=np.float32)
+    for r, (idx, val) in enumerate(rows):
+        X[r, idx] = val
+    return X
+
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+class HashedSoftmaxClassifier:
+    """Multinomial logistic regression over hashed features with temperature calibration"""
+
+    def __init__(self, classes: List[str], dim: int = DEFAULT_DIM):
+        self.classes = list(classes)
+        self.dim = dim
+        self.W = np.zeros((dim, len(classes)), dtype=np.float32)
+        self.b = np.zeros(len(classes), dtype=np.float32)
+        self.temperature = 1.0
+
+    def logits(self, rows: List[Tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+        out = np.empty((len(rows), len(self.classes)), dtype=np.float32)
+        for r, (idx, val) in enumerate(rows):
+            out[r] = val @ self.W[idx] + self.b if len(idx) else self.b
+        return out
+
+    def predict_proba(self, rows: List[Tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+        return _softmax(self.logits(rows) / self.temperature)
+
+    def fit(self, rows, labels: np.ndarray, epochs: int = 30, lr: float = 0.5, l2: float = 1e-5,
+            batch_size: int = 256, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        Y = np.eye(len(self.classes), dtype=np.float32)[labels]
+        n = len(rows)
+        for epoch in range(epochs):
+            order = rng.permutation(n)
+            step = lr / (1 + epoch * 0.1)
+            for start in range(0, n, batch_size):
+                batch = order[start:start + batch_size]
+                X = _dense([rows[i] for i in batch], self.dim)
+                P = _softmax(X @ self.W + self.b)
+                G = (P - Y[batch]) / len(batch)
+                self.W -= step * (X.T @ G + l2 * self.W)
+                self.b -= step * G.sum(axis=0)
+        return self
+
+    def calibrate(self, rows, labels: np.ndarray):
+        """Pick the temperature that minimizes validation NLL"""
+        if not len(rows):
+            return self
+        z = self.logits(rows)
+        best_t, best_nll = 1.0, float('inf')
+        for t in np.linspace(0.25, 5.0, 39):
+            p = _softmax(z / t)[np.arange(len(labels)), labels]
+            nll = -np.mean(np.log(np.clip(p, 1e-9, 1.0)))
+            if nll < best_nll:
+                best_t, best_nll = float(t), nll
+        self.temperature = best_t
+        return self
+
+
+class LocalAtomizer:
+    """Atomic-vs-complex model + route model sharing one feature space"""
+
+    def __init__(self, atomic_model: HashedSoftmaxClassifier, route_model: Optional[HashedSoftmaxClassifier]):
+        self.atomic_model = atomic_model
+        self.route_model = route_model
+
+    def predict(self, query: str) -> Dict[str, Any]:
+        rows = [featurize(query, self.atomic_model.dim)]
+        p = self.atomic_model.predict_proba(rows)[0]
+        p_atomic = float(p[self.atomic_model.classes.index('atomic')])
+        prediction = {
+            'atomic': p_atomic >= 0.5,
+            'confidence': max(p_atomic, 1 - p_atomic),
+            'p_atomic': p_atomic
+        }
+        if self.route_model is not None:
+            q = self.route_model.predict_proba(rows)[0]
+            best = int(q.argmax())
+            prediction['route'] = self.route_model.classes[best]
+            prediction['route_confidence'] = float(q[best])
+        return prediction
+
+    def save(self, path: str):
+        arrays = {
+            'dim': np.array(self.atomic_model.dim),
+            'atomic_W': self.atomic_model.W, 'atomic_b': self.atomic_model.b,
+            'atomic_classes': np.array(self.atomic_model.classes),
+            'atomic_T': np.array(self.atomic_model.temperature)
+        }
+        if self.route_model is not None:
+            arrays.update({
+                'route_W': self.route_model.W, 'route_b': self.route_model.b,
+                'route_classes': np.array(self.route_model.classes),
+                'route_T': np.array(self.route_model.temperature)
+            })
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> 'LocalAtomizer':
+        data = np.load(path, allow_pickle=False)
+        dim = int(data['dim'])
+
+        def build(prefix):
+            model = HashedSoftmaxClassifier([str(c) for c in data[f'{prefix}_classes']], dim)
+            model.W, model.b = data[f'{prefix}_W'], data[f'{prefix}_b']
+            model.temperature = float(data[f'{prefix}_T'])
+            return model
+
+        return cls(build('atomic'), build('route') if 'route_W' in data.files else None)
+
+
+def keyword_is_atomic(query: str) -> Tuple[bool, str]:
+    """Rule-based fallback; returns (atomic, reason)"""
+    query = query.lower()
+    if _COMPLEX_RE.search(query):
+        return False, 'complex keyword'
+    if _SIMPLE_RE.search(query):
+        return True, 'simple keyword'
+    return True, 'default'
+
+
+class Atomizer:
+    """
+    Pluggable atomizer used by CryptoROMAAgent._is_atomic.
+    ATOMIZER=model uses the local classifier when it is confident enough
+    (ATOMIZER_MIN_CONFIDENCE) and falls back to keyword rules otherwise.
+    """
+
+    def __init__(self, mode: str = None, model_path: str = None, min_confidence: float = None):
+        self.mode = (mode or os.getenv('ATOMIZER', 'keyword')).lower()
+        self.min_confidence = min_confidence or float(os.getenv('ATOMIZER_MIN_CONFIDENCE', 0.8))
+        self.log_path = os.getenv('ATOMIZER_LOG_PATH')
+        self.log_batch = int(os.getenv('ATOMIZER_LOG_BATCH', 50))
+        self.log_flush_s = float(os.getenv('ATOMIZER_LOG_FLUSH_S', 30))
+        self._log_buffer: List[str] = []
+        self._log_oldest = 0.0
+        self._flush_task: Optional[asyncio.Task] = None
+        self.model: Optional[LocalAtomizer] = None
+
+        if self.mode == 'model':
+            path = model_path or os.getenv('ATOMIZER_MODEL_PATH', str(Path(__file__).parent.parent / 'atomizer_model.npz'))
+            try:
+                self.model = LocalAtomizer.load(path)
+                print(f"[ROMA-Atomizer] Local model loaded from {path}")
+            except (OSError, KeyError, ValueError) as e:
+                print(f"[ROMA-Atomizer] Could not load model ({e}), using keyword rules")
+
+    def classify(self, query: str) -> Dict[str, Any]:
+        if self.model is not None:
+            prediction = self.model.predict(query)
+            if prediction['confidence'] >= self.min_confidence:
+                prediction['source'] = 'model'
+                return prediction
+        atomic, reason = keyword_is_atomic(query)
+        return {'atomic': atomic, 'confidence': None, 'source': f'keyword ({reason})'}
+
+    def log(self, query: str, atomic: bool, route: str = None, subtask_count: int = 0):
+        """Buffer a predicted (unlabeled) decision; written in batches off the event loop"""
+        if not self.log_path:
+            return
+        if not self._log_buffer:
+            self._log_oldest = time.monotonic()
+        self._log_buffer.append(json.dumps({
+            'query': query, 'predicted_atomic': atomic, 'predicted_route': route,
+            'subtask_count': subtask_count, 'label_source': 'predicted'
+        }, ensure_ascii=False) + '\n')
+        due = len(self._log_buffer) >= self.log_batch or time.monotonic() - self._log_oldest >= self.log_flush_s
+        if due and (self._flush_task is None or self._flush_task.done()):
+            try:
+                self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+            except RuntimeError:
+                self._write_log(self._take_buffer())  # no event loop (scripts): write inline
+
+    def _take_buffer(self) -> str:
+        lines, self._log_buffer = self._log_buffer, []
+        return ''.join(lines)
+
+    def _write_log(self, text: str):
+        if not text:
+            return
+        try:
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(text)
+        except OSError as e:
+            print(f"[ROMA-Atomizer] Could not write log: {e}")
+
+    async def flush(self):
+        """Write buffered log lines in a worker thread (also called on shutdown)"""
+        if self.log_path and self._log_buffer:
+            await asyncio.to_thread(self._write_log, self._take_buffer())
+
+
+def _read_examples(path: str) -> List[Dict[str, Any]]:
+    examples = []
+    for line in Path(path).read_text(encoding='utf-8').splitlines():
+        if line.strip():
+            record = json.loads(line)
+            if record.get('query') and 'atomic' in record:
+                examples.append(record)
+    return examples
+
+
+def _evaluate(model: HashedSoftmaxClassifier, rows, labels: np.ndarray, bins: int = 10) -> Dict[str, Any]:
+    probs = model.predict_proba(rows)
+    predicted = probs.argmax(axis=1)
+    confidence = probs.max(axis=1)
+    correct = predicted == labels
+
+    # Expected calibration error
+    ece = 0.0
+    edges = np.linspace(0, 1, bins + 1)
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        mask = (confidence > lo) & (confidence <= hi)
+        if mask.any():
+            ece += mask.mean() * abs(correct[mask].mean() - confidence[mask].mean())
+
+    per_class = {}
+    for k, name in enumerate(model.classes):
+        mask = labels == k
+        if mask.any():
+            per_class[name] = round(float(correct[mask].mean()), 3)
+    return {'accuracy': round(float(correct.mean()), 4), 'ece': round(float(ece), 4), 'per_class': per_class, 'n': int(len(labels))}
+
+
+def train(data_path: str, out_path: str, dim: int = DEFAULT_DIM, epochs: int = 30, val_fraction: float = 0.2):
+    examples = _read_examples(data_path)
+    if len(examples) < 10:
+        raise SystemExit(f"Need at least 10 labeled examples, found {len(examples)}")
+
+    rng = np.random.default_rng(42)
+    order = rng.permutation(len(examples))
+    split = int(len(examples) * (1 - val_fraction))
+    train_idx, val_idx = order[:split], order[split:]
+    rows = [featurize(e['query'], dim) for e in examples]
+
+    atomic_labels = np.array([0 if e['atomic'] else 1 for e in examples])
+    atomic_model = HashedSoftmaxClassifier(['atomic', 'complex'], dim)
+    atomic_model.fit([rows[i] for i in train_idx], atomic_labels[train_idx], epochs=epochs)
+    atomic_model.calibrate([rows[i] for i in val_idx], atomic_labels[val_idx])
+    print(f"[ATOMIZER] atomic/complex val: {_evaluate(atomic_model, [rows[i] for i in val_idx], atomic_labels[val_idx])} (T={atomic_model.temperature:.2f})")
+
+    route_model = None
+    routed = [i for i, e in enumerate(examples) if e.get('route')]
+    if routed:
+        routes = sorted({examples[i]['route'] for i in routed})
+        route_labels = np.array([routes.index(e['route']) if e.get('route') else -1 for e in examples])
+        r_train = [i for i in train_idx if route_labels[i] >= 0]
+        r_val = [i for i in val_idx if route_labels[i] >= 0]
+        route_model = HashedSoftmaxClassifier(routes, dim)
+        route_model.fit([rows[i] for i in r_train], route_labels[r_train], epochs=epochs)
+        route_model.calibrate([rows[i] for i in r_val], route_labels[r_val])
+        print(f"[ATOMIZER] route val: {_evaluate(route_model, [rows[i] for i in r_val], route_labels[r_val])} (T={route_model.temperature:.2f})")
+
+    LocalAtomizer(atomic_model, route_model).save(out_path)
+    print(f"[ATOMIZER] Model written to {out_path}")
+
+
+def evaluate(data_path: str, model_path: str):
+    model = LocalAtomizer.load(model_path)
+    examples = _read_examples(data_path)
+    rows = [featurize(e['query'], model.atomic_model.dim) for e in examples]
+    atomic_labels = np.array([0 if e['atomic'] else 1 for e in examples])
+    print(f"[ATOMIZER] atomic/complex: {_evaluate(model.atomic_model, rows, atomic_labels)}")
+
+    keyword_correct = np.mean([keyword_is_atomic(e['query'])[0] == bool(e['atomic']) for e in examples])
+    print(f"[ATOMIZER] keyword baseline accuracy: {keyword_correct:.4f}")
+
+    if model.route_model is not None:
+        known = [i for i, e in enumerate(examples) if e.get('route') in model.route_model.classes]
+        if known:
+            labels = np.array([model.route_model.classes.index(examples[i]['route']) for i in known])
+            print(f"[ATOMIZER] route: {_evaluate(model.route_model, [rows[i] for i in known], labels)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train/evaluate the local atomizer model")
+    sub = parser.add_subparsers(dest='command', required=True)
+    t = sub.add_parser('train')
+    t.add_argument('--data', required=True)
+    t.add_argument('--out', default='atomizer_model.npz')
+    t.add_argument('--dim', type=int, default=DEFAULT_DIM)
+    t.add_argument('--epochs', type=int, default=30)
+    e = sub.add_parser('eval')
+    e.add_argument('--data', required=True)
+    e.add_argument('--model', default='atomizer_model.npz')
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        train(args.data, args.out, args.dim, args.epochs)
+    else:
+        evaluate(args.data, args.model)
+
+
+if __name__ == "__main__":
+    main()
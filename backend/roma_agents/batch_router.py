@@ -0,0 +1,115 @@
+"""
+Batched LLM Routing
+Opt-in (ROUTER_BATCH=1) micro-batcher for route_query: routing requests
+arriving within a short window are classified together in one JSON-mode
+call, so the ~800-token routing prompt is paid once per batch instead of
+once per user. In ROUTER_MODE=combined the batch uses the route_extract
+schema, so batched results carry entities exactly like single calls.
+Results are demultiplexed by index; anything the batch call can't answer
+falls back to a normal single routing call (route_single).
+"""
+import asyncio
+import json
+import os
+from typing import Dict, Any, List, Tuple
+
+from roma_agents.prompts import PROMPTS
+
+
+class BatchRouter:
+    def __init__(self, api_integrations, window: float = None, max_batch: int = None):
+        self.api_integrations = api_integrations
+        self.window = window or float(os.getenv('ROUTER_BATCH_WINDOW_MS', 150)) / 1000
+        self.max_batch = max_batch or int(os.getenv('ROUTER_BATCH_MAX', 16))
+
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle = None
+        self.batches = 0
+        self.batched_queries = 0
+        self.fallbacks = 0
+
+    async def route(self, query: str) -> Dict[str, Any]:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((query, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        results: Dict[int, Dict[str, Any]] = {}
+        if len(batch) > 1:
+            try:
+                results = await self._classify([q for q, _ in batch])
+                self.batches += 1
+                self.batched_queries += len(results)
+                print(f"[BRAIN] Batched routing: {len(results)}/{len(batch)} queries in one call")
+            except Exception as e:
+                print(f"[BRAIN] Batched routing failed, falling back to single calls: {e}")
+
+        async def resolve(index: int, query: str, future: asyncio.Future):
+            result = results.get(index)
+            if result is None:
+                if len(batch) > 1:
+                    self.fallbacks += 1
+                result = await self.api_integrations.route_single(query)
+            if not future.done():
+                future.set_result(result)
+
+        await asyncio.gather(*(resolve(i, q, f) for i, (q, f) in enumerate(batch)), return_exceptions=True)
+        for _, future in batch:
+            if not future.done():
+                future.set_result({'success': False, 'error': 'Routing failed', 'api_source': 'OpenAI Brain'})
+
+    async def _classify(self, queries: List[str]) -> Dict[int, Dict[str, Any]]:
+        """One structured-output call for the whole batch; raises on transport/parse errors"""
+        combined = self.api_integrations.router_mode == 'combined'
+        prompt = 'route_extract_batch' if combined else 'routing_batch'
+        user_content = json.dumps([{'index': i, 'query': q} for i, q in enumerate(queries)], ensure_ascii=False)
+        response = await self.api_integrations.llm.complete(
+            'routing', PROMPTS.messages(prompt, user_content),
+            max_tokens=(110 if combined else 60) * len(queries) + 50, temperature=0.1, json_mode=True
+        )
+        if not response['success']:
+            raise RuntimeError(response.get('error'))
+        self.api_integrations.token_usage.record(
+            prompt, response, response['latency'], PROMPTS.estimate(prompt, user_content)
+        )
+        content = response['content']
+
+        routes = json.loads(content).get('routes', [])
+        results = {}
+        for route in routes:
+            index = route.get('index')
+            if not isinstance(index, int) or not 0 <= index < len(queries) or not route.get('selected_api'):
+                continue
+            if combined:
+                results[index] = self.api_integrations.combined_route_result(route, 'OpenAI Brain (batched, combined)')
+                continue
+            results[index] = {
+                'success': True,
+                'selected_api': route.get('selected_api', 'perplexity'),
+                'reason': route.get('reason', 'Default routing'),
+                'confidence': route.get('confidence', 0.7),
+                'clarification': route.get('clarification', ''),
+                'api_source': 'OpenAI Brain (batched)'
+            }
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'batches': self.batches,
+            'batched_queries': self.batched_queries,
+            'fallbacks': self.fallbacks,
+            'window_ms': self.window * 1000
+        }
@@ -0,0 +1,149 @@
+"""
+Broadcast / Fan-out with Backpressure
+Every connection gets a bounded outbound queue drained by its own writer
+task, so one stalled client never blocks a broadcast or grows server memory:
+- coalescing: a queued message with the same key is replaced in place (latest price wins)
+- overflow policy: drop_oldest | drop_new | disconnect
+- slow consumers whose single send stalls past the timeout are disconnected
+"""
+import asyncio
+import itertools
+import os
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Optional
+
+from roma_agents import wire_codec
+
+POLICIES = ('drop_oldest', 'drop_new', 'disconnect')
+
+
+class _ClientQueue:
+    """Outbound queue + writer task for one websocket"""
+
+    def __init__(self, broadcaster: 'Broadcaster', websocket):
+        self.broadcaster = broadcaster
+        self.websocket = websocket
+        self.pending: 'OrderedDict[Any, Any]' = OrderedDict()
+        self.wakeup = asyncio.Event()
+        self.closed = False
+        self.writer = asyncio.create_task(self._drain())
+
+    def put(self, frame, coalesce_key=None) -> bool:
+        if self.closed:
+            return False
+
+        key = coalesce_key if coalesce_key is not None else next(self.broadcaster._sequence)
+        if key in self.pending:
+            # Superseded message: keep its queue position, send the newest content
+            self.pending[key] = frame
+            self.broadcaster.coalesced += 1
+            return True
+
+        if len(self.pending) >= self.broadcaster.max_queue:
+            policy = self.broadcaster.policy
+            if policy == 'drop_new':
+                self.broadcaster.dropped += 1
+                return False
+            if policy == 'disconnect':
+                self.close('send queue overflow')
+                return False
+            self.pending.popitem(last=False)
+            self.broadcaster.dropped += 1
+
+        self.pending[key] = frame
+        self.wakeup.set()
+        return True
+
+    async def _drain(self):
+        try:
+            while True:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                while self.pending:
+                    _, frame = self.pending.popitem(last=False)
+                    try:
+                        await asyncio.wait_for(self.websocket.send(frame), self.broadcaster.send_timeout)
+                    except asyncio.TimeoutError:
+                        self.close('slow consumer')
+                        return
+                    self.broadcaster.frames_sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # Connection closed underneath us; unregister_client cleans up
+            self.closed = True
+
+    def close(self, reason: str):
+        if self.closed:
+            return
+        self.closed = True
+        self.pending.clear()
+        self.broadcaster.disconnects += 1
+        print(f"[BROADCAST] Disconnecting client: {reason}")
+        # 1013 = Try Again Later
+        asyncio.create_task(self.websocket.close(1013, reason))
+
+
+class Broadcaster:
+    """Registry of per-connection queues plus publish/broadcast helpers"""
+
+    def __init__(self, max_queue: int = None, policy: str = None, send_timeout: float = None):
+        self.max_queue = max_queue or int(os.getenv('BROADCAST_MAX_QUEUE', 64))
+        self.policy = policy or os.getenv('BROADCAST_OVERFLOW_POLICY', 'drop_oldest')
+        if self.policy not in POLICIES:
+            print(f"[BROADCAST] Unknown overflow policy '{self.policy}', using drop_oldest")
+            self.policy = 'drop_oldest'
+        self.send_timeout = send_timeout or float(os.getenv('BROADCAST_SEND_TIMEOUT', 10))
+
+        self.queues: Dict[Any, _ClientQueue] = {}
+        self.frames_sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.disconnects = 0
+        self._sequence = itertools.count()
+
+    def register(self, websocket):
+        if websocket not in self.queues:
+            self.queues[websocket] = _ClientQueue(self, websocket)
+
+    def unregister(self, websocket):
+        queue = self.queues.pop(websocket, None)
+        if queue:
+            queue.closed = True
+            queue.writer.cancel()
+
+    def publish(self, websocket, message: Dict[str, Any], coalesce_key=None) -> bool:
+        """Queue one message for one client (non-blocking)"""
+        queue = self.queues.get(websocket)
+        if queue is None:
+            return False
+        return queue.put(wire_codec.encode(message, websocket.subprotocol), coalesce_key)
+
+    def broadcast(self, message: Dict[str, Any], recipients: Optional[Iterable[Any]] = None, coalesce_key=None) -> int:
+        """Queue a message for many clients; encodes once per wire format. Returns number queued."""
+        targets = self.queues if recipients is None else recipients
+        frames = {}
+        queued = 0
+        for websocket in targets:
+            queue = self.queues.get(websocket)
+            if queue is None:
+                continue
+            protocol = websocket.subprotocol
+            if protocol not in frames:
+                frames[protocol] = wire_codec.encode(message, protocol)
+            if queue.put(frames[protocol], coalesce_key):
+                queued += 1
+        return queued
+
+    def get_stats(self) -> Dict[str, Any]:
+        depths = [len(q.pending) for q in self.queues.values()]
+        return {
+            'clients': len(self.queues),
+            'queued_frames': sum(depths),
+            'max_queue_depth': max(depths) if depths else 0,
+            'frames_sent': self.frames_sent,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'slow_disconnects': self.disconnects,
+            'policy': self.policy
+        }
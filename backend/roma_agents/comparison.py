@@ -0,0 +1,184 @@
+"""
+Multi-Coin Comparison Engine
+"btc vs eth", "compare sol ada dot", "top 10 coins": instead of one planner
+subtask per coin plus a long synthesis prompt, fetch every coin's metrics in
+one batched /simple/price call (fresh live-feed quotes are used as-is), or
+one /coins/markets call when the query asks for a top-N without naming coins,
+and rank them in NumPy. The structured result renders as a markdown table and
+only a short table-sized prompt goes to the synthesis LLM.
+"""
+import os
+import re
+import time
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+_COMPARE_RE = re.compile(r'\b(vs\.?|versus|compare|comparison|better|best|top\s*\d*|rank|ranking)\b|so sánh|tốt nhất', re.IGNORECASE)
+# "top 10 coins", "best altcoins", "top 5 defi tokens", "coin tốt nhất" - a ranking of coins, not
+# "top crypto news" or "best wallet for bitcoin"
+_TOP_RE = re.compile(
+    r'\b(?:top|best|biggest|largest)\s*(\d{1,2})?\s+(?:[\w-]+\s+){0,2}?'
+    r'(?:coins?|tokens?|cryptos?|cryptocurrenc(?:y|ies)|altcoins?|alts)\b'
+    r'(?!\s+(?:news|headlines|stories|articles|updates|reasons|wallets?|exchanges?))'
+    r'|\btop\s*(\d{1,2})?\s+coin|coin\s+tốt nhất',
+    re.IGNORECASE
+)
+
+# Metrics in table order; True = higher is better for ranking
+METRICS = [('price', None), ('change_24h', True), ('market_cap', True), ('volume', True)]
+
+
+def is_comparison_query(query: str) -> bool:
+    return bool(_COMPARE_RE.search(query))
+
+
+def top_n(query: str, default: int) -> Optional[int]:
+    """N for "top N coins"-style queries, None when the query doesn't ask for a ranking of coins"""
+    match = _TOP_RE.search(query)
+    if not match:
+        return None
+    n = match.group(1) or match.group(2)
+    return min(50, int(n)) if n else default
+
+
+def compare(quotes: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Ranked comparison table + relative metrics for {coin_id: quote}"""
+    coins = [c for c, q in quotes.items() if q and q.get('price')]
+    if len(coins) < 2:
+        return {'success': False, 'error': 'Need at least two coins with market data'}
+
+    matrix = np.array([[float(quotes[c].get(m) or 0.0) for m, _ in METRICS] for c in coins])
+    price, change, mcap, volume = matrix.T
+
+    # Rank 1 = best per metric (argsort of argsort gives each coin's position)
+    ranks = {}
+    for column, (metric, higher_better) in enumerate(METRICS):
+        if higher_better is None:
+            continue
+        order = np.argsort(-matrix[:, column] if higher_better else matrix[:, column], kind='stable')
+        position = np.empty(len(coins), dtype=np.int64)
+        position[order] = np.arange(1, len(coins) + 1)
+        ranks[metric] = position
+
+    total_mcap = mcap.sum()
+    mcap_share = mcap / total_mcap if total_mcap > 0 else np.zeros(len(coins))
+    turnover = np.divide(volume, mcap, out=np.zeros(len(coins)), where=mcap > 0)
+    spread = change.std()
+    change_z = (change - change.mean()) / spread if spread > 0 else np.zeros(len(coins))
+    # Composite: average rank across momentum, size and liquidity (lower is better)
+    composite = np.mean([ranks['change_24h'], ranks['market_cap'], ranks['volume']], axis=0)
+
+    by_mcap = np.argsort(-mcap, kind='stable')
+    table = [
+        {
+            'coin': coins[i],
+            'price': float(price[i]),
+            'change_24h': float(change[i]),
+            'market_cap': float(mcap[i]),
+            'volume': float(volume[i]),
+            'mcap_share': float(mcap_share[i]),
+            'turnover': float(turnover[i]),
+            'change_z': float(change_z[i]),
+            'ranks': {metric: int(position[i]) for metric, position in ranks.items()},
+            'composite_rank': float(composite[i])
+        }
+        for i in by_mcap
+    ]
+    leaders = {metric: coins[int(np.argmin(position))] for metric, position in ranks.items()}
+    leaders['overall'] = coins[int(np.argmin(composite))]
+    return {
+        'success': True,
+        'coins': [coins[i] for i in by_mcap],
+        'table': table,
+        'leaders': leaders,
+        'change_spread': float(change.max() - change.min())
+    }
+
+
+def _money(value: float) -> str:
+    if value >= 1e12:
+        return f"${value / 1e12:,.2f}T"
+    if value >= 1e9:
+        return f"${value / 1e9:,.2f}B"
+    if value >= 1e6:
+        return f"${value / 1e6:,.2f}M"
+    return f"${value:,.2f}" if value >= 1 else f"${value:.6g}"
+
+
+def render_table(result: Dict[str, Any]) -> str:
+    lines = [
+        "| # | Coin | Price | 24h | Market Cap | Share | Volume | Vol/MCap |",
+        "|---|------|-------|-----|------------|-------|--------|----------|"
+    ]
+    for i, row in enumerate(result['table'], 1):
+        lines.append(
+            f"| {i} | {row['coin']} | {_money(row['price'])} | {row['change_24h']:+.2f}% | {_money(row['market_cap'])} "
+            f"| {row['mcap_share'] * 100:.1f}% | {_money(row['volume'])} | {row['turnover'] * 100:.1f}% |"
+        )
+    leaders = result['leaders']
+    lines.append("")
+    lines.append(
+        f"Leaders: 24h {leaders['change_24h']}, market cap {leaders['market_cap']}, volume {leaders['volume']}, "
+        f"overall {leaders['overall']} (24h spread {result['change_spread']:.2f} pts)"
+    )
+    return '\n'.join(lines)
+
+
+class ComparisonEngine:
+    def __init__(self, api_integrations, snapshot: Dict[str, Dict[str, Any]] = None):
+        self.api_integrations = api_integrations
+        self.snapshot = snapshot  # live feed quotes (PriceSubscriptionHub.last_prices), set by the server
+        self.snapshot_max_age = float(os.getenv('COMPARE_SNAPSHOT_MAX_AGE', 60))
+        self.default_top_n = int(os.getenv('COMPARE_TOP_N', 10))
+        self.comparisons = 0
+        self.upstream_calls = 0
+        self.snapshot_hits = 0
+
+    async def quotes(self, coin_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fresh live-feed quotes first, everything else in one batched /simple/price call"""
+        quotes, missing = {}, []
+        now = time.time()
+        for coin_id in dict.fromkeys(coin_ids):
+            quote = (self.snapshot or {}).get(coin_id)
+            if quote and quote.get('last_updated_at') and now - quote['last_updated_at'] <= self.snapshot_max_age:
+                quotes[coin_id] = quote
+                self.snapshot_hits += 1
+            else:
+                missing.append(coin_id)
+        if missing:
+            self.upstream_calls += 1
+            result = await self.api_integrations.get_coingecko_prices(missing)
+            if result.get('success'):
+                quotes.update(result['prices'])
+        return quotes
+
+    async def run(self, query: str, coin_ids: List[str]) -> Dict[str, Any]:
+        """Compare the named coins, or the top N by market cap when none are named"""
+        coin_ids = [c for c in dict.fromkeys(coin_ids or []) if c]
+        if len(coin_ids) == 1:
+            return {'success': False, 'error': 'Only one coin named'}
+        if len(coin_ids) >= 2:
+            quotes = await self.quotes(coin_ids)
+        else:
+            n = top_n(query, self.default_top_n)
+            if n is None:
+                return {'success': False, 'error': 'No coins to compare'}
+            self.upstream_calls += 1
+            markets = await self.api_integrations.get_coingecko_markets(n)
+            if not markets.get('success'):
+                return {'success': False, 'error': markets.get('error')}
+            quotes = markets['prices']
+
+        self.comparisons += 1
+        started = time.perf_counter()
+        result = compare(quotes)
+        if result['success']:
+            result['compute_ms'] = round((time.perf_counter() - started) * 1000, 3)
+            missing = [c for c in coin_ids if c not in quotes]
+            if missing:
+                result['missing'] = missing
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'comparisons': self.comparisons, 'upstream_calls': self.upstream_calls, 'snapshot_hits': self.snapshot_hits}
@@ -9,9 +9,18 @@ from pathlib import Path
 # Add ROMA to path
 sys.path.append(str(Path(__file__).parent.parent / 'ROMA' / 'src'))
 
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import asyncio
 from roma_agents.api_integrations import APIIntegrations
+from roma_agents.atomizer import Atomizer
+from roma_agents.comparison import ComparisonEngine, is_comparison_query, render_table, top_n
+from roma_agents.image_cache import ImageCache
+from roma_agents.knowledge_store import KnowledgeStore
+from roma_agents.market_series import MarketSeriesStore, is_trend_query
+from roma_agents.prompts import PROMPTS
+from roma_agents.synthesizer import TemplateSynthesizer
+from roma_agents.task_dag import build_dag, RequestMemo, TaskDAG
+from roma_agents.warm_cache import TTLCache, normalize_key
 
 class CryptoROMAAgent:
     """
@@ -22,6 +31,15 @@ class CryptoROMAAgent:
     def __init__(self):
         self.api_integrations = APIIntegrations()
         self.max_recursion_depth = 2  # Prevent infinite loops
+        self.image_jobs = None  # ImageJobQueue, set by the WebSocket server for non-blocking images
+        self.image_cache = ImageCache()
+        self.atomizer = Atomizer()
+        self.knowledge = KnowledgeStore()
+        self.market_series = MarketSeriesStore(self.api_integrations)
+        self.comparison = ComparisonEngine(self.api_integrations)
+        self.synthesizer = TemplateSynthesizer()
+        self.plan_cache = TTLCache('plans', float(os.getenv('PLAN_CACHE_TTL', 3600)), capacity=500)
+        self.answer_cache = TTLCache('answers', float(os.getenv('ANSWER_CACHE_TTL', 6 * 3600)), capacity=2000)
         print("[ROMA] Crypto Research Agent initialized")
     
     async def solve(self, task: Dict[str, Any], depth: int = 0) -> Dict[str, Any]:
@@ -37,28 +55,61 @@ class CryptoROMAAgent:
             print(f"[ROMA-SOLVE] Task type: {task_type}, Depth: {depth}/{self.max_recursion_depth}")
             print("="*60)
             
+            # One memo per request, shared by every node of the solve tree
+            if 'memo' not in task:
+                task['memo'] = RequestMemo()
+            
             # Check recursion depth limit
             if depth >= self.max_recursion_depth:
                 print(f"[ROMA-SOLVE] MAX DEPTH REACHED - Forcing atomic execution")
                 return await self._execute(task)
+            if task.get('degraded'):
+                print(f"[ROMA-SOLVE] Server under load - degraded to atomic execution")
+                return await self._execute(task)
+            
+            # Coin comparisons: one batched fetch + NumPy ranking instead of a subtask per coin.
+            # Checked before the atomizer, which reads short "btc vs eth" queries as atomic;
+            # the route is memoized, so a non-comparison falls through without a second call.
+            if is_comparison_query(query) and not is_trend_query(query) and not task.get('context'):
+                comparison = await self._compare(task)
+                if comparison is not None:
+                    return comparison
             
             # Step 1: Atomizer - Is this task atomic?
             if await self._is_atomic(task):
                 # Step 2: Executor - Execute atomic task
                 return await self._execute(task)
             else:
-                # Step 2: Planner - Break down into subtasks
-                subtasks = await self._plan(task)
+                # Step 2: Planner - Break down into a DAG of subtasks
+                dag = await self._plan(task)
+                self.atomizer.log(query, atomic=False, subtask_count=len(dag))
+                memo = task['memo']
+                
+                ancestors = task.get('ancestors', frozenset())
+                
+                async def solve_node(node, dep_results):
+                    # Children inherit the request identity and memo; dependency results become context
+                    subtask = {
+                        **node.to_task(), 'user': task.get('user'), 'client': task.get('client'),
+                        'memo': memo, 'ancestors': ancestors | {node.key}
+                    }
+                    context = [self._summarize_result(r) for r in dep_results if r.get('success')]
+                    if context:
+                        subtask['context'] = context
+                    print(f"[ROMA-SOLVE] Processing node {node.id} [{node.type}]: {node.query[:50]}")
+                    if node.key in ancestors:
+                        # Re-planned into itself: answer directly instead of waiting on our own memo entry
+                        return await self._execute(subtask)
+                    return await memo.get(('node', node.key), lambda: self.solve(subtask, depth + 1))
                 
-                # Recursive solve for each subtask
-                results = []
-                for i, subtask in enumerate(subtasks, 1):
-                    print(f"[ROMA-SOLVE] Processing subtask {i}/{len(subtasks)}: {subtask.get('query', '')[:50]}")
-                    result = await self.solve(subtask, depth + 1)  # Pass depth + 1
-                    results.append(result)
+                # Recursive solve, each node starts as soon as its dependencies finish
+                results = await dag.run(solve_node)
+                print(f"[ROMA-SOLVE] DAG done: {len(dag)} nodes, memo hits {memo.hits}")
                 
-                # Step 3: Aggregator - Combine results
-                return await self._aggregate(task, results)
+                # Step 3: Aggregator - Combine results (coins feed the market-series indicators)
+                coins = [n.coin for n in dag.nodes if n.coin]
+                coins += [c for r in results for c in (r.get('entities') or {}).get('coin_ids', [])]
+                return await self._aggregate(task, results, coins)
         
         except Exception as e:
             error_msg = str(e)
@@ -75,108 +126,102 @@ class CryptoROMAAgent:
     async def _is_atomic(self, task: Dict[str, Any]) -> bool:
         """
         Atomizer: Determine if task can be executed directly or needs decomposition
+        (local classifier when confident, keyword rules otherwise - see roma_agents.atomizer)
         """
-        query = task.get('query', '').lower()
-        
-        # COMPLEX research questions need ROMA's multi-source analysis
-        complex_keywords = [
-            'should i', 'worth', 'buy',  # Investment/purchase questions
-            'why', 'how', 'analyze', 'compare',  # Analysis requests
-            'where', 'which',  # Location/selection questions
-            'trend', 'future', 'predict', 'forecast',  # Predictions
-            'best coin', 'top', 'which coin'  # Comparisons
-        ]
-        
-        for keyword in complex_keywords:
-            if keyword in query:
-                print(f"[ROMA-Atomizer] COMPLEX task detected - needs planning: {query[:50]}")
-                return False
-        
-        # SIMPLE queries are atomic (price, news, single fact)
-        simple_keywords = ['price', 'gia', 'check', 'cost', 'value', 'news', 'tin tuc']
-        for keyword in simple_keywords:
-            if keyword in query:
-                print(f"[ROMA-Atomizer] ATOMIC task - direct execution: {query[:50]}")
-                return True
+        query = task.get('query', '')
+        decision = self.atomizer.classify(query)
         
-        # Default: atomic for safety
-        print(f"[ROMA-Atomizer] Default to ATOMIC: {query[:50]}")
-        return True
+        label = 'ATOMIC task - direct execution' if decision['atomic'] else 'COMPLEX task detected - needs planning'
+        confidence = f", p={decision['confidence']:.2f}" if decision.get('confidence') is not None else ''
+        print(f"[ROMA-Atomizer] {label} [{decision['source']}{confidence}]: {query[:50]}")
+        return decision['atomic']
     
-    async def _plan(self, task: Dict[str, Any]) -> List[Dict[str, Any]]:
+    async def _plan(self, task: Dict[str, Any]) -> TaskDAG:
         """
-        Planner: Use OpenAI to break down complex queries into optimal subtasks
+        Planner: Use the planning LLM to break down complex queries into optimal subtasks
         """
         query = task.get('query', '')
         print(f"[ROMA-Planner] Planning multi-source research for: {query[:50]}...")
         
-        # Use OpenAI to intelligently plan subtasks
-        planning_prompt = f"""You are a crypto research task planner. Break down this query into 2-3 specific subtasks.
-
-Query: "{query}"
-
-Available APIs:
-- CoinGecko: Get price, market cap, volume for specific coins
-- Perplexity: Deep research, analysis, recommendations, explanations
-- RSS News: Latest crypto news
-
-Rules:
-1. For investment questions ("co nen mua", "should I buy"): price + news + analysis
-2. For location questions ("mua o dau", "where to buy"): price + exchange recommendations
-3. For comparison ("btc vs eth"): data for both coins + comparison analysis
-4. For analysis ("why", "how"): supporting data + deep research
-
-Output JSON array of subtasks:
-[
-  {{"query": "bitcoin price", "type": "price"}},
-  {{"query": "best bitcoin exchanges 2025", "type": "analysis"}},
-  {{"query": "bitcoin buying guide", "type": "analysis"}}
-]
-
-Return ONLY the JSON array, no explanation."""
+        cached = self.plan_cache.get(normalize_key(query))
+        if cached:
+            dag = build_dag(cached)
+            print(f"[ROMA-Planner] Plan cache hit ({len(dag)} nodes)")
+            return dag
+        
+        # Static planner prefix + query at the tail (prefix-cache friendly)
+        user_content = f'Query: "{query}"'
 
         try:
-            # Call OpenAI for intelligent planning
-            url = "https://api.openai.com/v1/chat/completions"
-            headers = {
-                "Authorization": f"Bearer {self.api_integrations.openai_api_key}",
-                "Content-Type": "application/json"
-            }
-            payload = {
-                "model": "gpt-4.1-mini",
-                "messages": [{"role": "user", "content": planning_prompt}],
-                "max_tokens": 300,
-                "temperature": 0.3
-            }
-            
-            import aiohttp
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, json=payload) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        plan_text = data['choices'][0]['message']['content'].strip()
-                        
-                        # Parse JSON response
-                        import json
-                        # Remove markdown code blocks if present
-                        if '```json' in plan_text:
-                            plan_text = plan_text.split('```json')[1].split('```')[0].strip()
-                        elif '```' in plan_text:
-                            plan_text = plan_text.split('```')[1].split('```')[0].strip()
-                        
-                        subtasks = json.loads(plan_text)
-                        print(f"[ROMA-Planner] OpenAI created {len(subtasks)} subtasks:")
-                        for i, st in enumerate(subtasks, 1):
-                            print(f"  [{i}] Query: '{st.get('query', '')}' | Type: {st.get('type', 'unknown')}")
-                        return subtasks
-                    else:
-                        print(f"[ROMA-Planner] OpenAI planning failed: {response.status}")
+            # Planner LLM (gpt-4.1-mini by default, picked per call by latency/cost)
+            response = await self.api_integrations.llm.complete(
+                'planning', PROMPTS.messages('planning', user_content), max_tokens=400, temperature=0.3, json_mode=True
+            )
+            if response['success']:
+                self.api_integrations.token_usage.record(
+                    'planning', response, response['latency'], PROMPTS.estimate('planning', user_content)
+                )
+                plan_text = response['content']
+                
+                # Parse JSON response
+                import json
+                # Remove markdown code blocks if present
+                if '```json' in plan_text:
+                    plan_text = plan_text.split('```json')[1].split('```')[0].strip()
+                elif '```' in plan_text:
+                    plan_text = plan_text.split('```')[1].split('```')[0].strip()
+                
+                plan = json.loads(plan_text)
+                dag = build_dag(plan)
+                if len(dag):
+                    print(f"[ROMA-Planner] {response['api_source']} created {len(dag)} nodes:")
+                    for line in dag.describe():
+                        print(f"  {line}")
+                    self.plan_cache.put(normalize_key(query), plan)
+                    return dag
+                print(f"[ROMA-Planner] Plan had no usable nodes")
+            else:
+                print(f"[ROMA-Planner] Planning failed: {response.get('error')}")
         except Exception as e:
-            print(f"[ROMA-Planner] OpenAI planning exception: {str(e)}")
+            print(f"[ROMA-Planner] Planning exception: {str(e)}")
         
         # Fallback: Use original query as single task
         print(f"[ROMA-Planner] Fallback to single task")
-        return [task]
+        return build_dag([{'query': query, 'type': 'analysis'}])
+    
+    async def _compare(self, task: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Comparison fast path; None unless the query names 2+ coins, or names none and asks for top N coins"""
+        query = task.get('query', '')
+        route = await self._memoized(task, ('route', normalize_key(query)), lambda: self.api_integrations.route_query(query))
+        coin_ids = ((route.get('entities') or {}).get('coin_ids') or []) if route.get('success') else []
+        coin_ids = list(dict.fromkeys(c for c in coin_ids if c))
+        if len(coin_ids) == 1 or (not coin_ids and top_n(query, 1) is None):
+            return None  # a single named coin (e.g. "best wallet for bitcoin") goes to the planner
+        
+        result = await self._memoized(
+            task, ('compare', tuple(coin_ids) or normalize_key(query)), lambda: self.comparison.run(query, coin_ids)
+        )
+        if not result['success']:
+            print(f"[ROMA-Compare] Falling back to planner: {result.get('error')}")
+            return None
+        print(f"[ROMA-Compare] Ranked {len(result['coins'])} coins in {result['compute_ms']}ms")
+        
+        table = render_table(result)
+        synthesis = await self.api_integrations.analyze_with_openai(
+            table, f"Original question: {query}. Answer in 2-3 sentences using only the table."
+        )
+        content = f"{table}\n\n{synthesis['analysis']}" if synthesis.get('success') else table
+        return {
+            'success': True,
+            'data': {'content': content, 'comparison': result, 'api_source': 'ROMA Comparison'},
+            'query': query,
+            'api': 'ROMA Comparison'
+        }
+    
+    async def _memoized(self, task: Dict[str, Any], key, factory):
+        """Upstream call shared across the request's solve tree (plain call outside a solve)"""
+        memo = task.get('memo')
+        return await memo.get(key, factory) if memo is not None else await factory()
     
     async def _execute(self, task: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -189,9 +234,21 @@ Return ONLY the JSON array, no explanation."""
         print(f"[ROMA-Executor] Query: {query}")
         print(f"[ROMA-Executor] Type: {task_type}")
         
+        # Typed DAG nodes with a known coin don't need the routing LLM
+        node_coin = task.get('coin')
+        if task_type == 'price' and node_coin:
+            context_analysis = {'success': True, 'selected_api': 'coingecko', 'entities': {'coin_ids': [node_coin]}}
+        elif task_type == 'news' and node_coin:
+            context_analysis = {'success': True, 'selected_api': 'rss_news', 'entities': {'coin_ids': [node_coin]}}
+        else:
+            context_analysis = None
+        
         # Use OpenAI to route to correct API
         try:
-            context_analysis = await self.api_integrations.analyze_context_with_openai(query)
+            if context_analysis is None:
+                context_analysis = await self._memoized(
+                    task, ('route', normalize_key(query)), lambda: self.api_integrations.route_query(query)
+                )
             
             if not context_analysis['success']:
                 error_detail = context_analysis.get('error', 'Unknown error')
@@ -213,18 +270,25 @@ Return ONLY the JSON array, no explanation."""
         
         selected_api = context_analysis['selected_api']
         print(f"[ROMA-Executor] Routing to: {selected_api}")
+        self.atomizer.log(query, atomic=True, route=selected_api)
         
         # Route to appropriate API
         if selected_api == 'coingecko':
             print(f"[ROMA-Executor] Routing to CoinGecko")
             # Extract coin (name/symbol/ticker) with OpenAI GPT-4o-mini
-            coin_extraction = await self.api_integrations.extract_coin_name_with_openai(query)
-            print(f"[ROMA-Executor] OpenAI GPT-4o-mini extraction: {coin_extraction}")
+            entities = context_analysis.get('entities') or {}
+            if entities.get('coin_ids'):
+                # Combined routing already extracted the coin - no second LLM call
+                coin_extraction = {'success': True, 'coin_id': entities['coin_ids'][0]}
+                print(f"[ROMA-Executor] Coin from combined routing: {coin_extraction['coin_id']}")
+            else:
+                coin_extraction = await self.api_integrations.extract_coin_name_with_openai(query)
+                print(f"[ROMA-Executor] OpenAI GPT-4o-mini extraction: {coin_extraction}")
             
             if coin_extraction['success']:
                 coin_id = coin_extraction['coin_id']
                 print(f"[ROMA-Executor] Fetching CoinGecko data for: {coin_id}")
-                result = await self.api_integrations.get_coingecko_data(coin_id)
+                result = await self._memoized(task, ('coingecko', coin_id), lambda: self.api_integrations.get_coingecko_data(coin_id))
                 print(f"[ROMA-Executor] CoinGecko result success: {result.get('success')}")
                 if result.get('success'):
                     print(f"[ROMA-Executor] Coin: {result.get('name')} ({result.get('symbol')}) = ${result.get('price')}")
@@ -233,7 +297,8 @@ Return ONLY the JSON array, no explanation."""
                     'success': result.get('success', False),
                     'data': result,
                     'query': query,
-                    'api': 'CoinGecko'
+                    'api': 'CoinGecko',
+                    'entities': entities
                 }
             else:
                 print(f"[ROMA-Executor] OpenAI extraction FAILED: {coin_extraction.get('error')}")
@@ -245,12 +310,44 @@ Return ONLY the JSON array, no explanation."""
                 }
         
         elif selected_api == 'perplexity':
-            # Worker: Gemini answers simple questions (with OpenAI backup)
+            # Local knowledge store first: definitions don't need an LLM round trip
+            knowledge = self.knowledge.lookup(query)
+            if knowledge['answer']:
+                return {
+                    'success': True,
+                    'data': {'content': knowledge['answer'], 'api_source': 'Local Knowledge'},
+                    'query': query,
+                    'api': 'Local Knowledge'
+                }
+            
+            # Answers built on live dependency results (prices, news) aren't reusable
+            answer_key = normalize_key(query) if not task.get('context') else None
+            cached = self.answer_cache.get(answer_key) if answer_key else None
+            if cached:
+                print(f"[WORKER] Answer cache hit")
+                return {'success': True, 'data': cached, 'query': query, 'api': 'Cache'}
+            
+            # Worker: Gemini answers simple questions (OpenAI backup), fastest healthy provider first
             try:
-                print(f"[WORKER] Trying Gemini for simple answer...")
+                print(f"[WORKER] Answering simple question...")
+                
+                notes = task.get('context', []) + knowledge['context']
+                if notes:
+                    # Retrieved context / dependency results replace the few-shot examples -> shorter prompt
+                    context_text = '\n'.join(f"- {c}" for c in notes)
+                    research_prompt = f"""Answer this question in English: {query}
+
+Reference notes:
+{context_text}
+
+Use the notes where relevant. Respond in English, 2-3 sentences.
+
+Answer:"""
+                else:
+                    research_prompt = None
                 
                 # Use Gemini for concise answers - ALWAYS in English
-                research_prompt = f"""Answer this question in English: {query}
+                research_prompt = research_prompt or f"""Answer this question in English: {query}
 
 REQUIREMENTS:
 - ALWAYS respond in English (never Vietnamese)
@@ -264,77 +361,41 @@ Examples:
 
 Answer:"""
                 
-                import google.generativeai as genai
-                genai.configure(api_key=self.api_integrations.gemini_api_key)
-                model = genai.GenerativeModel('gemini-1.5-flash')
-                
-                generation_config = {
-                    'temperature': 0.2,
-                    'max_output_tokens': 150
-                }
-                
-                response = model.generate_content(research_prompt, generation_config=generation_config)
-                content = response.text.strip()
-                print(f"[WORKER] Gemini success")
+                response = await self.api_integrations.llm.complete(
+                    'worker', [{"role": "user", "content": research_prompt}], max_tokens=150, temperature=0.2
+                )
+                if not response['success']:
+                    raise RuntimeError(response.get('error'))
+                content = response['content']
+                api = 'Gemini' if response['provider'].startswith('gemini') else 'OpenAI'
+                api_source = 'Gemini Worker' if api == 'Gemini' else 'OpenAI Backup'
+                print(f"[WORKER] {response['api_source']} success")
+                if answer_key:
+                    self.answer_cache.put(answer_key, {'content': content, 'api_source': api_source})
                 
                 return {
                     'success': True,
-                    'data': {'content': content, 'api_source': 'Gemini Worker'},
+                    'data': {'content': content, 'api_source': api_source},
                     'query': query,
-                    'api': 'Gemini'
+                    'api': api
                 }
                 
             except Exception as e:
-                print(f"[WORKER] Gemini FAILED: {str(e)}")
-                print(f"[WORKER] Falling back to OpenAI...")
-                
-                # Backup: OpenAI takes over
-                try:
-                    import aiohttp
-                    url = "https://api.openai.com/v1/chat/completions"
-                    headers = {
-                        "Authorization": f"Bearer {self.api_integrations.openai_api_key}",
-                        "Content-Type": "application/json"
-                    }
-                    payload = {
-                        "model": "gpt-4o-mini",
-                        "messages": [{"role": "user", "content": research_prompt}],
-                        "max_tokens": 150,
-                        "temperature": 0.2
-                    }
-                    
-                    async with aiohttp.ClientSession() as session:
-                        async with session.post(url, headers=headers, json=payload) as response:
-                            if response.status == 200:
-                                data = await response.json()
-                                content = data['choices'][0]['message']['content']
-                                print(f"[WORKER] OpenAI backup success")
-                                return {
-                                    'success': True,
-                                    'data': {'content': content, 'api_source': 'OpenAI Backup'},
-                                    'query': query,
-                                    'api': 'OpenAI'
-                                }
-                            else:
-                                return {
-                                    'success': False,
-                                    'error': f'Both Gemini and OpenAI failed',
-                                    'query': query,
-                                    'api': 'None'
-                                }
-                except Exception as openai_error:
-                    print(f"[WORKER] OpenAI backup also FAILED: {str(openai_error)}")
-                    return {
-                        'success': False,
-                        'error': f'All LLMs failed: Gemini ({str(e)}), OpenAI ({str(openai_error)})',
-                        'query': query,
-                        'api': 'None'
-                    }
+                print(f"[WORKER] All LLMs FAILED: {str(e)}")
+                return {
+                    'success': False,
+                    'error': f'All LLMs failed: {str(e)}',
+                    'query': query,
+                    'api': 'None'
+                }
         
         elif selected_api == 'rss_news':
             try:
                 print(f"[ROMA-Executor] Calling RSS News...")
-                result = await self.api_integrations.get_rss_news(query)
+                news_query = f"{node_coin} news" if node_coin else query
+                result = await self._memoized(
+                    task, ('news', node_coin or normalize_key(query)), lambda: self.api_integrations.get_rss_news(news_query)
+                )
                 print(f"[ROMA-Executor] RSS result: success={result.get('success')}")
                 
                 if result.get('success'):
@@ -369,7 +430,10 @@ Answer:"""
             
             # Extract user's image description
             user_description = query
-            if 'create image' in query.lower():
+            image_description = (context_analysis.get('entities') or {}).get('image_description')
+            if image_description:
+                user_description = image_description.strip()
+            elif 'create image' in query.lower():
                 user_description = query.split('create image', 1)[1].strip()
             elif 'tao hinh' in query.lower():
                 user_description = query.split('tao hinh', 1)[1].strip()
@@ -388,17 +452,22 @@ Answer:"""
                     'needs_clarification': True
                 }
             
-            # STEP 1: Enhance prompt with Gemini (primary) or OpenAI (backup)
-            print(f"[BRAIN] Enhancing image prompt...")
+            # STEP 0: Cache - identical/near-identical descriptions skip enhancement and FLUX
+            cached = self.image_cache.lookup(user_description)
+            if cached['image']:
+                return {
+                    'success': True,
+                    'data': {**cached['image'], 'success': True, 'api_source': 'fal.ai (cached)'},
+                    'query': query,
+                    'api': 'fal.ai'
+                }
             
-            try:
-                # Try Gemini first
-                if self.api_integrations.gemini_api_key:
-                    import google.generativeai as genai
-                    genai.configure(api_key=self.api_integrations.gemini_api_key)
-                    model = genai.GenerativeModel('gemini-1.5-flash')
-                    
-                    enhance_prompt = f"""Convert this image description into a detailed FLUX prompt:
+            if cached['enhanced_prompt']:
+                enhanced_prompt = cached['enhanced_prompt']
+            else:
+                # STEP 1: Enhance prompt with Gemini (primary) or OpenAI (backup)
+                print(f"[BRAIN] Enhancing image prompt...")
+                enhance_prompt = f"""Convert this image description into a detailed FLUX prompt:
 
 User request: {user_description}
 
@@ -408,40 +477,44 @@ Create a professional image generation prompt that:
 - Optimizes for FLUX.1 model
 
 Return ONLY the enhanced prompt, no explanations."""
-                    
-                    response = model.generate_content(enhance_prompt, generation_config={'temperature': 0.7, 'max_output_tokens': 200})
-                    enhanced_prompt = response.text.strip()
-                    print(f"[BRAIN] Gemini enhanced: {enhanced_prompt[:80]}...")
+                response = await self.api_integrations.llm.complete(
+                    'prompt_enhance', [{"role": "user", "content": enhance_prompt}], max_tokens=200, temperature=0.7
+                )
+                if response['success']:
+                    enhanced_prompt = response['content']
+                    print(f"[BRAIN] {response['api_source']} enhanced: {enhanced_prompt[:80]}...")
                 else:
-                    raise Exception("No Gemini key, using OpenAI")
-                    
-            except Exception as e:
-                print(f"[BRAIN] Gemini failed, using OpenAI backup...")
+                    # Fallback to user description
+                    enhanced_prompt = user_description
+                    print(f"[BRAIN] Using original prompt")
                 
-                # Backup: OpenAI
-                import aiohttp
-                url = "https://api.openai.com/v1/chat/completions"
-                headers = {"Authorization": f"Bearer {self.api_integrations.openai_api_key}", "Content-Type": "application/json"}
-                payload = {
-                    "model": "gpt-4o-mini",
-                    "messages": [{"role": "user", "content": f"Enhance this for FLUX image generation, keep all text requests: {user_description}"}],
-                    "max_tokens": 200,
-                    "temperature": 0.7
+                if enhanced_prompt != user_description:
+                    self.image_cache.store_prompt(user_description, enhanced_prompt)
+            
+            # STEP 2: Queue the job and return immediately when a client connection is attached
+            if self.image_jobs is not None and task.get('client') is not None:
+                submission = self.image_jobs.submit(task.get('user', 'default'), task['client'], enhanced_prompt, user_description)
+                if not submission['success']:
+                    return {
+                        'success': False,
+                        'error': submission['error'],
+                        'query': query,
+                        'api': 'fal.ai'
+                    }
+                return {
+                    'success': True,
+                    'data': {
+                        'content': f"🎨 **Image queued** (job `{submission['job_id']}`, position {submission['position']})\n\nYou'll get progress updates here and the image when FLUX finishes.",
+                        'job_id': submission['job_id'],
+                        'api_source': 'fal.ai'
+                    },
+                    'query': query,
+                    'api': 'fal.ai'
                 }
-                
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url, headers=headers, json=payload) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            enhanced_prompt = data['choices'][0]['message']['content'].strip()
-                            print(f"[BRAIN] OpenAI enhanced: {enhanced_prompt[:80]}...")
-                        else:
-                            # Fallback to user description
-                            enhanced_prompt = user_description
-                            print(f"[BRAIN] Using original prompt")
             
-            # STEP 2: Send enhanced prompt to fal.ai
+            # Otherwise send enhanced prompt to fal.ai and wait
             result = await self.api_integrations.generate_image_with_fal(enhanced_prompt)
+            self.image_cache.store_image(enhanced_prompt, result)
             return {
                 'success': result.get('success', False),
                 'data': result,
@@ -499,7 +572,18 @@ Return ONLY the enhanced prompt, no explanations."""
             'api': 'Unknown'
         }
     
-    async def _aggregate(self, task: Dict[str, Any], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _summarize_result(self, result: Dict[str, Any]) -> str:
+        """Text form of a subtask result (aggregation input and dependency context)"""
+        data = result.get('data', {})
+        if 'content' in data:
+            return data['content']
+        if 'price' in data:
+            price_str = f"${data['price']:,.2f}" if data['price'] > 0 else "N/A"
+            name = data.get('name', result.get('query', ''))
+            return f"{name} Current Price: {price_str}\n24h Change: {data.get('change_24h', 'N/A')}%"
+        return ''
+    
+    async def _aggregate(self, task: Dict[str, Any], results: List[Dict[str, Any]], coins: List[str] = None) -> Dict[str, Any]:
         """
         Aggregator: Combine results from subtasks into final answer
         """
@@ -509,25 +593,33 @@ Return ONLY the enhanced prompt, no explanations."""
         # Combine all results into a comprehensive response
         try:
             combined_content = f"[COMPREHENSIVE ANALYSIS] {query}\n\n"
+            failed = 0
+            market = ''
             
             for i, result in enumerate(results, 1):
                 if result.get('success'):
-                    data = result.get('data', {})
                     api_name = result.get('api', 'Unknown')
-                    
-                    combined_content += f"**{i}. {api_name} Analysis:**\n"
-                    
-                    if 'content' in data:
-                        combined_content += f"{data['content']}\n\n"
-                    elif 'price' in data:
-                        price_str = f"${data['price']:,.2f}" if data['price'] > 0 else "N/A"
-                        combined_content += f"Current Price: {price_str}\n"
-                        combined_content += f"24h Change: {data.get('change_24h', 'N/A')}%\n\n"
+                    combined_content += f"**{i}. {api_name} Analysis:**\n{self._summarize_result(result)}\n\n"
                 else:
+                    failed += 1
                     print(f"[ROMA-Aggregator] Subtask {i} failed: {result.get('error')}")
+            
+            # Trend/forecast questions: computed indicators from stored history instead of prose alone
+            if coins and is_trend_query(query):
+                coins = sorted(set(coins))
+                market = await self._memoized(task, ('series', tuple(coins)), lambda: self.market_series.summarize(coins))
+                if market:
+                    combined_content += f"**Market data (hourly history, last {self.market_series.history_days}d):**\n{market}\n\n"
         except Exception as e:
             print(f"[ROMA-Aggregator] Content combination EXCEPTION: {str(e)}")
             combined_content = f"Error combining results: {str(e)}"
+            failed = len(results)
+        
+        # Common plan shapes (price + news, price + guide): template summary, no LLM round trip
+        summary = None if market else self.synthesizer.synthesize(query, results)
+        if summary:
+            print(f"[ROMA-Aggregator] Template synthesis ({len(results)} results)")
+            return self._aggregated(query, f"{combined_content}\n\n**[AI SYNTHESIS]**\n{summary}", results, failed)
         
         # Use OpenAI to synthesize final answer
         try:
@@ -548,15 +640,18 @@ Return ONLY the enhanced prompt, no explanations."""
             final_content = combined_content
         
         print(f"[ROMA-Aggregator] Aggregation complete")
-        
+        return self._aggregated(query, final_content, results, failed)
+    
+    def _aggregated(self, query: str, content: str, results: List[Dict[str, Any]], failed: int) -> Dict[str, Any]:
         return {
             'success': True,
             'data': {
-                'content': final_content,
+                'content': content,
                 'api_source': 'ROMA Aggregated'
             },
             'query': query,
             'api': 'ROMA',
-            'subtask_count': len(results)
+            'subtask_count': len(results),
+            'failed_subtasks': failed
         }
 
@@ -0,0 +1,305 @@
+"""
+Adaptive Feed Scheduler
+Polls the news feeds in knowledge/feeds.json (or NEWS_FEEDS) in the
+background, so get_rss_news reads the already-clustered stories instead of
+fetching feeds per request.
+
+Each feed gets its own interval, learned from its publish cadence (the
+median gap between its entries' timestamps, smoothed) and clamped to
+[FEED_MIN_INTERVAL, FEED_MAX_INTERVAL]. Polls that bring nothing new
+stretch the interval, and errors back off exponentially up to
+FEED_MAX_BACKOFF. Every poll is jittered.
+
+Fetches are conditional (ETag / Last-Modified), and at most FEED_CONCURRENCY
+run at once. A 304 or a byte-identical body skips XML parsing entirely;
+parsing runs in a worker thread. Per-feed health and lag are in get_stats().
+
+get_rss_news only switches to the scheduler's stories once it is ready:
+FEED_READY_SHARE of the core feeds ingested, or one full pass over the list.
+"""
+import asyncio
+import calendar
+import hashlib
+import heapq
+import json
+import os
+import random
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Callable, Optional
+
+import aiohttp
+
+from roma_agents import providers
+from roma_agents.news_clusters import source_of
+
+FEEDS_PATH = Path(__file__).parent.parent / 'knowledge' / 'feeds.json'
+USER_AGENT = 'ROMA-Crypto-News/1.0 (+conditional polling)'
+
+# Used when no feed list can be read, and for on-demand fetches before the scheduler has data
+CORE_FEEDS = [
+    'https://coindesk.com/arc/outboundfeeds/rss/',
+    'https://cointelegraph.com/rss',
+    'https://decrypt.co/feed',
+    'https://www.theblock.co/rss.xml'
+]
+
+
+def load_feeds(path: str = None) -> List[str]:
+    """NEWS_FEEDS (comma-separated) wins over the feed list file"""
+    configured = os.getenv('NEWS_FEEDS', '')
+    if configured.strip():
+        return [u.strip() for u in configured.split(',') if u.strip()]
+    try:
+        items = json.loads(Path(path or os.getenv('NEWS_FEEDS_PATH') or FEEDS_PATH).read_text(encoding='utf-8'))
+        urls = [item['url'] if isinstance(item, dict) else str(item) for item in items]
+        return list(dict.fromkeys(u for u in urls if u))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"[FEEDS] Could not read feed list ({e}), using {len(CORE_FEEDS)} core feeds")
+        return list(CORE_FEEDS)
+
+
+def entry_timestamps(feed) -> List[float]:
+    """Publish times (epoch seconds) of a parsed feed's entries"""
+    stamps = []
+    for entry in feed.entries:
+        parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+        if parsed:
+            stamps.append(float(calendar.timegm(parsed)))
+    return stamps
+
+
+class FeedState:
+    def __init__(self, url: str, interval: float):
+        self.url = url
+        self.source = source_of(url)
+        self.interval = interval
+        self.cadence: Optional[float] = None  # smoothed seconds between posts
+        self.etag: Optional[str] = None
+        self.modified: Optional[str] = None
+        self.digest: Optional[bytes] = None
+        self.next_due = 0.0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.last_status: Optional[str] = None
+        self.last_success: Optional[float] = None
+        self.last_new: Optional[float] = None
+        self.newest_published: Optional[float] = None
+        self.publish_lag: Optional[float] = None  # smoothed delay between publish and our first sight
+        self.fetches = 0
+        self.not_modified = 0
+        self.unchanged = 0
+        self.parsed = 0
+        self.new_entries = 0
+        self.bytes = 0
+
+    def health(self) -> str:
+        if self.last_success is None:
+            return 'failing' if self.errors else 'pending'
+        if self.errors >= 3:
+            return 'failing'
+        return 'degraded' if self.errors else 'ok'
+
+    def summary(self, now: float) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'source': self.source,
+            'health': self.health(),
+            'interval_s': round(self.interval),
+            'cadence_s': round(self.cadence) if self.cadence else None,
+            'next_in_s': round(max(0.0, self.next_due - now)),
+            'age_s': round(now - self.last_success) if self.last_success else None,
+            'publish_lag_s': round(self.publish_lag) if self.publish_lag is not None else None,
+            'last_status': self.last_status,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'fetches': self.fetches,
+            'not_modified': self.not_modified + self.unchanged,
+            'new_entries': self.new_entries
+        }
+
+
+class FeedScheduler:
+    def __init__(self, ingest: Callable[[str, Any], int], feeds: List[str] = None):
+        self.ingest = ingest  # (feed_url, parsed feed) -> number of new entries
+        self.enabled = os.getenv('NEWS_SCHEDULER', '1').lower() not in ('0', 'false', 'no')
+        self.min_interval = float(os.getenv('FEED_MIN_INTERVAL', 120))
+        self.max_interval = float(os.getenv('FEED_MAX_INTERVAL', 3600))
+        self.max_backoff = float(os.getenv('FEED_MAX_BACKOFF', 6 * 3600))
+        self.poll_factor = float(os.getenv('FEED_POLL_FACTOR', 0.5))  # poll this many times per cadence gap
+        self.jitter = float(os.getenv('FEED_JITTER', 0.15))
+        self.concurrency = int(os.getenv('FEED_CONCURRENCY', 8))
+        self.timeout = float(os.getenv('FEED_TIMEOUT', 20))
+        self.startup_spread = float(os.getenv('FEED_STARTUP_SPREAD', 60))
+        self.ready_share = float(os.getenv('FEED_READY_SHARE', 0.5))
+
+        initial = min(self.max_interval, max(self.min_interval, 600))
+        self.feeds: Dict[str, FeedState] = {url: FeedState(url, initial) for url in (feeds or load_feeds())}
+        # Readiness is judged on the core feeds when configured, otherwise on the whole list
+        self.ready_feeds = [self.feeds[url] for url in CORE_FEEDS if url in self.feeds] or list(self.feeds.values())
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.in_flight = 0
+        self.successes = 0
+        self._heap: List[Any] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        """True once FEED_READY_SHARE of the core feeds have been ingested, or every feed
+        has been tried once and at least one succeeded"""
+        if not self.successes:
+            return False
+        ok = sum(1 for state in self.ready_feeds if state.last_success is not None)
+        if ok >= self.ready_share * len(self.ready_feeds):
+            return True
+        return all(state.last_status is not None for state in self.feeds.values())
+
+    def _schedule(self, state: FeedState, delay: float):
+        delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        state.next_due = time.time() + delay
+        heapq.heappush(self._heap, (state.next_due, state.url))
+
+    def start(self):
+        if not self.enabled or not self.feeds or (self._task and not self._task.done()):
+            return
+        # Spread the first round so 50+ feeds don't all fire at boot
+        for i, state in enumerate(self.feeds.values()):
+            self._schedule(state, self.startup_spread * i / len(self.feeds))
+        self._task = asyncio.create_task(self._run())
+        print(f"[FEEDS] Scheduler started: {len(self.feeds)} feeds, concurrency {self.concurrency}")
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        tasks = set()
+        async with aiohttp.ClientSession(timeout=timeout, headers={'User-Agent': USER_AGENT}) as session:
+            try:
+                while True:
+                    now = time.time()
+                    while self._heap and self._heap[0][0] <= now:
+                        _, url = heapq.heappop(self._heap)
+                        task = asyncio.create_task(self._poll(session, self.feeds[url]))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                    wait = self._heap[0][0] - now if self._heap else 5.0
+                    await asyncio.sleep(min(5.0, max(0.5, wait)))
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    async def _poll(self, session, state: FeedState):
+        async with self.semaphore:
+            self.in_flight += 1
+            try:
+                delay = await self._fetch(session, state)
+                state.errors = 0
+                state.last_error = None
+                state.last_success = time.time()
+                self.successes += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                state.errors += 1
+                state.last_status = 'error'
+                state.last_error = str(e)[:200] or type(e).__name__
+                delay = min(self.max_backoff, state.interval * 2 ** state.errors)
+                print(f"[FEEDS] {state.source}: {state.last_error} (retry in {delay:.0f}s)")
+            finally:
+                self.in_flight -= 1
+        self._schedule(state, delay)
+
+    async def _fetch(self, session, state: FeedState) -> float:
+        """One conditional GET; returns the delay until the next poll"""
+        headers = {}
+        if state.etag:
+            headers['If-None-Match'] = state.etag
+        if state.modified:
+            headers['If-Modified-Since'] = state.modified
+
+        state.fetches += 1
+        async with session.get(state.url, headers=headers) as response:
+            if response.status == 304:
+                state.not_modified += 1
+                state.last_status = 'not_modified'
+                return self._stretch(state)
+            if response.status >= 400:
+                raise RuntimeError(f"HTTP {response.status}")
+            body = await response.read()
+            state.etag = response.headers.get('ETag') or state.etag
+            state.modified = response.headers.get('Last-Modified') or state.modified
+
+        state.bytes += len(body)
+        digest = hashlib.sha1(body).digest()
+        if digest == state.digest:
+            # Server ignored the conditional headers but nothing changed: skip the parse
+            state.unchanged += 1
+            state.last_status = 'unchanged'
+            return self._stretch(state)
+
+        feedparser = providers.load('feedparser')
+        feed = await asyncio.to_thread(feedparser.parse, body)
+        if not feed.entries:
+            raise RuntimeError(f"no entries ({feed.get('bozo_exception') or 'empty feed'})")
+        state.digest = digest
+        state.parsed += 1
+
+        new = self.ingest(state.url, feed)
+        state.new_entries += new
+        state.last_status = 'new' if new else 'parsed'
+        self._learn(state, entry_timestamps(feed), new)
+        return state.interval if new else self._stretch(state)
+
+    def _stretch(self, state: FeedState) -> float:
+        """Nothing new: poll a little less often (the cadence estimate pulls it back)"""
+        state.interval = min(self.max_interval, state.interval * 1.25)
+        return state.interval
+
+    def _learn(self, state: FeedState, stamps: List[float], new: int):
+        now = time.time()
+        if new:
+            state.last_new = now
+        if stamps:
+            newest = max(stamps)
+            if new and (state.newest_published is None or newest > state.newest_published):
+                lag = max(0.0, now - newest)
+                state.publish_lag = lag if state.publish_lag is None else 0.7 * state.publish_lag + 0.3 * lag
+            state.newest_published = max(newest, state.newest_published or 0.0)
+        if len(stamps) >= 3:
+            ordered = sorted(stamps, reverse=True)[:20]
+            gaps = sorted(a - b for a, b in zip(ordered, ordered[1:]) if a > b)
+            if gaps:
+                gap = gaps[len(gaps) // 2]
+                state.cadence = gap if state.cadence is None else 0.7 * state.cadence + 0.3 * gap
+        if state.cadence:
+            state.interval = min(self.max_interval, max(self.min_interval, state.cadence * self.poll_factor))
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.time()
+        feeds = [state.summary(now) for state in self.feeds.values()]
+        health: Dict[str, int] = {}
+        for feed in feeds:
+            health[feed['health']] = health.get(feed['health'], 0) + 1
+        ages = sorted(f['age_s'] for f in feeds if f['age_s'] is not None)
+        lags = sorted(f['publish_lag_s'] for f in feeds if f['publish_lag_s'] is not None)
+        states = self.feeds.values()
+        return {
+            'enabled': self.enabled,
+            'running': bool(self._task and not self._task.done()),
+            'ready': self.ready,
+            'feeds_total': len(feeds),
+            'health': health,
+            'in_flight': self.in_flight,
+            'fetches': sum(s.fetches for s in states),
+            'not_modified': sum(s.not_modified for s in states),
+            'unchanged_bodies': sum(s.unchanged for s in states),
+            'parsed': sum(s.parsed for s in states),
+            'bytes': sum(s.bytes for s in states),
+            'new_entries': sum(s.new_entries for s in states),
+            'max_age_s': ages[-1] if ages else None,
+            'median_publish_lag_s': lags[len(lags) // 2] if lags else None,
+            'feeds': feeds
+        }
@@ -0,0 +1,235 @@
+"""
+Headline Sentiment & Event Scoring
+Scores news headlines locally when feeds are ingested, so every cached entry
+carries a sentiment in [-1, 1], a bullish/neutral/bearish label and an event
+type (regulation, security, etf, listing, partnership, upgrade, macro,
+market, other) with no LLM call.
+
+An exact lexicon lookup over word 1-3 grams scores a whole feed batch with
+one bincount; a sentiment term near a negator ("rejected", "denies",
+"delayed", "not"...) has its sign flipped and damped. An optional softmax
+model over the atomizer's hashed features, trained offline, is blended in
+when present:
+
+    python -m roma_agents.headline_scorer train --data headlines.jsonl --out headline_model.npz
+
+Training lines are JSON: {"title": "...", "sentiment": "bullish", "event": "etf"}
+"""
+import argparse
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from roma_agents.atomizer import HashedSoftmaxClassifier, featurize
+
+MODEL_DIM = 2 ** 12
+NEUTRAL_BAND = 0.15
+NEGATION_WINDOW = 4  # words between a negator and the term it negates
+NEGATED_WEIGHT = -0.5  # "approval rejected": +0.9 -> -0.45
+SENTIMENT_CLASSES = ['bearish', 'neutral', 'bullish']
+
+SENTIMENT_LEXICON = {
+    # bullish
+    'surge': 1.0, 'surges': 1.0, 'soar': 1.0, 'soars': 1.0, 'rally': 1.0, 'rallies': 1.0, 'jumps': 0.8,
+    'climbs': 0.7, 'gains': 0.6, 'rises': 0.6, 'record': 0.6, 'all time high': 1.2, 'ath': 1.0, 'breakout': 0.8,
+    'inflows': 0.8, 'approval': 0.9, 'approves': 0.9, 'approved': 0.9, 'adoption': 0.7, 'partnership': 0.5,
+    'bullish': 1.0, 'rebound': 0.7, 'recovers': 0.6, 'upgrade': 0.4, 'launches': 0.3, 'milestone': 0.5,
+    'accumulate': 0.5, 'buys': 0.4, 'wins': 0.6,
+    # bearish
+    'crash': -1.2, 'crashes': -1.2, 'plunge': -1.0, 'plunges': -1.0, 'tumbles': -0.9, 'slumps': -0.9,
+    'drops': -0.6, 'falls': -0.6, 'dips': -0.4, 'selloff': -0.9, 'sell off': -0.9, 'liquidations': -0.8,
+    'liquidated': -0.8, 'outflows': -0.8, 'hack': -1.2, 'hacked': -1.2, 'exploit': -1.1, 'exploited': -1.1,
+    'stolen': -1.0, 'breach': -1.0, 'scam': -1.0, 'fraud': -1.1, 'lawsuit': -0.8, 'sues': -0.8, 'charged': -0.8,
+    'ban': -0.9, 'bans': -0.9, 'crackdown': -0.9, 'delist': -0.9, 'delisting': -0.9, 'bearish': -1.0,
+    'warning': -0.5, 'fears': -0.6, 'losses': -0.6, 'bankruptcy': -1.2, 'insolvent': -1.2, 'rejects': -0.8,
+}
+
+EVENT_LEXICON = {
+    'regulation': ['sec', 'cftc', 'regulator', 'regulators', 'regulation', 'regulatory', 'lawsuit', 'sues', 'court',
+                   'ban', 'bans', 'law', 'bill', 'senate', 'congress', 'compliance', 'license', 'crackdown'],
+    'security': ['hack', 'hacked', 'exploit', 'exploited', 'breach', 'stolen', 'attack', 'phishing', 'drained', 'scam'],
+    'etf': ['etf', 'etfs', 'inflows', 'outflows', 'blackrock', 'fidelity', 'grayscale', 'institutional'],
+    'listing': ['listing', 'lists', 'listed', 'delist', 'delisting', 'binance lists', 'coinbase lists'],
+    'partnership': ['partnership', 'partners', 'collaboration', 'integrates', 'integration', 'teams up'],
+    'upgrade': ['upgrade', 'mainnet', 'testnet', 'hard fork', 'fork', 'launches', 'launch', 'release', 'v2'],
+    'macro': ['fed', 'inflation', 'cpi', 'rates', 'rate cut', 'rate hike', 'recession', 'dollar', 'tariffs', 'jobs'],
+    'market': ['price', 'rally', 'surge', 'crash', 'plunge', 'liquidations', 'all time high', 'ath', 'selloff', 'market'],
+}
+EVENT_TYPES = list(EVENT_LEXICON) + ['other']
+
+# "not", "no"... negate what follows; verbs negate either side ("SEC rejects approval", "approval rejected")
+PREFIX_NEGATORS = {'not', 'no', 'never', 'without'}
+NEGATORS = PREFIX_NEGATORS | {
+    'reject', 'rejects', 'rejected', 'deny', 'denies', 'denied',
+    'delay', 'delays', 'delayed', 'postpone', 'postpones', 'postponed', 'fails', 'failed', 'halts', 'halted',
+    'blocks', 'blocked', 'cancels', 'cancelled', 'scraps', 'scrapped'
+}
+
+_EVENT_TERMS: Dict[str, List[int]] = {}
+for _column, _terms in enumerate(EVENT_LEXICON.values()):
+    for _term in _terms:
+        _EVENT_TERMS.setdefault(_term, []).append(_column)
+
+
+def _grams(words: List[str]):
+    """(start, length, gram) for every word 1-3 gram"""
+    for length in (1, 2, 3):
+        for start in range(len(words) - length + 1):
+            yield start, length, ' '.join(words[start:start + length])
+
+
+def lexicon_scores(titles: List[str]):
+    """Batch lexicon scoring: (sentiment in [-1, 1], event score matrix)"""
+    n = len(titles)
+    rows, weights, event_rows, event_cols = [], [], [], []
+    for r, title in enumerate(titles):
+        words = re.findall(r'\w+', title.lower().replace('-', ' '))
+        negators = [i for i, w in enumerate(words) if w in NEGATORS]
+        for start, length, gram in _grams(words):
+            weight = SENTIMENT_LEXICON.get(gram)
+            if weight is not None:
+                end = start + length - 1
+                if any(start - NEGATION_WINDOW <= j < start or (end < j <= end + NEGATION_WINDOW and words[j] not in PREFIX_NEGATORS)
+                       for j in negators):
+                    weight *= NEGATED_WEIGHT
+                rows.append(r)
+                weights.append(weight)
+            for column in _EVENT_TERMS.get(gram, ()):
+                event_rows.append(r)
+                event_cols.append(column)
+    raw = np.bincount(np.asarray(rows, dtype=np.int64), weights=np.asarray(weights, dtype=np.float64), minlength=n)
+    events = np.zeros((n, len(EVENT_LEXICON)), dtype=np.float32)
+    np.add.at(events, (np.asarray(event_rows, dtype=np.int64), np.asarray(event_cols, dtype=np.int64)), 1.0)
+    return np.tanh(raw / 2.0), events
+
+
+def label_for(sentiment: float) -> str:
+    if sentiment >= NEUTRAL_BAND:
+        return 'bullish'
+    if sentiment <= -NEUTRAL_BAND:
+        return 'bearish'
+    return 'neutral'
+
+
+class HeadlineScorer:
+    def __init__(self, model_path: str = None):
+        self.sentiment_model: Optional[HashedSoftmaxClassifier] = None
+        self.event_model: Optional[HashedSoftmaxClassifier] = None
+        self.scored = 0
+        path = model_path or os.getenv('HEADLINE_MODEL_PATH', str(Path(__file__).parent.parent / 'headline_model.npz'))
+        if os.path.exists(path):
+            try:
+                self._load(path)
+                print(f"[HEADLINES] Local model loaded from {path}")
+            except (OSError, KeyError, ValueError) as e:
+                print(f"[HEADLINES] Could not load model ({e}), using lexicon only")
+
+    def _load(self, path: str):
+        data = np.load(path, allow_pickle=False)
+        dim = int(data['dim'])
+        for prefix in ('sentiment', 'event'):
+            if f'{prefix}_W' in data.files:
+                model = HashedSoftmaxClassifier([str(c) for c in data[f'{prefix}_classes']], dim)
+                model.W, model.b = data[f'{prefix}_W'], data[f'{prefix}_b']
+                model.temperature = float(data[f'{prefix}_T'])
+                setattr(self, f'{prefix}_model', model)
+
+    def score(self, titles: List[str]) -> List[Dict[str, Any]]:
+        """One score dict per title: {'sentiment', 'label', 'event'}"""
+        if not titles:
+            return []
+        sentiment, event_scores = lexicon_scores(titles)
+        event_index = np.where(event_scores.max(axis=1) > 0, event_scores.argmax(axis=1), len(EVENT_LEXICON))
+        events = [EVENT_TYPES[i] for i in event_index]
+
+        if self.sentiment_model is not None or self.event_model is not None:
+            rows = [featurize(t, (self.sentiment_model or self.event_model).dim) for t in titles]
+            if self.sentiment_model is not None:
+                p = self.sentiment_model.predict_proba(rows)
+                classes = self.sentiment_model.classes
+                model_sentiment = p[:, classes.index('bullish')] - p[:, classes.index('bearish')]
+                sentiment = 0.5 * sentiment + 0.5 * model_sentiment
+            if self.event_model is not None:
+                p = self.event_model.predict_proba(rows)
+                for i in np.flatnonzero(p.max(axis=1) >= 0.6):
+                    events[i] = self.event_model.classes[int(p[i].argmax())]
+
+        self.scored += len(titles)
+        return [
+            {'sentiment': round(float(s), 3), 'label': label_for(float(s)), 'event': e}
+            for s, e in zip(sentiment, events)
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'scored': self.scored,
+            'sentiment_model': self.sentiment_model is not None,
+            'event_model': self.event_model is not None
+        }
+
+
+def aggregate(articles: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Tone of a result set: label counts, mean sentiment, event histogram"""
+    scored = [a for a in articles if 'sentiment' in a]
+    if not scored:
+        return {}
+    values = np.array([a['sentiment'] for a in scored], dtype=np.float32)
+    counts = {label: sum(1 for a in scored if a['label'] == label) for label in SENTIMENT_CLASSES}
+    events: Dict[str, int] = {}
+    for a in scored:
+        events[a['event']] = events.get(a['event'], 0) + 1
+    mean = float(values.mean())
+    return {'label': label_for(mean), 'mean': round(mean, 3), 'counts': counts, 'events': events}
+
+
+def train(data_path: str, out_path: str, dim: int = MODEL_DIM, epochs: int = 30):
+    examples = [json.loads(line) for line in Path(data_path).read_text(encoding='utf-8').splitlines() if line.strip()]
+    examples = [e for e in examples if e.get('title')]
+    if len(examples) < 10:
+        raise SystemExit(f"Need at least 10 labeled headlines, found {len(examples)}")
+    rows = [featurize(e['title'], dim) for e in examples]
+    arrays = {'dim': np.array(dim)}
+
+    for prefix, classes in (('sentiment', SENTIMENT_CLASSES), ('event', EVENT_TYPES)):
+        labeled = [i for i, e in enumerate(examples) if e.get(prefix) in classes]
+        if len(labeled) < 10:
+            print(f"[HEADLINES] Skipping {prefix} model ({len(labeled)} labeled)")
+            continue
+        rng = np.random.default_rng(42)
+        order = rng.permutation(labeled)
+        split = int(len(order) * 0.8)
+        labels = np.array([classes.index(examples[i][prefix]) if i in labeled else -1 for i in range(len(examples))])
+        model = HashedSoftmaxClassifier(classes, dim)
+        model.fit([rows[i] for i in order[:split]], labels[order[:split]], epochs=epochs)
+        model.calibrate([rows[i] for i in order[split:]], labels[order[split:]])
+        val = order[split:]
+        if len(val):
+            accuracy = float((model.predict_proba([rows[i] for i in val]).argmax(axis=1) == labels[val]).mean())
+            print(f"[HEADLINES] {prefix} val accuracy: {accuracy:.3f} (n={len(val)}, T={model.temperature:.2f})")
+        arrays.update({
+            f'{prefix}_W': model.W, f'{prefix}_b': model.b,
+            f'{prefix}_classes': np.array(model.classes), f'{prefix}_T': np.array(model.temperature)
+        })
+
+    np.savez_compressed(out_path, **arrays)
+    print(f"[HEADLINES] Model written to {out_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local headline sentiment/event model")
+    sub = parser.add_subparsers(dest='command', required=True)
+    t = sub.add_parser('train')
+    t.add_argument('--data', required=True)
+    t.add_argument('--out', default='headline_model.npz')
+    t.add_argument('--dim', type=int, default=MODEL_DIM)
+    t.add_argument('--epochs', type=int, default=30)
+    args = parser.parse_args()
+    train(args.data, args.out, args.dim, args.epochs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Image Result Cache
+Content-addressed cache for the image path:
+  normalized description -> enhanced prompt   (skips the Gemini/OpenAI enhancement call)
+  sha256(enhanced prompt) -> image URL/metadata (skips the ~10s FLUX generation)
+Both maps are LRU with TTL and persisted as JSON metadata on local disk.
+Stores only mark the cache dirty; one write per IMAGE_CACHE_SAVE_S runs in a
+worker thread, so the event loop never touches the file.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+# Filler words that don't change what gets drawn
+STOPWORDS = {'a', 'an', 'the', 'of', 'please', 'me', 'image', 'picture', 'create', 'generate', 'make', 'draw'}
+
+DEFAULT_PATH = Path(__file__).parent.parent / '.cache' / 'image_cache.json'
+
+
+def normalize_description(description: str) -> str:
+    """'Create a Bitcoin rocket, in space!' -> 'bitcoin rocket in space'"""
+    words = re.sub(r"[^\w\s']", ' ', description.lower()).split()
+    return ' '.join(w for w in words if w not in STOPWORDS)
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(' '.join(prompt.split()).encode('utf-8')).hexdigest()
+
+
+class ImageCache:
+    def __init__(self, path: str = None, ttl: float = None, capacity: int = None):
+        self.path = Path(path or os.getenv('IMAGE_CACHE_PATH', DEFAULT_PATH))
+        self.ttl = ttl or float(os.getenv('IMAGE_CACHE_TTL', 24 * 3600))
+        self.capacity = capacity or int(os.getenv('IMAGE_CACHE_SIZE', 500))
+        self.save_delay = float(os.getenv('IMAGE_CACHE_SAVE_S', 5))
+
+        self.prompts: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self.images: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self.hits = {'prompt': 0, 'image': 0}
+        self.misses = 0
+        self._dirty = False
+        self._save_task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()  # a shutdown flush must not race the scheduled save
+        self._load()
+
+    def _get(self, table: 'OrderedDict', key: str) -> Optional[Dict[str, Any]]:
+        entry = table.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry['stored_at'] > self.ttl:
+            del table[key]
+            return None
+        table.move_to_end(key)
+        return entry
+
+    def _put(self, table: 'OrderedDict', key: str, value: Dict[str, Any]):
+        table[key] = {**value, 'stored_at': time.time()}
+        table.move_to_end(key)
+        while len(table) > self.capacity:
+            table.popitem(last=False)
+
+    def lookup(self, description: str) -> Dict[str, Any]:
+        """Returns {'enhanced_prompt': str|None, 'image': dict|None} for a user description"""
+        prompt_entry = self._get(self.prompts, normalize_description(description))
+        if prompt_entry is None:
+            self.misses += 1
+            return {'enhanced_prompt': None, 'image': None}
+
+        image_entry = self._get(self.images, prompt_key(prompt_entry['enhanced_prompt']))
+        if image_entry:
+            self.hits['image'] += 1
+            print(f"[IMAGE-CACHE] ✅ Image hit: {description[:40]}")
+        else:
+            self.hits['prompt'] += 1
+            print(f"[IMAGE-CACHE] Prompt hit (enhancement skipped): {description[:40]}")
+        return {'enhanced_prompt': prompt_entry['enhanced_prompt'], 'image': image_entry}
+
+    def store_prompt(self, description: str, enhanced_prompt: str):
+        key = normalize_description(description)
+        if key and enhanced_prompt:
+            self._put(self.prompts, key, {'enhanced_prompt': enhanced_prompt})
+            self._schedule_save()
+
+    def store_image(self, enhanced_prompt: str, result: Dict[str, Any]):
+        if not result.get('success') or not result.get('image_url'):
+            return
+        metadata = {k: result.get(k) for k in ('image_url', 'width', 'height', 'model', 'prompt')}
+        self._put(self.images, prompt_key(enhanced_prompt), metadata)
+        self._schedule_save()
+
+    def _load(self):
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"[IMAGE-CACHE] Could not load {self.path}: {e}")
+            return
+        now = time.time()
+        for name, table in (('prompts', self.prompts), ('images', self.images)):
+            for key, entry in data.get(name, {}).items():
+                if now - entry.get('stored_at', 0) <= self.ttl:
+                    table[key] = entry
+        print(f"[IMAGE-CACHE] Loaded {len(self.prompts)} prompts, {len(self.images)} images from {self.path}")
+
+    def _schedule_save(self):
+        self._dirty = True
+        if self._save_task is not None and not self._save_task.done():
+            return  # the pending save picks this change up
+        try:
+            self._save_task = asyncio.get_running_loop().create_task(self._save_later())
+        except RuntimeError:
+            self._write(self._snapshot())  # no event loop (scripts): write inline
+
+    async def _save_later(self):
+        await asyncio.sleep(self.save_delay)
+        await self.flush()
+
+    def _snapshot(self) -> str:
+        self._dirty = False
+        return json.dumps({'prompts': self.prompts, 'images': self.images})
+
+    def _write(self, text: str):
+        """Atomic rewrite; the file is small (metadata + URLs only)"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix('.tmp')
+            tmp.write_text(text, encoding='utf-8')
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[IMAGE-CACHE] Could not save {self.path}: {e}")
+
+    async def flush(self):
+        """Write pending changes in a worker thread (also called on shutdown)"""
+        async with self._write_lock:
+            if self._dirty:
+                await asyncio.to_thread(self._write, self._snapshot())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'prompts': len(self.prompts),
+            'images': len(self.images),
+            'prompt_hits': self.hits['prompt'],
+            'image_hits': self.hits['image'],
+            'misses': self.misses
+        }
@@ -0,0 +1,217 @@
+"""
+Image Job Queue
+Non-blocking FLUX generation on fal's async queue API:
+- submit() returns a job ID immediately (bounded queue + per-user quota)
+- a few worker tasks submit to fal and follow status events, no executor threads
+- queue position, fal logs and the final image are pushed to the client over the WebSocket
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import deque
+from typing import Dict, Any, Optional
+
+from roma_agents import providers
+
+FAL_APPLICATION = "fal-ai/flux/dev"
+
+
+class ImageJobQueue:
+    """Bounded FIFO of image jobs drained by a fixed number of async workers"""
+
+    def __init__(self, api_integrations, broadcaster, workers: int = None, max_pending: int = None,
+                 per_user_limit: int = None, job_timeout: float = None, image_cache=None):
+        self.api_integrations = api_integrations
+        self.broadcaster = broadcaster
+        self.image_cache = image_cache
+        self.worker_count = workers or int(os.getenv('IMAGE_JOB_WORKERS', 4))
+        self.max_pending = max_pending or int(os.getenv('IMAGE_QUEUE_MAX', 50))
+        self.per_user_limit = per_user_limit or int(os.getenv('IMAGE_JOBS_PER_USER', 2))
+        self.job_timeout = job_timeout or float(os.getenv('IMAGE_JOB_TIMEOUT', 180))
+
+        self.jobs: Dict[str, Dict[str, Any]] = {}  # job_id -> job (queued or running)
+        self.pending: deque = deque()  # job_ids waiting for a worker
+        self.user_active: Dict[str, int] = {}
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+        self._wakeup: Optional[asyncio.Event] = None
+        self._workers = []
+        self._client = None
+
+    def _get_client(self):
+        """One shared fal AsyncClient with an explicit key (no os.environ mutation per call)"""
+        if self._client is None:
+            self._client = providers.fal_async_client(self.api_integrations.fal_api_key)
+        return self._client
+
+    def _ensure_workers(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < self.worker_count:
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    def submit(self, user_id: str, websocket, prompt: str, description: str = '') -> Dict[str, Any]:
+        """Queue a job; never waits for generation"""
+        if not self.api_integrations.fal_api_key:
+            return {'success': False, 'error': 'fal.ai API key not available', 'api_source': 'fal.ai'}
+        if len(self.pending) >= self.max_pending:
+            self.rejected += 1
+            return {'success': False, 'error': 'Image queue is full, please try again in a minute', 'api_source': 'fal.ai'}
+        if self.user_active.get(user_id, 0) >= self.per_user_limit:
+            self.rejected += 1
+            return {
+                'success': False,
+                'error': f'You already have {self.per_user_limit} images in progress, please wait for them to finish',
+                'api_source': 'fal.ai'
+            }
+
+        job_id = uuid.uuid4().hex[:12]
+        self.jobs[job_id] = {
+            'job_id': job_id,
+            'user_id': user_id,
+            'websocket': websocket,
+            'prompt': prompt,
+            'description': description or prompt,
+            'status': 'queued',
+            'created_at': time.time()
+        }
+        self.user_active[user_id] = self.user_active.get(user_id, 0) + 1
+        self.pending.append(job_id)
+        print(f"[IMAGE-JOBS] Queued {job_id} for {user_id[:8]} (position {len(self.pending)})")
+
+        self._ensure_workers()
+        self._wakeup.set()
+        return {'success': True, 'job_id': job_id, 'position': len(self.pending), 'api_source': 'fal.ai'}
+
+    def cancel_client(self, websocket):
+        """Drop queued jobs of a disconnected client (running jobs finish and are discarded)"""
+        for job_id in [j for j in self.pending if self.jobs[j]['websocket'] is websocket]:
+            self.pending.remove(job_id)
+            self._finish(self.jobs[job_id], 'cancelled')
+
+    def _notify(self, job: Dict[str, Any], message: Dict[str, Any], coalesce: bool = False):
+        message = {'type': 'image_job', 'job_id': job['job_id'], **message}
+        key = f"image_job:{job['job_id']}:{message.get('status')}" if coalesce else None
+        self.broadcaster.publish(job['websocket'], message, coalesce_key=key)
+
+    def _announce_positions(self):
+        for position, job_id in enumerate(self.pending, 1):
+            self._notify(self.jobs[job_id], {'status': 'queued', 'position': position, 'stage': 'local'}, coalesce=True)
+
+    def _finish(self, job: Dict[str, Any], status: str):
+        job['status'] = status
+        self.jobs.pop(job['job_id'], None)
+        remaining = self.user_active.get(job['user_id'], 1) - 1
+        if remaining > 0:
+            self.user_active[job['user_id']] = remaining
+        else:
+            self.user_active.pop(job['user_id'], None)
+
+    async def _worker(self):
+        while True:
+            while not self.pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            job = self.jobs[self.pending.popleft()]
+            self._announce_positions()
+            job['status'] = 'running'
+            try:
+                result = await asyncio.wait_for(self._run(job), self.job_timeout)
+            except asyncio.TimeoutError:
+                result = {'success': False, 'error': f'Image generation timed out after {self.job_timeout:.0f}s'}
+            except Exception as e:
+                print(f"[IMAGE-JOBS] 💥 {job['job_id']} ERROR: {str(e)}")
+                result = {'success': False, 'error': str(e)}
+
+            if result.get('success'):
+                if self.image_cache is not None:
+                    self.image_cache.store_image(job['prompt'], result)
+                self.completed += 1
+                self._finish(job, 'completed')
+                content = f"🎨 **Image Generated!**\n\n"
+                content += f"**Model:** {result.get('model', 'FLUX.1')}\n"
+                content += f"**Resolution:** {result.get('width', 'N/A')}x{result.get('height', 'N/A')}\n"
+                content += f"**Prompt:** {result.get('prompt', job['prompt'])}\n\n"
+                content += f"Source: fal.ai"
+                # research_response so existing chat clients render it like a synchronous result
+                self.broadcaster.publish(job['websocket'], {
+                    'type': 'research_response',
+                    'tool': 'research',
+                    'job_id': job['job_id'],
+                    'job_status': 'completed',
+                    'content': content,
+                    'image_url': result['image_url'],
+                    'sender': 'ai',
+                    'api_source': 'fal.ai',
+                    'has_error': False,
+                    'retry_available': False
+                })
+            else:
+                self.failed += 1
+                self._finish(job, 'failed')
+                self.broadcaster.publish(job['websocket'], {
+                    'type': 'error',
+                    'job_id': job['job_id'],
+                    'job_status': 'failed',
+                    'content': f"❌ Image generation failed: {result.get('error')}",
+                    'sender': 'ai',
+                    'api_source': 'fal.ai',
+                    'has_error': True,
+                    'retry_available': True
+                })
+
+    async def _run(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Submit to fal's queue and relay Queued/InProgress events until the result is ready"""
+        fal_client = providers.load('fal_client')
+        client = self._get_client()
+        handle = await client.submit(
+            FAL_APPLICATION,
+            arguments={
+                "prompt": job['prompt'],
+                "image_size": "landscape_4_3",
+                "num_inference_steps": 28,
+                "guidance_scale": 3.5,
+                "num_images": 1,
+                "enable_safety_checker": True,
+                "output_format": "jpeg"
+            }
+        )
+        print(f"[IMAGE-JOBS] {job['job_id']} submitted to fal ({handle.request_id})")
+
+        seen_logs = 0
+        async for event in handle.iter_events(with_logs=True, interval=0.5):
+            if isinstance(event, fal_client.Queued):
+                self._notify(job, {'status': 'queued', 'position': event.position, 'stage': 'fal'}, coalesce=True)
+            elif isinstance(event, fal_client.InProgress):
+                logs = event.logs or []
+                for log in logs[seen_logs:]:
+                    self._notify(job, {'status': 'running', 'log': log.get('message', '')})
+                seen_logs = max(seen_logs, len(logs))
+
+        result = await handle.get()
+        images = (result or {}).get('images') or []
+        if not images:
+            return {'success': False, 'error': 'No images generated'}
+        return {
+            'success': True,
+            'image_url': images[0]['url'],
+            'width': images[0].get('width', 'unknown'),
+            'height': images[0].get('height', 'unknown'),
+            'model': 'FLUX.1 [dev]',
+            'prompt': result.get('prompt', job['prompt'])
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'pending': len(self.pending),
+            'running': sum(1 for j in self.jobs.values() if j['status'] == 'running'),
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'workers': self.worker_count
+        }
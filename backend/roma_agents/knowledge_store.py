@@ -0,0 +1,187 @@
+"""
+Local Knowledge Store
+Embedding index over the curated crypto glossary (backend/knowledge/glossary.json)
+plus validated answers, used by the perplexity branch:
+  - high-similarity definitional queries ("what is ethereum") are answered locally
+  - otherwise the top matches are passed to the LLM as short context
+
+Embeddings are hashed n-gram vectors (same featurizer as the atomizer), so no
+model download or API call is needed. The matrix is built once, saved as .npy
+and memory-mapped on startup; it is rebuilt only when the sources change.
+
+    python -m roma_agents.knowledge_store query "what is a rollup"
+    python -m roma_agents.knowledge_store add "what is restaking" "Restaking is ..."
+"""
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+
+from roma_agents.atomizer import featurize
+
+EMBED_DIM = 2048
+GLOSSARY_PATH = Path(__file__).parent.parent / 'knowledge' / 'glossary.json'
+DEFAULT_DIR = Path(__file__).parent.parent / '.cache' / 'knowledge'
+
+_DEFINITIONAL_RE = re.compile(
+    r"^\s*(what\s+is|what's|whats|what\s+are|define|definition\s+of|meaning\s+of|explain)\s+(an?\s+|the\s+)?",
+    re.IGNORECASE
+)
+
+
+def definitional_subject(query: str) -> str:
+    """'What is an NFT?' -> 'nft'; returns '' for non-definitional queries"""
+    match = _DEFINITIONAL_RE.match(query)
+    if not match:
+        return ''
+    return re.sub(r'[^\w\s-]', ' ', query[match.end():]).strip().lower()
+
+
+def embed(text: str) -> np.ndarray:
+    vector = np.zeros(EMBED_DIM, dtype=np.float32)
+    indices, values = featurize(text, EMBED_DIM)
+    vector[indices] = values
+    return vector
+
+
+class KnowledgeStore:
+    def __init__(self, directory: str = None, direct_threshold: float = None, context_threshold: float = None):
+        self.directory = Path(directory or os.getenv('KNOWLEDGE_DIR', DEFAULT_DIR))
+        self.direct_threshold = direct_threshold or float(os.getenv('KNOWLEDGE_DIRECT_THRESHOLD', 0.85))
+        self.context_threshold = context_threshold or float(os.getenv('KNOWLEDGE_CONTEXT_THRESHOLD', 0.45))
+        self.answers_path = self.directory / 'answers.jsonl'
+
+        self.entries: List[Dict[str, Any]] = []  # one per definition
+        self.row_entry: np.ndarray = np.zeros(0, dtype=np.int32)  # index row -> entry
+        self.vectors = np.zeros((0, EMBED_DIM), dtype=np.float32)
+        self.hits = {'direct': 0, 'context': 0}
+        self.misses = 0
+        self._load()
+
+    def _sources_stamp(self) -> Dict[str, float]:
+        stamp = {'dim': EMBED_DIM}
+        for path in (GLOSSARY_PATH, self.answers_path):
+            stamp[path.name] = path.stat().st_mtime if path.exists() else 0
+        return stamp
+
+    def _read_sources(self) -> List[Dict[str, Any]]:
+        entries = []
+        try:
+            for item in json.loads(GLOSSARY_PATH.read_text(encoding='utf-8')):
+                entries.append({'keys': [item['term']] + item.get('aliases', []), 'text': item['definition'], 'source': 'glossary'})
+        except (OSError, ValueError) as e:
+            print(f"[KNOWLEDGE] Could not read glossary: {e}")
+        if self.answers_path.exists():
+            for line in self.answers_path.read_text(encoding='utf-8').splitlines():
+                if line.strip():
+                    item = json.loads(line)
+                    entries.append({'keys': [item['question']], 'text': item['answer'], 'source': 'validated'})
+        return entries
+
+    def _load(self):
+        """Memory-map the saved index, rebuilding it when the sources are newer"""
+        started = time.perf_counter()
+        meta_path, vectors_path = self.directory / 'index.json', self.directory / 'vectors.npy'
+        stamp = self._sources_stamp()
+        try:
+            meta = json.loads(meta_path.read_text(encoding='utf-8'))
+            if meta.get('stamp') != stamp:
+                raise ValueError('stale index')
+            self.entries = meta['entries']
+            self.row_entry = np.array(meta['row_entry'], dtype=np.int32)
+            self.vectors = np.load(vectors_path, mmap_mode='r')
+            print(f"[KNOWLEDGE] Mapped {len(self.row_entry)} keys / {len(self.entries)} entries in {(time.perf_counter() - started) * 1000:.1f}ms")
+            return
+        except (OSError, ValueError, KeyError):
+            pass
+
+        self.entries = self._read_sources()
+        rows, owners = [], []
+        for i, entry in enumerate(self.entries):
+            for key in entry['keys']:
+                subject = definitional_subject(key) or key
+                rows.append(embed(subject))
+                owners.append(i)
+        self.vectors = np.vstack(rows) if rows else np.zeros((0, EMBED_DIM), dtype=np.float32)
+        self.row_entry = np.array(owners, dtype=np.int32)
+
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            np.save(vectors_path, self.vectors)
+            meta_path.write_text(json.dumps({'stamp': stamp, 'entries': self.entries, 'row_entry': owners}), encoding='utf-8')
+            self.vectors = np.load(vectors_path, mmap_mode='r')
+        except OSError as e:
+            print(f"[KNOWLEDGE] Could not save index: {e}")
+        print(f"[KNOWLEDGE] Built index: {len(owners)} keys / {len(self.entries)} entries in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[float, Dict[str, Any]]]:
+        """Top-k distinct entries by cosine similarity"""
+        if not len(self.row_entry):
+            return []
+        subject = definitional_subject(query) or query.lower()
+        scores = np.asarray(self.vectors @ embed(subject))
+        results, seen = [], set()
+        for row in np.argsort(-scores)[:k * 4]:
+            entry_id = int(self.row_entry[row])
+            if entry_id not in seen:
+                seen.add(entry_id)
+                results.append((float(scores[row]), self.entries[entry_id]))
+            if len(results) == k:
+                break
+        return results
+
+    def lookup(self, query: str) -> Dict[str, Any]:
+        """
+        Returns {'answer': str|None, 'context': [str], 'score': float}.
+        Direct answers only for definitional queries above the direct threshold.
+        """
+        matches = self.search(query)
+        if not matches:
+            self.misses += 1
+            return {'answer': None, 'context': [], 'score': 0.0}
+
+        best_score, best = matches[0]
+        if definitional_subject(query) and best_score >= self.direct_threshold:
+            self.hits['direct'] += 1
+            print(f"[KNOWLEDGE] ✅ Direct answer ({best['source']}, sim={best_score:.2f}): {query[:50]}")
+            return {'answer': best['text'], 'context': [], 'score': best_score}
+
+        context = [entry['text'] for score, entry in matches if score >= self.context_threshold]
+        if context:
+            self.hits['context'] += 1
+        else:
+            self.misses += 1
+        return {'answer': None, 'context': context, 'score': best_score}
+
+    def add_answer(self, question: str, answer: str):
+        """Append a validated Q/A pair; the index is rebuilt on next load"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.answers_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'question': question, 'answer': answer}, ensure_ascii=False) + '\n')
+        self._load()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self.entries),
+            'keys': int(len(self.row_entry)),
+            'direct_hits': self.hits['direct'],
+            'context_hits': self.hits['context'],
+            'misses': self.misses
+        }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == 'query':
+        store = KnowledgeStore()
+        print(json.dumps(store.lookup(sys.argv[2]), indent=2, ensure_ascii=False))
+        for score, entry in store.search(sys.argv[2]):
+            print(f"  {score:.3f}  {entry['keys'][0]}")
+    elif len(sys.argv) >= 4 and sys.argv[1] == 'add':
+        KnowledgeStore().add_answer(sys.argv[2], sys.argv[3])
+    else:
+        print('Usage: python -m roma_agents.knowledge_store query "<text>" | add "<question>" "<answer>"')
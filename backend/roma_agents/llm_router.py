@@ -0,0 +1,297 @@
+"""
+Latency-Aware LLM Provider Selection
+Every LLM call names a task class (routing, extraction, planning, synthesis,
+worker, twitter, prompt_enhance) and goes through LLMRouter.complete(). The
+router keeps a rolling window of latency, errors and cost per provider and
+task class, orders the configured candidates by LLM_OBJECTIVE and falls back
+down the list on failure:
+
+  p95     fastest p95 latency among candidates within LLM_COST_BUDGET (default)
+  cost    cheapest healthy candidate
+  static  configured order (the previous hard-coded assignment)
+
+Providers share one async interface: complete(messages, max_tokens,
+temperature, json_mode) -> {'success', 'content', 'usage', 'api_source'}.
+LocalProvider is an in-process stand-in for tests and offline runs.
+"""
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Dict, Any, List, Callable, Optional, Tuple
+
+from roma_agents import providers
+
+# USD per 1K tokens (input, output)
+MODEL_PRICES = {
+    'gpt-4o-mini': (0.00015, 0.0006),
+    'gpt-4.1-mini': (0.0004, 0.0016),
+    'gemini-1.5-flash': (0.000075, 0.0003),
+}
+
+# Task class -> candidates in static order (LLM_CANDIDATES_<CLASS>=openai:gpt-4o-mini,gemini:gemini-1.5-flash)
+DEFAULT_CANDIDATES = {
+    'routing': ['openai:gpt-4o-mini', 'gemini:gemini-1.5-flash'],
+    'extraction': ['openai:gpt-4o-mini', 'gemini:gemini-1.5-flash'],
+    'planning': ['openai:gpt-4.1-mini', 'openai:gpt-4o-mini'],
+    'synthesis': ['openai:gpt-4o-mini', 'gemini:gemini-1.5-flash'],
+    'worker': ['gemini:gemini-1.5-flash', 'openai:gpt-4o-mini'],
+    'twitter': ['gemini:gemini-1.5-flash', 'openai:gpt-4o-mini'],
+    'prompt_enhance': ['gemini:gemini-1.5-flash', 'openai:gpt-4o-mini'],
+}
+
+
+class LLMProvider:
+    """Shared async interface; subclasses implement _call()"""
+    kind = 'base'
+
+    def __init__(self, model: str):
+        self.model = model
+        self.name = f"{self.kind}:{model}"
+
+    def available(self) -> bool:
+        return True
+
+    def cost(self, usage: Dict[str, Any]) -> float:
+        price_in, price_out = MODEL_PRICES.get(self.model, (0.0, 0.0))
+        return (usage.get('prompt_tokens', 0) * price_in + usage.get('completion_tokens', 0) * price_out) / 1000
+
+    async def complete(self, messages: List[Dict[str, str]], max_tokens: int = 300,
+                       temperature: float = 0.2, json_mode: bool = False) -> Dict[str, Any]:
+        try:
+            return await self._call(messages, max_tokens, temperature, json_mode)
+        except Exception as e:
+            return {'success': False, 'error': str(e) or type(e).__name__, 'api_source': self.name}
+
+    async def _call(self, messages, max_tokens, temperature, json_mode) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class OpenAIProvider(LLMProvider):
+    kind = 'openai'
+    url = "https://api.openai.com/v1/chat/completions"
+
+    def __init__(self, model: str, api_key: Optional[str]):
+        super().__init__(model)
+        self.api_key = api_key
+
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    async def _call(self, messages, max_tokens, temperature, json_mode):
+        import aiohttp
+        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        payload = {"model": self.model, "messages": messages, "max_tokens": max_tokens, "temperature": temperature}
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        async with aiohttp.ClientSession() as session:
+            async with session.post(self.url, headers=headers, json=payload) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    return {'success': False, 'error': f'OpenAI API error: {response.status} - {error_text[:200]}', 'api_source': self.name}
+                data = await response.json()
+        return {
+            'success': True,
+            'content': data['choices'][0]['message']['content'].strip(),
+            'usage': data.get('usage') or {},
+            'api_source': f"OpenAI {self.model}"
+        }
+
+
+class GeminiProvider(LLMProvider):
+    kind = 'gemini'
+
+    def __init__(self, model: str, api_key: Optional[str]):
+        super().__init__(model)
+        self.api_key = api_key
+
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    async def _call(self, messages, max_tokens, temperature, json_mode):
+        model = providers.gemini_model(self.model, self.api_key)
+        # Gemini takes one prompt: system instructions first, then the user turn(s)
+        prompt = "\n\n".join(m['content'] for m in messages)
+        generation_config = {'temperature': temperature, 'max_output_tokens': max_tokens}
+        if json_mode:
+            generation_config['response_mime_type'] = 'application/json'
+        response = await model.generate_content_async(prompt, generation_config=generation_config)
+        metadata = getattr(response, 'usage_metadata', None)
+        usage = {
+            'prompt_tokens': getattr(metadata, 'prompt_token_count', 0) or 0,
+            'completion_tokens': getattr(metadata, 'candidates_token_count', 0) or 0
+        }
+        return {'success': True, 'content': response.text.strip(), 'usage': usage, 'api_source': f"Gemini {self.model}"}
+
+
+class LocalProvider(LLMProvider):
+    """In-process stand-in: respond(messages) -> str, with optional simulated latency/failures"""
+    kind = 'local'
+
+    def __init__(self, model: str, respond: Callable[[List[Dict[str, str]]], str],
+                 latency: float = 0.0, fail_rate: float = 0.0):
+        super().__init__(model)
+        self.respond = respond
+        self.latency = latency
+        self.fail_rate = fail_rate
+
+    async def _call(self, messages, max_tokens, temperature, json_mode):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail_rate and random.random() < self.fail_rate:
+            return {'success': False, 'error': 'simulated failure', 'api_source': self.name}
+        return {'success': True, 'content': self.respond(messages), 'usage': {}, 'api_source': f"Local {self.model}"}
+
+
+class ProviderStats:
+    """Rolling window of (time, latency, ok, cost) for one provider + task class"""
+
+    def __init__(self, window: int, max_age: float):
+        self.samples: deque = deque(maxlen=window)
+        self.max_age = max_age
+
+    def record(self, latency: float, ok: bool, cost: float):
+        self.samples.append((time.time(), latency, ok, cost))
+
+    def _recent(self) -> List[Tuple[float, float, bool, float]]:
+        cutoff = time.time() - self.max_age
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        return list(self.samples)
+
+    def summary(self) -> Dict[str, float]:
+        samples = self._recent()
+        if not samples:
+            return {'samples': 0}
+        latencies = sorted(s[1] for s in samples)
+        ok = [s for s in samples if s[2]]
+        return {
+            'samples': len(samples),
+            'p50': latencies[len(latencies) // 2],
+            'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            'error_rate': 1 - len(ok) / len(samples),
+            'avg_cost': sum(s[3] for s in ok) / len(ok) if ok else 0.0
+        }
+
+
+class LLMRouter:
+    def __init__(self, openai_api_key: str = None, gemini_api_key: str = None):
+        self.objective = os.getenv('LLM_OBJECTIVE', 'p95').lower()
+        self.cost_budget = float(os.getenv('LLM_COST_BUDGET', 0.002))  # USD per call
+        self.max_error_rate = float(os.getenv('LLM_MAX_ERROR_RATE', 0.5))
+        self.min_samples = int(os.getenv('LLM_MIN_SAMPLES', 5))
+        self.explore = float(os.getenv('LLM_EXPLORE', 0.05))
+        self.timeout = float(os.getenv('LLM_TIMEOUT', 30))
+        self.window = int(os.getenv('LLM_STATS_WINDOW', 200))
+        self.max_age = float(os.getenv('LLM_STATS_MAX_AGE', 3600))
+
+        self.providers: Dict[str, LLMProvider] = {}
+        self.candidates: Dict[str, List[str]] = {}
+        self.stats: Dict[Tuple[str, str], ProviderStats] = {}
+        self.selected: Dict[str, Dict[str, int]] = {}
+
+        for task_class, default in DEFAULT_CANDIDATES.items():
+            configured = os.getenv(f'LLM_CANDIDATES_{task_class.upper()}')
+            names = [n.strip() for n in configured.split(',') if n.strip()] if configured else list(default)
+            self.candidates[task_class] = names
+            for name in names:
+                if name not in self.providers:
+                    kind, _, model = name.partition(':')
+                    if kind == 'openai':
+                        self.providers[name] = OpenAIProvider(model, openai_api_key)
+                    elif kind == 'gemini':
+                        self.providers[name] = GeminiProvider(model, gemini_api_key)
+
+    def register(self, provider: LLMProvider, task_classes: List[str] = None, primary: bool = False):
+        """Add a provider (e.g. LocalProvider) as a candidate for the given task classes (default: all)"""
+        self.providers[provider.name] = provider
+        for task_class in task_classes or list(self.candidates):
+            names = [n for n in self.candidates.setdefault(task_class, []) if n != provider.name]
+            self.candidates[task_class] = [provider.name] + names if primary else names + [provider.name]
+
+    def available(self, task_class: str) -> bool:
+        return any(self._usable(name) for name in self.candidates.get(task_class, []))
+
+    def _usable(self, name: str) -> bool:
+        provider = self.providers.get(name)
+        return provider is not None and provider.available()
+
+    def _stats(self, name: str, task_class: str) -> ProviderStats:
+        key = (name, task_class)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = ProviderStats(self.window, self.max_age)
+        return stats
+
+    def rank(self, task_class: str) -> List[str]:
+        """Candidates in the order they'll be tried for the next call"""
+        names = [n for n in self.candidates.get(task_class, []) if self._usable(n)]
+        if self.objective == 'static' or len(names) < 2:
+            return names
+
+        measured, cold, demoted = [], [], []
+        for position, name in enumerate(names):
+            summary = self._stats(name, task_class).summary()
+            if summary['samples'] < self.min_samples:
+                cold.append(name)
+            elif summary['error_rate'] > self.max_error_rate or (self.objective == 'p95' and summary['avg_cost'] > self.cost_budget):
+                demoted.append((summary['error_rate'], position, name))
+            else:
+                # Errors cost a retry on the next provider: inflate latency by expected attempts
+                score = summary['avg_cost'] if self.objective == 'cost' else summary['p95'] / max(0.05, 1 - summary['error_rate'])
+                measured.append((score, position, name))
+
+        order = [n for *_, n in sorted(measured)] + cold + [n for *_, n in sorted(demoted)]
+        # Occasionally try an under-sampled provider first so its numbers stay current
+        if cold and order[0] not in cold and random.random() < self.explore:
+            pick = random.choice(cold)
+            order.remove(pick)
+            order.insert(0, pick)
+        return order
+
+    async def complete(self, task_class: str, messages: List[Dict[str, str]], max_tokens: int = 300,
+                       temperature: float = 0.2, json_mode: bool = False) -> Dict[str, Any]:
+        """Try ranked candidates until one succeeds; returns the provider's result plus 'provider' and 'latency'"""
+        order = self.rank(task_class)
+        if not order:
+            return {'success': False, 'error': f'No LLM provider available for {task_class}', 'api_source': 'None'}
+
+        errors = []
+        for attempt, name in enumerate(order):
+            provider = self.providers[name]
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(provider.complete(messages, max_tokens, temperature, json_mode), self.timeout)
+            except asyncio.TimeoutError:
+                result = {'success': False, 'error': f'timeout after {self.timeout:.0f}s', 'api_source': name}
+            latency = time.monotonic() - started
+            ok = bool(result.get('success'))
+            self._stats(name, task_class).record(latency, ok, provider.cost(result.get('usage') or {}) if ok else 0.0)
+            if ok:
+                counts = self.selected.setdefault(task_class, {})
+                counts[name] = counts.get(name, 0) + 1
+                if attempt:
+                    print(f"[LLM] {task_class}: {name} answered after {attempt} fallback(s)")
+                return {**result, 'provider': name, 'latency': latency}
+            print(f"[LLM] {task_class}: {name} failed ({result.get('error')})")
+            errors.append(f"{name}: {result.get('error')}")
+
+        return {'success': False, 'error': '; '.join(errors), 'api_source': order[-1]}
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {'objective': self.objective, 'cost_budget': self.cost_budget, 'classes': {}}
+        for task_class, names in self.candidates.items():
+            entry = {'candidates': [n for n in names if self._usable(n)], 'selected': self.selected.get(task_class, {}), 'providers': {}}
+            for name in names:
+                summary = self._stats(name, task_class).summary()
+                if summary['samples']:
+                    entry['providers'][name] = {
+                        'samples': summary['samples'],
+                        'p50_ms': round(summary['p50'] * 1000, 1),
+                        'p95_ms': round(summary['p95'] * 1000, 1),
+                        'error_rate': round(summary['error_rate'], 3),
+                        'avg_cost_usd': round(summary['avg_cost'], 6)
+                    }
+            stats['classes'][task_class] = entry
+        return stats
@@ -0,0 +1,118 @@
+"""
+Event Loop Monitor
+Measures asyncio loop lag continuously and captures the stack of whatever
+callback is blocking the loop, so regressions that freeze every connected
+user show up in logs and metrics.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, Any, Optional
+
+
+class LoopMonitor:
+    """
+    Heartbeat task + watchdog thread.
+    The heartbeat records how late each tick fires (loop lag); the watchdog
+    thread notices when the heartbeat stops and snapshots the loop thread's stack.
+    """
+
+    def __init__(self, interval: float = None, threshold: float = None, debug: bool = None):
+        self.interval = interval or float(os.getenv('LOOP_MONITOR_INTERVAL_MS', 100)) / 1000
+        self.threshold = threshold or float(os.getenv('LOOP_LAG_THRESHOLD_MS', 250)) / 1000
+        self.debug = debug if debug is not None else os.getenv('LOOP_DEBUG', '').lower() in ('1', 'true', 'yes')
+
+        self.lags = deque(maxlen=600)  # ~1 minute of samples at 100ms
+        self.max_lag = 0.0
+        self.stall_count = 0
+        self.stalls = deque(maxlen=20)  # Recent captured stacks
+
+        self._last_tick = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._reported_tick = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self, loop: asyncio.AbstractEventLoop = None):
+        """Start monitoring the running loop (call from inside the loop)"""
+        loop = loop or asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stopped.clear()
+
+        if self.debug:
+            # asyncio's own slow-callback reporting (logs 'Executing <Handle ...> took X seconds')
+            import logging
+            logging.basicConfig()
+            logging.getLogger('asyncio').setLevel(logging.WARNING)
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.threshold
+            print(f"[LOOP] Debug mode: asyncio slow-callback reporting > {self.threshold * 1000:.0f}ms")
+
+        self._task = loop.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watchdog, name='loop-watchdog', daemon=True)
+        self._thread.start()
+        print(f"[LOOP] Monitor started (interval {self.interval * 1000:.0f}ms, threshold {self.threshold * 1000:.0f}ms)")
+
+    def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._thread:
+            self._thread.join(timeout=self.interval)
+            self._thread = None
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._last_tick = now
+            self.lags.append(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if lag > self.threshold:
+                print(f"[LOOP] ⚠️ Loop lag {lag * 1000:.0f}ms (threshold {self.threshold * 1000:.0f}ms)")
+
+    def _watchdog(self):
+        """Runs in its own thread so it can see the loop while the loop is blocked"""
+        while not self._stopped.wait(self.interval / 2):
+            last_tick = self._last_tick
+            blocked_for = time.monotonic() - last_tick - self.interval
+            if blocked_for < self.threshold or last_tick == self._reported_tick:
+                continue
+
+            # One capture per stall
+            self._reported_tick = last_tick
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = ''.join(traceback.format_stack(frame)) if frame else '<loop thread not found>'
+            self.stall_count += 1
+            self.stalls.append({
+                'timestamp': time.time(),
+                'blocked_ms': round(blocked_for * 1000),
+                'stack': stack
+            })
+            print(f"[LOOP] 🧊 Event loop blocked for {blocked_for * 1000:.0f}ms, offending stack:\n{stack}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        lags = sorted(self.lags)
+
+        def pct(p):
+            return round(lags[min(len(lags) - 1, int(p / 100 * len(lags)))] * 1000, 2) if lags else 0.0
+
+        last = self.stalls[-1] if self.stalls else None
+        return {
+            'lag_p50_ms': pct(50),
+            'lag_p99_ms': pct(99),
+            'lag_max_ms': round(self.max_lag * 1000, 2),
+            'stall_count': self.stall_count,
+            'last_stall': {k: last[k] for k in ('timestamp', 'blocked_ms')} if last else None,
+            'debug': self.debug
+        }
@@ -0,0 +1,235 @@
+"""
+Historical Market Series
+Hourly price / market cap / volume per coin from CoinGecko market_chart,
+stored as raw float64 rows [ts, price, market_cap, volume] in
+.cache/series/<coin_id>.f64. Files are append-only (only the range since the
+last stored hour is fetched) and read back memory-mapped.
+
+Indicators are computed in vectorized form over daily closes: returns,
+annualized volatility, SMA 7/30, max/current drawdown and cross-coin
+correlation of daily log returns. summarize() renders them as one compact
+line per coin for the aggregator, so trend/forecast answers start from real
+numbers instead of LLM prose.
+"""
+import asyncio
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+DEFAULT_DIR = Path(__file__).parent.parent / '.cache' / 'series'
+
+COLUMNS = ('ts', 'price', 'market_cap', 'volume')
+HOUR = 3600
+DAY = 24 * HOUR
+
+_TREND_RE = re.compile(r'\b(trend|trending|predict|prediction|forecast|outlook|momentum|volatility)\b|xu hướng|dự đoán|dự báo', re.IGNORECASE)
+
+
+def is_trend_query(query: str) -> bool:
+    return bool(_TREND_RE.search(query))
+
+
+def hourly_rows(chart: Dict[str, Any]) -> np.ndarray:
+    """market_chart payload -> (N, 4) rows, one per hour (last sample in each hour wins)"""
+    prices = np.asarray(chart.get('prices') or [], dtype=np.float64).reshape(-1, 2)
+    if not len(prices):
+        return np.empty((0, len(COLUMNS)))
+    ts = prices[:, 0] / 1000.0
+    rows = np.zeros((len(prices), len(COLUMNS)))
+    rows[:, 0] = ts
+    rows[:, 1] = prices[:, 1]
+    for column, field in ((2, 'market_caps'), (3, 'total_volumes')):
+        values = np.asarray(chart.get(field) or [], dtype=np.float64).reshape(-1, 2)
+        if len(values):
+            # Align by timestamp (CoinGecko usually returns the same grid for all three)
+            index = np.clip(np.searchsorted(values[:, 0] / 1000.0, ts), 0, len(values) - 1)
+            rows[:, column] = values[index, 1]
+
+    rows = rows[np.argsort(ts, kind='stable')]
+    hours = np.floor(rows[:, 0] / HOUR)
+    last_in_hour = np.append(hours[1:] != hours[:-1], True)
+    return rows[last_in_hour]
+
+
+def daily_closes(rows: np.ndarray) -> np.ndarray:
+    """Last price of each UTC day, oldest first"""
+    if not len(rows):
+        return np.empty(0)
+    days = np.floor(rows[:, 0] / DAY)
+    last_in_day = np.append(days[1:] != days[:-1], True)
+    return rows[last_in_day, 1]
+
+
+def indicators(rows: np.ndarray) -> Dict[str, Any]:
+    """Vectorized indicators over one coin's hourly rows"""
+    if len(rows) < 2:
+        return {}
+    prices = rows[:, 1]
+    ts = rows[:, 0]
+    now_ts, now_price = ts[-1], prices[-1]
+
+    result = {'price': float(now_price), 'days': round(float(ts[-1] - ts[0]) / DAY, 1)}
+    # Returns vs the last sample at or before now - horizon
+    for label, horizon in (('return_1d', DAY), ('return_7d', 7 * DAY), ('return_30d', 30 * DAY), ('return_90d', 90 * DAY)):
+        if ts[0] <= now_ts - horizon:
+            past = prices[np.searchsorted(ts, now_ts - horizon, side='right') - 1]
+            result[label] = float(now_price / past - 1) if past else None
+
+    closes = daily_closes(rows)
+    log_returns = np.diff(np.log(closes[closes > 0]))
+    if len(log_returns) >= 2:
+        window = log_returns[-30:]
+        result['volatility_30d'] = float(window.std(ddof=1) * np.sqrt(365))
+    for n in (7, 30):
+        if len(closes) >= n:
+            result[f'sma_{n}'] = float(closes[-n:].mean())
+    if 'sma_7' in result and 'sma_30' in result:
+        result['trend'] = 'up' if result['sma_7'] > result['sma_30'] else 'down'
+
+    running_peak = np.maximum.accumulate(prices)
+    drawdowns = prices / running_peak - 1
+    result['max_drawdown'] = float(drawdowns.min())
+    result['drawdown'] = float(drawdowns[-1])
+    return result
+
+
+def correlation(series: Dict[str, np.ndarray], days: int = 90) -> Dict[str, float]:
+    """Pairwise correlation of daily log returns over the days all coins share"""
+    closes = {}
+    for coin, rows in series.items():
+        if len(rows) < 2:
+            continue
+        day_index = np.floor(rows[:, 0] / DAY)
+        last_in_day = np.append(day_index[1:] != day_index[:-1], True)
+        closes[coin] = dict(zip(day_index[last_in_day].astype(np.int64).tolist(), rows[last_in_day, 1].tolist()))
+    if len(closes) < 2:
+        return {}
+
+    common = sorted(set.intersection(*(set(c) for c in closes.values())))[-(days + 1):]
+    if len(common) < 3:
+        return {}
+    coins = list(closes)
+    matrix = np.array([[closes[c][d] for d in common] for c in coins])
+    matrix = np.where(matrix > 0, matrix, np.nan)
+    returns = np.diff(np.log(matrix), axis=1)
+    returns = returns[:, ~np.isnan(returns).any(axis=0)]
+    if returns.shape[1] < 2:
+        return {}
+    corr = np.corrcoef(returns)
+    return {
+        f"{coins[i]}/{coins[j]}": round(float(corr[i, j]), 3)
+        for i in range(len(coins)) for j in range(i + 1, len(coins))
+    }
+
+
+def _pct(value: Optional[float]) -> str:
+    return f"{value * 100:+.1f}%" if value is not None else 'n/a'
+
+
+def format_indicators(coin: str, ind: Dict[str, Any]) -> str:
+    price = ind['price']
+    parts = [f"{coin}: ${price:,.2f}" if price >= 1 else f"{coin}: ${price:.6g}"]
+    for label in ('return_1d', 'return_7d', 'return_30d', 'return_90d'):
+        if label in ind:
+            parts.append(f"{label[7:]} {_pct(ind[label])}")
+    if 'volatility_30d' in ind:
+        parts.append(f"vol30d {ind['volatility_30d'] * 100:.0f}%")
+    if 'trend' in ind:
+        parts.append(f"SMA7 {'>' if ind['trend'] == 'up' else '<'} SMA30 ({ind['trend']})")
+    parts.append(f"drawdown {_pct(ind['drawdown'])} (max {_pct(ind['max_drawdown'])} over {ind['days']:.0f}d)")
+    return ' | '.join(parts)
+
+
+class MarketSeriesStore:
+    def __init__(self, api_integrations, directory: str = None):
+        self.api_integrations = api_integrations
+        self.dir = Path(directory or os.getenv('SERIES_DIR') or DEFAULT_DIR)
+        self.history_days = int(os.getenv('SERIES_HISTORY_DAYS', 90))
+        self.refresh_s = float(os.getenv('SERIES_REFRESH_S', 3600))
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.fetches = 0
+        self.appended_rows = 0
+        self.hits = 0
+
+    def _path(self, coin_id: str) -> Path:
+        safe = ''.join(ch for ch in coin_id if ch.isalnum() or ch in '-_')
+        return self.dir / f"{safe}.f64"
+
+    def load(self, coin_id: str) -> np.ndarray:
+        """Stored rows, memory-mapped (empty array if nothing stored yet)"""
+        path = self._path(coin_id)
+        if not path.exists() or path.stat().st_size < 8 * len(COLUMNS):
+            return np.empty((0, len(COLUMNS)))
+        rows = path.stat().st_size // (8 * len(COLUMNS))
+        return np.memmap(path, dtype=np.float64, mode='r', shape=(rows, len(COLUMNS)))
+
+    def _append(self, coin_id: str, stored: np.ndarray, fresh: np.ndarray) -> int:
+        """Append rows newer than the last stored hour; rewrite when history exceeds the window"""
+        if len(stored):
+            fresh = fresh[np.floor(fresh[:, 0] / HOUR) > np.floor(stored[-1, 0] / HOUR)]
+        if not len(fresh):
+            return 0
+        path = self._path(coin_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        cutoff = fresh[-1, 0] - (self.history_days + 1) * DAY
+        if len(stored) and stored[0, 0] < cutoff - 7 * DAY:
+            # Trim occasionally (a week past the window) instead of on every append
+            merged = np.concatenate([np.asarray(stored), fresh])
+            merged = merged[merged[:, 0] >= cutoff]
+            tmp = path.with_suffix('.tmp')
+            merged.astype(np.float64).tofile(tmp)
+            os.replace(tmp, path)
+        else:
+            with open(path, 'ab') as f:
+                f.write(np.ascontiguousarray(fresh, dtype=np.float64).tobytes())
+        return len(fresh)
+
+    async def series(self, coin_id: str) -> np.ndarray:
+        """Rows for one coin, fetching only the range since the last stored sample when stale"""
+        lock = self.locks.setdefault(coin_id, asyncio.Lock())
+        async with lock:
+            stored = self.load(coin_id)
+            now = time.time()
+            if len(stored) and now - stored[-1, 0] < self.refresh_s:
+                self.hits += 1
+                return stored
+
+            start = stored[-1, 0] if len(stored) else now - self.history_days * DAY
+            # Ranges over a day come back hourly; keep them that way for short incremental fetches too
+            start = min(start, now - 2 * DAY)
+            chart = await self.api_integrations.get_coingecko_market_chart(coin_id, start, now)
+            self.fetches += 1
+            if not chart.get('success'):
+                print(f"[SERIES] {coin_id}: fetch failed ({chart.get('error')}), using {len(stored)} stored rows")
+                return stored
+
+            added = self._append(coin_id, stored, hourly_rows(chart))
+            self.appended_rows += added
+            print(f"[SERIES] {coin_id}: +{added} hourly rows")
+            return self.load(coin_id)
+
+    async def analyze(self, coin_ids: List[str]) -> Dict[str, Any]:
+        """Indicators per coin plus pairwise correlation"""
+        coin_ids = list(dict.fromkeys(c for c in coin_ids if c))
+        rows = await asyncio.gather(*(self.series(c) for c in coin_ids), return_exceptions=True)
+        series = {c: r for c, r in zip(coin_ids, rows) if isinstance(r, np.ndarray) and len(r) >= 2}
+        return {
+            'indicators': {c: indicators(r) for c, r in series.items()},
+            'correlation': correlation(series) if len(series) > 1 else {}
+        }
+
+    async def summarize(self, coin_ids: List[str]) -> str:
+        """Compact text block for the aggregator ('' when no data)"""
+        analysis = await self.analyze(coin_ids)
+        lines = [format_indicators(c, ind) for c, ind in analysis['indicators'].items() if ind]
+        if analysis['correlation']:
+            lines.append('Correlation (daily returns): ' + ', '.join(f"{pair} {value:+.2f}" for pair, value in analysis['correlation'].items()))
+        return '\n'.join(lines)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stored = sorted(p.stem for p in self.dir.glob('*.f64')) if self.dir.exists() else []
+        return {'coins': len(stored), 'fetches': self.fetches, 'appended_rows': self.appended_rows, 'fresh_hits': self.hits}
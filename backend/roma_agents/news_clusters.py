@@ -0,0 +1,178 @@
+"""
+Near-Duplicate News Clustering
+The same story syndicated by several outlets arrives with slightly different
+titles. Each new headline gets a MinHash signature over its word shingles;
+LSH banding (NEWS_LSH_BANDS bands of NEWS_MINHASH_PERM / bands rows) finds
+candidate clusters through hash-table lookups, so adding a headline costs
+O(bands) regardless of how many stories or feeds are indexed. A candidate
+is joined when its exact shingle Jaccard similarity clears
+NEWS_DUP_THRESHOLD and it was published within NEWS_CLUSTER_WINDOW_H hours;
+one changed word in a short title ("record inflows" / "record outflows")
+stays below the threshold.
+
+Each merge refreshes the cluster: the newest headline becomes the
+representative and the cluster moves to the back of the index order, so
+capacity evicts stale stories rather than active ones. stories() walks that
+order from the back (most recently active first, no sort per query) and
+yields one entry per cluster with the set of sources that carried it.
+"""
+import os
+import re
+import time
+import zlib
+from collections import OrderedDict
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Iterator, List, Optional
+from urllib.parse import urlparse
+
+import numpy as np
+
+from roma_agents import providers
+
+_PRIME = (1 << 31) - 1
+_WORD_RE = re.compile(r'\w+')
+_POSSESSIVE_RE = re.compile(r"['\u2019]s\b")
+_STOPWORDS = {'a', 'an', 'the', 'to', 'of', 'in', 'on', 'for', 'and', 'as', 'at', 'by', 'is', 'with', 'after', 'amid'}
+
+
+def shingles(title: str) -> List[str]:
+    """Word unigrams + bigrams of a normalized title (stopwords dropped)"""
+    words = [w for w in _WORD_RE.findall(_POSSESSIVE_RE.sub('', title.lower())) if w not in _STOPWORDS]
+    return words + [' '.join(p) for p in zip(words, words[1:])]
+
+
+def published_ts(published: str, default: float) -> float:
+    """RSS pubDate (RFC 822) or Atom/ISO 8601 date -> epoch seconds; naive dates are UTC"""
+    if not published:
+        return default
+    try:
+        parsed = parsedate_to_datetime(published)
+    except (TypeError, ValueError, IndexError):
+        try:
+            parsed = providers.load('dateutil.parser').parse(published)
+        except (ValueError, OverflowError):
+            return default
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def entry_ts(entry: Dict[str, Any], default: float) -> float:
+    """Ingested entries carry feedparser's parsed date; older cached ones only the string"""
+    ts = entry.get('published_ts')
+    return float(ts) if ts else published_ts(entry.get('published', ''), default)
+
+
+def source_of(url: str) -> str:
+    host = urlparse(url).netloc.lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+class NewsClusterIndex:
+    def __init__(self, num_perm: int = None, bands: int = None, threshold: float = None, capacity: int = None):
+        self.num_perm = num_perm or int(os.getenv('NEWS_MINHASH_PERM', 64))
+        self.bands = bands or int(os.getenv('NEWS_LSH_BANDS', 32))
+        if self.num_perm % self.bands:
+            raise ValueError(f"NEWS_MINHASH_PERM ({self.num_perm}) must be a multiple of NEWS_LSH_BANDS ({self.bands})")
+        self.rows = self.num_perm // self.bands
+        self.threshold = threshold if threshold is not None else float(os.getenv('NEWS_DUP_THRESHOLD', 0.6))
+        self.window = float(os.getenv('NEWS_CLUSTER_WINDOW_H', 48)) * 3600
+        self.capacity = capacity or int(os.getenv('NEWS_CLUSTER_CAPACITY', 2000))
+
+        rng = np.random.default_rng(7)  # fixed seed: signatures stay comparable across restarts
+        self.a = rng.integers(1, _PRIME, self.num_perm, dtype=np.int64)
+        self.b = rng.integers(0, _PRIME, self.num_perm, dtype=np.int64)
+
+        self.clusters: 'OrderedDict[int, Dict[str, Any]]' = OrderedDict()
+        self.buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self.links: Dict[str, int] = {}
+        self.next_id = 0
+        self.added = 0
+        self.merged = 0
+
+    def signature(self, grams) -> Optional[np.ndarray]:
+        if not grams:
+            return None
+        h = np.array([zlib.crc32(g.encode('utf-8')) % _PRIME for g in grams], dtype=np.int64)
+        # (num_perm, shingles) universal hashes; the min per row is the MinHash
+        return ((self.a[:, None] * h[None, :] + self.b[:, None]) % _PRIME).min(axis=1)
+
+    def _band_keys(self, sig: np.ndarray) -> List[bytes]:
+        return [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def _match(self, grams: frozenset, keys: List[bytes], ts: float) -> Optional[int]:
+        """LSH candidates, confirmed with the exact Jaccard (the 64-hash estimate is too noisy on short titles)"""
+        candidates = {cid for band, key in enumerate(keys) for cid in self.buckets[band].get(key, ())}
+        best, best_sim = None, self.threshold
+        for cid in candidates:
+            cluster = self.clusters[cid]
+            if abs(ts - cluster['published_ts']) > self.window:
+                continue
+            sim = len(grams & cluster['shingles']) / len(grams | cluster['shingles'])
+            if sim >= best_sim:
+                best, best_sim = cid, sim
+        return best
+
+    def add(self, entries: List[Dict[str, Any]], source: str) -> int:
+        """Index a feed's entries; links already indexed are skipped. Returns the number indexed"""
+        added = 0
+        for entry in entries:
+            link = entry.get('link') or entry.get('title', '')
+            if link in self.links:
+                continue
+            grams = frozenset(shingles(entry.get('title', '')))
+            sig = self.signature(grams)
+            if sig is None:
+                continue
+            keys = self._band_keys(sig)
+            ts = entry_ts(entry, time.time())
+            cid = self._match(grams, keys, ts)
+            if cid is not None:
+                cluster = self.clusters[cid]
+                cluster['sources'].add(source)
+                cluster['members'] += 1
+                if ts >= cluster['published_ts']:
+                    cluster['published_ts'] = ts
+                    cluster['representative'] = entry
+                self.clusters.move_to_end(cid)
+                self.merged += 1
+            else:
+                cid = self.next_id
+                self.next_id += 1
+                self.clusters[cid] = {
+                    'representative': entry, 'sources': {source}, 'members': 1,
+                    'shingles': grams, 'keys': keys, 'published_ts': ts
+                }
+                for band, key in enumerate(keys):
+                    self.buckets[band].setdefault(key, []).append(cid)
+                self._evict()
+            self.links[link] = cid
+            added += 1
+        self.added += added
+        return added
+
+    def _evict(self):
+        while len(self.clusters) > self.capacity:
+            cid, cluster = self.clusters.popitem(last=False)
+            for band, key in enumerate(cluster['keys']):
+                bucket = self.buckets[band][key]
+                bucket.remove(cid)
+                if not bucket:
+                    del self.buckets[band][key]
+        if len(self.links) > 4 * self.capacity:
+            self.links = {link: cid for link, cid in self.links.items() if cid in self.clusters}
+
+    def stories(self) -> Iterator[Dict[str, Any]]:
+        """One entry per cluster, most recently active first: the representative plus its sources"""
+        for c in reversed(self.clusters.values()):
+            yield {**c['representative'], 'sources': sorted(c['sources']), 'source_count': len(c['sources']),
+                   'published_ts': c['published_ts']}
+
+    def get_stats(self) -> Dict[str, Any]:
+        multi = sum(1 for c in self.clusters.values() if len(c['sources']) > 1)
+        return {
+            'clusters': len(self.clusters), 'multi_source': multi, 'headlines': self.added,
+            'merged': self.merged, 'bands': self.bands, 'rows': self.rows, 'threshold': self.threshold,
+            'window_h': self.window / 3600
+        }
@@ -0,0 +1,160 @@
+"""
+Live Price Subscriptions
+One shared CoinGecko poller serves every client watching a coin:
+clients send subscribe/unsubscribe messages, the poller fetches all watched
+coins in batched /simple/price calls and pushes an update only when a
+coin's price actually changed.
+"""
+import asyncio
+import os
+import time
+from typing import Dict, Any, Set, Iterable, List, Optional
+
+
+# CoinGecko accepts long id lists, but keep URLs well under proxy limits
+BATCH_SIZE = 250
+
+# Column order for warm-cache snapshots of last_prices
+QUOTE_FIELDS = ['price', 'market_cap', 'volume', 'change_24h', 'last_updated_at']
+
+
+class PriceSubscriptionHub:
+    """Per-coin subscriber sets + a single poll loop that fans out price changes"""
+
+    def __init__(self, api_integrations, broadcaster, poll_interval: float = None, max_coins_per_client: int = None):
+        self.api_integrations = api_integrations
+        self.broadcaster = broadcaster
+        self.poll_interval = poll_interval or float(os.getenv('PRICE_POLL_INTERVAL', 15))
+        self.max_coins_per_client = max_coins_per_client or int(os.getenv('PRICE_SUBSCRIBE_MAX_COINS', 25))
+
+        self.subscribers: Dict[str, Set[Any]] = {}  # coin_id -> websockets
+        self.client_coins: Dict[Any, Set[str]] = {}  # websocket -> coin_ids
+        self.last_prices: Dict[str, Dict[str, Any]] = {}
+
+        self.polls = 0
+        self.updates_sent = 0
+        self._poller: asyncio.Task = None
+
+    @staticmethod
+    def parse_coins(coins: Any) -> Optional[List[str]]:
+        """Client 'coins' field -> coin ids; a bare string is one coin, anything but strings is None"""
+        if coins is None:
+            return []
+        if isinstance(coins, str):
+            coins = [coins]
+        if not isinstance(coins, (list, tuple)) or not all(isinstance(c, str) for c in coins):
+            return None
+        return list(coins)
+
+    @staticmethod
+    def _normalize(coins: Iterable[str]) -> List[str]:
+        return sorted({c.strip().lower() for c in coins if c.strip()})
+
+    async def subscribe(self, websocket, coins: Iterable[str]) -> Dict[str, Any]:
+        watched = self.client_coins.setdefault(websocket, set())
+        requested = [c for c in self._normalize(coins) if c not in watched]
+        room = max(0, self.max_coins_per_client - len(watched))
+        accepted, rejected = requested[:room], requested[room:]
+
+        for coin_id in accepted:
+            watched.add(coin_id)
+            self.subscribers.setdefault(coin_id, set()).add(websocket)
+
+        if accepted:
+            print(f"[PRICE-FEED] +{len(accepted)} coins | {len(self.subscribers)} coins watched by {len(self.client_coins)} clients")
+            self._ensure_poller()
+
+        return {
+            'type': 'subscribed',
+            'coins': sorted(watched),
+            'rejected': rejected,
+            'max_coins': self.max_coins_per_client,
+            # Known prices right away so the client doesn't wait a full poll
+            'snapshot': {c: self.last_prices[c] for c in accepted if c in self.last_prices}
+        }
+
+    def unsubscribe(self, websocket, coins: Iterable[str] = None) -> Dict[str, Any]:
+        """Remove some coins, or every subscription of this client when coins is empty"""
+        watched = self.client_coins.get(websocket, set())
+        targets = self._normalize(coins) if coins else list(watched)
+
+        for coin_id in targets:
+            watched.discard(coin_id)
+            coin_subscribers = self.subscribers.get(coin_id)
+            if coin_subscribers is not None:
+                coin_subscribers.discard(websocket)
+                if not coin_subscribers:
+                    del self.subscribers[coin_id]
+                    self.last_prices.pop(coin_id, None)
+
+        if not watched:
+            self.client_coins.pop(websocket, None)
+
+        return {'type': 'unsubscribed', 'coins': sorted(watched)}
+
+    def _ensure_poller(self):
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll_loop())
+
+    async def _poll_loop(self):
+        """Runs only while at least one coin is watched"""
+        print(f"[PRICE-FEED] Poller started (every {self.poll_interval}s)")
+        while self.subscribers:
+            started = time.monotonic()
+            try:
+                await self.poll_once()
+            except Exception as e:
+                print(f"[PRICE-FEED] Poll error: {e}")
+            await asyncio.sleep(max(0.0, self.poll_interval - (time.monotonic() - started)))
+        print(f"[PRICE-FEED] Poller stopped (no subscriptions)")
+
+    async def poll_once(self):
+        coin_ids = sorted(self.subscribers)
+        batches = [coin_ids[i:i + BATCH_SIZE] for i in range(0, len(coin_ids), BATCH_SIZE)]
+        results = await asyncio.gather(*(self.api_integrations.get_coingecko_prices(b) for b in batches))
+        self.polls += 1
+
+        for result in results:
+            if not result.get('success'):
+                print(f"[PRICE-FEED] Batch failed: {result.get('error')}")
+                continue
+            for coin_id, quote in result['prices'].items():
+                previous = self.last_prices.get(coin_id)
+                if previous and previous.get('price') == quote.get('price'):
+                    continue
+                self.last_prices[coin_id] = quote
+                self._fan_out(coin_id, quote)
+
+    def _fan_out(self, coin_id: str, quote: Dict[str, Any]):
+        """Queue the update for every subscriber; a stalled client only ever holds the latest tick"""
+        subscribers = self.subscribers.get(coin_id)
+        if not subscribers:
+            return
+
+        message = {'type': 'price_update', 'coin_id': coin_id, **quote}
+        self.updates_sent += self.broadcaster.broadcast(message, subscribers, coalesce_key=f'price:{coin_id}')
+
+    def export_prices(self):
+        """last_prices as a numeric table for WarmCacheSnapshot.register_table"""
+        coin_ids = sorted(self.last_prices)
+        matrix = [[float('nan') if self.last_prices[c].get(f) is None else self.last_prices[c][f] for f in QUOTE_FIELDS]
+                  for c in coin_ids]
+        return coin_ids, QUOTE_FIELDS, matrix
+
+    def restore_prices(self, coin_ids: List[str], columns: List[str], matrix):
+        """Seed subscribe snapshots after a restart; quotes older than a few polls are skipped"""
+        max_age = self.poll_interval * 20
+        now = time.time()
+        for coin_id, row in zip(coin_ids, matrix):
+            quote = {f: (None if row[i] != row[i] else float(row[i])) for i, f in enumerate(columns)}
+            if quote.get('last_updated_at') and now - quote['last_updated_at'] <= max_age:
+                quote['last_updated_at'] = int(quote['last_updated_at'])
+                self.last_prices.setdefault(coin_id, quote)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'coins_watched': len(self.subscribers),
+            'subscribed_clients': len(self.client_coins),
+            'polls': self.polls,
+            'updates_sent': self.updates_sent
+        }
@@ -0,0 +1,216 @@
+"""
+Prompt Registry
+Static prompt prefixes are built once at import and always sent first, with
+per-request data appended at the tail (user message), so provider-side
+prefix caching can reuse them. Token counts are computed locally.
+"""
+from typing import Dict, Any, List
+
+try:
+    import tiktoken
+except ImportError:  # Optional: exact counts; otherwise ~4 chars/token estimate
+    tiktoken = None
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Local token count (o200k_base, the gpt-4o/4.1 family encoding, when tiktoken is installed)"""
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding('o200k_base')
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+class PromptRegistry:
+    def __init__(self):
+        self._prefixes: Dict[str, Dict[str, Any]] = {}
+
+    def register(self, name: str, text: str):
+        self._prefixes[name] = {'text': text, 'tokens': count_tokens(text)}
+
+    def prefix(self, name: str) -> str:
+        return self._prefixes[name]['text']
+
+    def messages(self, name: str, dynamic: str) -> List[Dict[str, str]]:
+        """Static system prefix first, request-specific content last"""
+        return [
+            {"role": "system", "content": self._prefixes[name]['text']},
+            {"role": "user", "content": dynamic}
+        ]
+
+    def estimate(self, name: str, dynamic: str) -> int:
+        """Prompt tokens for a call: cached prefix count + tail count (+ chat framing overhead)"""
+        return self._prefixes[name]['tokens'] + count_tokens(dynamic) + 8
+
+    def get_stats(self) -> Dict[str, int]:
+        return {name: p['tokens'] for name, p in self._prefixes.items()}
+
+
+ROUTING_SYSTEM_PROMPT = """You are an AI routing expert. Route queries to the most appropriate API.
+
+Available APIs:
+1. CoinGecko - ONLY for specific price/market cap/volume queries: "price", "giá", "market cap"
+2. Perplexity AI - For explanations, definitions, deep analysis, research, "what is", "explain", "why", "how", "should I"
+3. OpenAI - For summarizing, combining info from multiple sources
+4. fal.ai - For image generation
+5. rss_news - For latest news: "news", "tin tức"
+
+ROUTING RULES (in priority order):
+1. X/Twitter URLs ("x.com", "twitter.com"): → twitter_analysis
+2. Price queries ("price", "check", "value", single coin ticker like "btc", "eth"): → coingecko
+3. News requests ("news", "updates", "latest"): → rss_news
+4. Questions/definitions ("what is", "explain", "how"): → perplexity
+5. Image generation ("create image", "generate"): → falai
+6. Vague/unclear queries: → ask_user
+
+IMPORTANT: 
+- "check [coin]" → coingecko (e.g., "check btc", "check eth")
+- Single tickers → coingecko (e.g., "btc", "eth", "sol")
+- Coin + "news" → rss_news (e.g., "btc news")
+
+RESPONSE LANGUAGE:
+- ALWAYS respond in English (never Vietnamese)
+
+Return ONLY JSON:
+{
+    "selected_api": "coingecko|perplexity|falai|rss_news|twitter_analysis|ask_user",
+    "reason": "Why this API",
+    "confidence": 0.0-1.0,
+    "clarification": "For ask_user only, IN ENGLISH"
+}
+
+Examples:
+- "https://x.com/user/status/123" → {"selected_api": "twitter_analysis", "reason": "X/Twitter URL", "confidence": 0.95}
+- "bitcoin price" → {"selected_api": "coingecko", "reason": "Price query", "confidence": 0.95}
+- "check btc" → {"selected_api": "coingecko", "reason": "Check price", "confidence": 0.95}
+- "btc" → {"selected_api": "coingecko", "reason": "Quick price check", "confidence": 0.9}
+- "eth market cap" → {"selected_api": "coingecko", "reason": "Market data query", "confidence": 0.9}
+- "what is ethereum" → {"selected_api": "perplexity", "reason": "Definition needed", "confidence": 0.9}
+- "btc news" → {"selected_api": "rss_news", "reason": "Latest news", "confidence": 0.9}
+- "create image bitcoin" → {"selected_api": "falai", "reason": "Image generation", "confidence": 0.9}"""
+
+BATCH_INSTRUCTIONS = """
+BATCH MODE: You will receive a JSON array of queries, each with an "index".
+Route EACH query independently using the rules above and return ONLY:
+{"routes": [{"index": 0, "selected_api": "...", "reason": "...", "confidence": 0.0-1.0, "clarification": ""}, ...]}
+with exactly one entry per input index."""
+
+COMBINED_BATCH_INSTRUCTIONS = """
+BATCH MODE: You will receive a JSON array of queries, each with an "index".
+Route EACH query independently and extract its entities as in COMBINED MODE, returning ONLY:
+{"routes": [{"index": 0, "selected_api": "...", "reason": "...", "confidence": 0.0-1.0, "clarification": "",
+             "entities": {"coin_ids": [], "timeframe": null, "image_description": null}}, ...]}
+with exactly one entry per input index."""
+
+COIN_EXTRACTION_PROMPT = """You are a cryptocurrency expert. Extract the coin name from user queries and map it to the correct CoinGecko coin ID.
+
+Return ONLY a JSON response with this exact format:
+{
+    "coin_id": "coingecko-coin-id",
+    "coin_name": "Full coin name",
+    "confidence": 0.0-1.0
+}
+
+Common mappings:
+- "btc" = "bitcoin"
+- "eth" = "ethereum" 
+- "sol" = "solana"
+- "sui" = "sui"
+- "ada" = "cardano"
+- "dot" = "polkadot"
+- "link" = "chainlink"
+- "arb" = "arbitrum"
+- "op" = "optimism"
+- "matic" = "matic-network"
+- "avax" = "avalanche-2"
+
+Use standard CoinGecko coin IDs. If unsure, return confidence < 0.7."""
+
+COMBINED_INSTRUCTIONS = """
+COMBINED MODE: Route the query AND extract its entities in the same answer.
+- coin_ids: CoinGecko coin IDs mentioned (map tickers: btc=bitcoin, eth=ethereum, sol=solana, ada=cardano, dot=polkadot, link=chainlink, arb=arbitrum, op=optimism, matic=matic-network, avax=avalanche-2), [] if none
+- timeframe: "24h", "7d", "30d", "1y" etc. if the user asks about a period, else null
+- image_description: for falai only, the user's description of the image without the command words, else null
+
+Return ONLY JSON:
+{
+    "selected_api": "coingecko|perplexity|falai|rss_news|twitter_analysis|ask_user",
+    "reason": "Why this API",
+    "confidence": 0.0-1.0,
+    "clarification": "For ask_user only, IN ENGLISH",
+    "entities": {"coin_ids": ["bitcoin"], "timeframe": null, "image_description": null}
+}"""
+
+PLANNER_PROMPT = """You are a crypto research task planner. Break down the user's query into a small task graph (2-4 nodes).
+
+Node types:
+- price: CoinGecko price, market cap, volume for ONE coin (set "coin" to its CoinGecko id)
+- news: Latest crypto news, optionally for ONE coin (set "coin" when specific)
+- research: Explanations, definitions, exchange/buying guides
+- analysis: Reasoning over other nodes' results (list them in "depends_on")
+
+Rules:
+1. For investment questions ("co nen mua", "should I buy"): price + news, then an analysis depending on both
+2. For location questions ("mua o dau", "where to buy"): price + research on exchanges
+3. For comparison ("btc vs eth"): one price node per coin, then an analysis depending on all of them
+4. For analysis ("why", "how"): supporting data nodes, then an analysis depending on them
+5. Never create two nodes that fetch the same thing; reuse a node via "depends_on" instead
+
+Output a JSON object:
+{"nodes": [
+  {"id": "p1", "type": "price", "query": "bitcoin price", "coin": "bitcoin"},
+  {"id": "n1", "type": "news", "query": "bitcoin news", "coin": "bitcoin"},
+  {"id": "a1", "type": "analysis", "query": "should I buy bitcoin now", "depends_on": ["p1", "n1"]}
+]}
+
+Return ONLY the JSON object, no explanation."""
+
+SYNTHESIS_PROMPT = "You are a neutral crypto analyst. Provide concise, factual analysis in 2-3 sentences. Match the language of the content."
+
+PROMPTS = PromptRegistry()
+PROMPTS.register('routing', ROUTING_SYSTEM_PROMPT)
+PROMPTS.register('routing_batch', ROUTING_SYSTEM_PROMPT + BATCH_INSTRUCTIONS)
+PROMPTS.register('route_extract', ROUTING_SYSTEM_PROMPT + COMBINED_INSTRUCTIONS)
+PROMPTS.register('route_extract_batch', ROUTING_SYSTEM_PROMPT + COMBINED_INSTRUCTIONS + COMBINED_BATCH_INSTRUCTIONS)
+PROMPTS.register('coin_extraction', COIN_EXTRACTION_PROMPT)
+PROMPTS.register('planning', PLANNER_PROMPT)
+PROMPTS.register('synthesis', SYNTHESIS_PROMPT)
+
+
+class TokenUsage:
+    """Per-stage prompt/completion token and latency accounting from provider responses"""
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    def record(self, stage: str, response_data: Dict[str, Any], latency: float, estimated_prompt_tokens: int = 0):
+        usage = (response_data or {}).get('usage') or {}
+        details = usage.get('prompt_tokens_details') or {}
+        entry = self.stages.setdefault(stage, {
+            'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+            'cached_tokens': 0, 'estimated_prompt_tokens': 0, 'latency_total': 0.0
+        })
+        entry['calls'] += 1
+        entry['prompt_tokens'] += usage.get('prompt_tokens', 0)
+        entry['completion_tokens'] += usage.get('completion_tokens', 0)
+        entry['cached_tokens'] += details.get('cached_tokens', 0) or 0
+        entry['estimated_prompt_tokens'] += estimated_prompt_tokens
+        entry['latency_total'] += latency
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {}
+        for stage, entry in self.stages.items():
+            calls = entry['calls'] or 1
+            stats[stage] = {
+                'calls': entry['calls'],
+                'prompt_tokens': entry['prompt_tokens'],
+                'completion_tokens': entry['completion_tokens'],
+                'cached_tokens': entry['cached_tokens'],
+                'cache_ratio': round(entry['cached_tokens'] / entry['prompt_tokens'], 3) if entry['prompt_tokens'] else 0.0,
+                'estimated_prompt_tokens': entry['estimated_prompt_tokens'],
+                'avg_latency_ms': round(entry['latency_total'] / calls * 1000, 1)
+            }
+        return stats
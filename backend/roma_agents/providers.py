@@ -0,0 +1,155 @@
+"""
+Lazy Provider Loading
+Heavy SDKs (google.generativeai ~1s, fal_client, feedparser, dateutil) are
+imported on first use - or up front by preflight() - exactly once, with the
+import time recorded. Provider clients (Gemini models, fal AsyncClient) are
+initialized once and reused instead of being configured on every request.
+
+Startup profiling:
+    python -X importtime backend/websocket_server.py --preflight-only 2> import.log
+    python -m roma_agents.providers import.log
+"""
+import asyncio
+import importlib
+import os
+import sys
+import time
+from typing import Dict, Any, List
+
+# Providers warmed by preflight (module paths)
+PROVIDER_MODULES = ['feedparser', 'dateutil.parser', 'google.generativeai', 'fal_client']
+
+# Upstream hosts resolved during preflight so the first request skips DNS
+UPSTREAM_HOSTS = ['api.openai.com', 'api.coingecko.com', 'generativelanguage.googleapis.com', 'queue.fal.run']
+
+_modules: Dict[str, Any] = {}
+_import_ms: Dict[str, float] = {}
+_gemini_models: Dict[str, Any] = {}
+_fal_clients: Dict[str, Any] = {}
+_env_loaded = False
+
+
+def load_env():
+    """load_dotenv once per process, whichever entry point gets here first"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+
+def load(module_name: str):
+    """Import a provider module once and remember how long it took"""
+    module = _modules.get(module_name)
+    if module is None:
+        started = time.perf_counter()
+        module = importlib.import_module(module_name)
+        _import_ms[module_name] = (time.perf_counter() - started) * 1000
+        _modules[module_name] = module
+        print(f"[PROVIDERS] Loaded {module_name} in {_import_ms[module_name]:.0f}ms")
+    return module
+
+
+def gemini_model(model_name: str, api_key: str):
+    """Configured GenerativeModel, created once per model name"""
+    model = _gemini_models.get(model_name)
+    if model is None:
+        genai = load('google.generativeai')
+        if not _gemini_models:
+            genai.configure(api_key=api_key)
+        model = _gemini_models[model_name] = genai.GenerativeModel(model_name)
+    return model
+
+
+def fal_async_client(api_key: str):
+    client = _fal_clients.get(api_key)
+    if client is None:
+        client = _fal_clients[api_key] = load('fal_client').AsyncClient(key=api_key)
+    return client
+
+
+async def preflight(warm_cache=None, knowledge=None, gemini_api_key: str = None, timeout: float = 5.0) -> Dict[str, float]:
+    """
+    Warm everything a first request would otherwise pay for: provider imports
+    (in a thread, they're CPU-bound), warm-cache restore, knowledge index and
+    upstream DNS. Returns per-step timings in ms; failures are logged, not fatal.
+    """
+    timings = {}
+
+    started = time.perf_counter()
+    for module_name in PROVIDER_MODULES:
+        try:
+            await asyncio.to_thread(load, module_name)
+        except ImportError as e:
+            print(f"[PREFLIGHT] {module_name} unavailable: {e}")
+    if gemini_api_key and 'google.generativeai' in _modules:
+        gemini_model('gemini-1.5-flash', gemini_api_key)
+    timings['providers'] = (time.perf_counter() - started) * 1000
+
+    if warm_cache is not None:
+        started = time.perf_counter()
+        await warm_cache.warm_up()
+        timings['warm_cache'] = (time.perf_counter() - started) * 1000
+
+    if knowledge is not None:
+        started = time.perf_counter()
+        knowledge.search('bitcoin')  # touches the mapped index pages
+        timings['knowledge'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(
+        *(asyncio.wait_for(loop.getaddrinfo(host, 443), timeout) for host in UPSTREAM_HOSTS),
+        return_exceptions=True
+    )
+    failed = [h for h, r in zip(UPSTREAM_HOSTS, results) if isinstance(r, BaseException)]
+    if failed:
+        print(f"[PREFLIGHT] DNS failed for: {', '.join(failed)}")
+    timings['dns'] = (time.perf_counter() - started) * 1000
+
+    print("[PREFLIGHT] " + " | ".join(f"{k}: {v:.0f}ms" for k, v in timings.items()))
+    return timings
+
+
+def get_stats() -> Dict[str, Any]:
+    return {
+        'loaded': sorted(_modules),
+        'import_ms': {k: round(v, 1) for k, v in _import_ms.items()},
+        'gemini_models': sorted(_gemini_models)
+    }
+
+
+def importtime_report(log_path: str, top: int = 25) -> List[str]:
+    """Summarize `python -X importtime` stderr: slowest modules and top-level packages by cumulative time"""
+    rows = []
+    with open(log_path, encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            try:
+                _, self_us, cumulative_us, name = (part.strip() for part in line.replace('import time:', '|', 1).split('|'))
+                rows.append((name.strip(), int(self_us), int(cumulative_us)))
+            except ValueError:
+                continue
+
+    packages: Dict[str, int] = {}
+    for name, self_us, _ in rows:
+        root = name.split('.')[0]
+        packages[root] = packages.get(root, 0) + self_us
+
+    total_ms = sum(packages.values()) / 1000
+    lines = [f"Total import time: {total_ms:.0f}ms across {len(rows)} modules", "", "Top packages (self time summed):"]
+    for root, us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        lines.append(f"  {us / 1000:8.1f}ms  {root}")
+    lines += ["", "Slowest imports (cumulative):"]
+    for name, _, cumulative_us in sorted(rows, key=lambda r: -r[2])[:top]:
+        lines.append(f"  {cumulative_us / 1000:8.1f}ms  {name}")
+    return lines
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or not os.path.exists(sys.argv[1]):
+        print("Usage: python -X importtime backend/websocket_server.py --preflight-only 2> import.log")
+        print("       python -m roma_agents.providers import.log")
+        sys.exit(1)
+    print('\n'.join(importtime_report(sys.argv[1])))
@@ -0,0 +1,65 @@
+"""
+Single-Flight Request Coalescing
+Identical concurrent research requests (same normalized query + context) share
+one in-flight solve instead of each running its own router/planner/synthesis
+tree. Successful results stay reusable for a short window after completion,
+so a thundering herd on breaking news costs one unit of upstream work.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Awaitable, Tuple
+
+
+class SingleFlight:
+    def __init__(self, reuse_window: float = None, capacity: int = 500):
+        self.reuse_window = reuse_window if reuse_window is not None else float(os.getenv('SINGLE_FLIGHT_REUSE_S', 10))
+        self.capacity = capacity
+        self.in_flight: Dict[str, asyncio.Task] = {}
+        self.recent: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self.counts = {'leader': 0, 'joined': 0, 'reused': 0}
+
+    def _recent_result(self, key: str):
+        entry = self.recent.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.reuse_window:
+            del self.recent[key]
+            return None
+        return entry[1]
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Dict[str, Any]]]) -> Tuple[Dict[str, Any], str]:
+        """
+        Returns (result, role) where role is 'leader', 'joined' or 'reused'.
+        The solve runs in its own task, so a leader disconnecting doesn't fail its followers.
+        """
+        result = self._recent_result(key)
+        if result is not None:
+            self.counts['reused'] += 1
+            return result, 'reused'
+
+        task = self.in_flight.get(key)
+        role = 'joined'
+        if task is None:
+            role = 'leader'
+            task = asyncio.create_task(factory())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        self.counts[role] += 1
+        return await asyncio.shield(task), role
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        result = task.result()
+        if self.reuse_window > 0 and isinstance(result, dict) and result.get('success'):
+            self.recent[key] = (time.monotonic(), result)
+            self.recent.move_to_end(key)
+            while len(self.recent) > self.capacity:
+                self.recent.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'in_flight': len(self.in_flight), 'reuse_window': self.reuse_window, **self.counts}
@@ -0,0 +1,116 @@
+"""
+Template Synthesizer
+Most complex answers are a fixed plan shape - price + news, price + guide -
+whose final 2-3 sentences can be written straight from the structured
+subtask results. TemplateSynthesizer does that with no LLM call for the
+shapes listed in SYNTH_TEMPLATES; open-ended questions (should I, why,
+predict...) and unknown shapes return None so _aggregate falls back to the
+LLM synthesis.
+"""
+import os
+import re
+from typing import Dict, Any, List, Optional
+
+DEFAULT_SHAPES = 'price,news,price+news,price+research,news+research,price+news+research'
+
+_OPEN_ENDED_RE = re.compile(
+    r'\b(should|why|predict|prediction|forecast|opinion|recommend|worth|invest|buy|sell|hold|outlook|risk)\b'
+    r'|có nên|tại sao|nên mua|nên bán|dự đoán',
+    re.IGNORECASE
+)
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+
+def result_kind(result: Dict[str, Any]) -> str:
+    data = result.get('data') or {}
+    if 'subtask_count' in result:
+        return 'aggregate'  # nested plan: free text, left to the LLM
+    if 'comparison' in data:
+        return 'comparison'
+    if 'price' in data:
+        return 'price'
+    if 'articles' in data:
+        return 'news'
+    return 'research'
+
+
+def plan_shape(results: List[Dict[str, Any]]) -> str:
+    return '+'.join(sorted({result_kind(r) for r in results if r.get('success')}))
+
+
+def _price_sentence(data: Dict[str, Any]) -> str:
+    name = data.get('name') or data.get('symbol') or 'The coin'
+    price = data.get('price') or 0
+    if price <= 0:
+        return f"No current price is available for {name}."
+    price_str = f"${price:,.2f}" if price >= 1 else f"${price:.6g}"
+    change = data.get('change_24h')
+    if change is None:
+        return f"{name} is trading at {price_str}."
+    direction = 'up' if change >= 0 else 'down'
+    return f"{name} is trading at {price_str}, {direction} {abs(change):.2f}% in the last 24h."
+
+
+def _news_sentence(data: Dict[str, Any]) -> str:
+    articles = data.get('articles') or []
+    subject = data['coin'].upper() if data.get('coin') else 'crypto'
+    if not articles:
+        return f"There are no {subject} headlines from major sources in the last 7 days."
+    top = articles[0]['title'].replace('\n', ' ').strip()
+    count = len(articles)
+    sentence = f"{count} recent {subject} headline{'s' if count != 1 else ''}; the latest: \"{top}\"."
+    tone = data.get('sentiment')
+    if tone:
+        counts = tone['counts']
+        sentence += f" Overall tone is {tone['label']} ({counts['bullish']} bullish, {counts['bearish']} bearish)."
+    return sentence
+
+
+def _research_sentences(data: Dict[str, Any], limit: int = 2) -> str:
+    content = ' '.join((data.get('content') or '').split())
+    return ' '.join(_SENTENCE_RE.split(content)[:limit]) if content else ''
+
+
+class TemplateSynthesizer:
+    def __init__(self, shapes: str = None):
+        configured = shapes if shapes is not None else os.getenv('SYNTH_TEMPLATES', DEFAULT_SHAPES)
+        # Shapes are order-insensitive: 'price+news' == 'news+price'
+        self.shapes = {'+'.join(sorted(p.strip() for p in s.split('+'))) for s in configured.split(',') if s.strip()}
+        self.counts: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, shape: str, outcome: str):
+        entry = self.counts.setdefault(shape or 'empty', {'template': 0, 'llm': 0})
+        entry[outcome] += 1
+
+    def synthesize(self, query: str, results: List[Dict[str, Any]]) -> Optional[str]:
+        """Summary built from structured results, or None when the LLM should synthesize"""
+        shape = plan_shape(results)
+        if not shape or shape not in self.shapes or _OPEN_ENDED_RE.search(query):
+            self._count(shape, 'llm')
+            return None
+
+        sentences = []
+        for result in results:
+            if not result.get('success'):
+                continue
+            data = result.get('data') or {}
+            kind = result_kind(result)
+            if kind == 'price':
+                sentences.append(_price_sentence(data))
+            elif kind == 'news':
+                sentences.append(_news_sentence(data))
+            else:
+                sentences.append(_research_sentences(data))
+        failed = sum(1 for r in results if not r.get('success'))
+        if failed:
+            sentences.append(f"({failed} source{'s' if failed != 1 else ''} unavailable right now.)")
+
+        summary = ' '.join(s for s in sentences if s)
+        if not summary:
+            self._count(shape, 'llm')
+            return None
+        self._count(shape, 'template')
+        return summary
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'shapes': sorted(self.shapes), 'by_shape': self.counts}
@@ -0,0 +1,187 @@
+"""
+Task DAG
+Planner output as a DAG of typed nodes with explicit dependencies:
+
+  {"nodes": [
+    {"id": "p1", "type": "price", "query": "bitcoin price", "coin": "bitcoin"},
+    {"id": "p2", "type": "price", "query": "ethereum price", "coin": "ethereum"},
+    {"id": "a1", "type": "analysis", "query": "compare bitcoin and ethereum", "depends_on": ["p1", "p2"]}
+  ]}
+
+build_dag() canonicalizes nodes (identical type + target + inputs merge into
+one), drops unknown/cyclic edges, and run() starts every node as soon as its
+dependencies finish. RequestMemo is shared by the whole solve tree of one
+request, so a node or upstream call that appears twice runs once; its
+checkpoint() seeds the memo of a retry so only failed work runs again.
+A legacy flat list of {"query", "type"} subtasks is accepted as a DAG with no edges.
+"""
+import asyncio
+from typing import Dict, Any, List, Callable, Awaitable, Hashable
+
+from roma_agents.warm_cache import normalize_key
+
+NODE_TYPES = ('price', 'news', 'research', 'analysis')
+
+# Legacy/LLM type names -> node types
+TYPE_ALIASES = {'market': 'price', 'data': 'price', 'rss': 'news', 'definition': 'research', 'explain': 'research'}
+
+
+class RequestMemo:
+    """
+    Per-request single-flight memo: concurrent and repeated calls with the same key share one result.
+    A memo seeded from a checkpoint replays earlier successful results, so a retry re-runs only what failed.
+    """
+
+    def __init__(self, seed: Dict[Hashable, Any] = None):
+        self.futures: Dict[Hashable, asyncio.Future] = {}
+        self.seed = dict(seed or {})
+        self.hits = 0
+        self.misses = 0
+        self.replayed = 0
+
+    async def get(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        if key in self.seed:
+            self.replayed += 1
+            return self.seed[key]
+        future = self.futures.get(key)
+        if future is not None:
+            self.hits += 1
+            return await asyncio.shield(future)
+        self.misses += 1
+        future = self.futures[key] = asyncio.ensure_future(factory())
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            # Don't memoize failures: a later identical call may succeed
+            if self.futures.get(key) is future:
+                del self.futures[key]
+            raise
+
+    @staticmethod
+    def _succeeded(value: Any) -> bool:
+        # An aggregate with failed subtasks isn't final: a retry re-aggregates it
+        return not isinstance(value, dict) or (bool(value.get('success')) and not value.get('failed_subtasks'))
+
+    def checkpoint(self) -> Dict[Hashable, Any]:
+        """Successful results (replayed + new), for seeding a retry"""
+        results = dict(self.seed)
+        for key, future in self.futures.items():
+            if future.done() and not future.cancelled() and future.exception() is None and self._succeeded(future.result()):
+                results[key] = future.result()
+        return results
+
+    def failed_nodes(self) -> int:
+        """Planned nodes that finished without a usable result"""
+        return sum(
+            1 for key, future in self.futures.items()
+            if key[0] == 'node' and future.done() and not future.cancelled()
+            and future.exception() is None and not self._succeeded(future.result())
+        )
+
+
+class DAGNode:
+    def __init__(self, node_id: str, node_type: str, query: str, coin: str = '', deps: List[str] = None):
+        self.id = node_id
+        self.type = node_type
+        self.query = query
+        self.coin = coin
+        self.deps = deps or []
+        self.key = ''
+
+    def to_task(self) -> Dict[str, Any]:
+        task = {'query': self.query, 'type': self.type, 'node_id': self.id}
+        if self.coin:
+            task['coin'] = self.coin
+        return task
+
+
+class TaskDAG:
+    def __init__(self, nodes: List[DAGNode], merged: int = 0):
+        self.nodes = nodes  # topological order
+        self.merged = merged
+
+    def __len__(self):
+        return len(self.nodes)
+
+    async def run(self, execute: Callable[[DAGNode, List[Dict[str, Any]]], Awaitable[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Run every node as soon as its dependencies are done; results in node order"""
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_node(node: DAGNode) -> Dict[str, Any]:
+            dep_results = list(await asyncio.gather(*(tasks[d] for d in node.deps))) if node.deps else []
+            return await execute(node, dep_results)
+
+        for node in self.nodes:  # topological order: deps are created first
+            tasks[node.id] = asyncio.ensure_future(run_node(node))
+        return list(await asyncio.gather(*tasks.values()))
+
+    def describe(self) -> List[str]:
+        return [f"{n.id} [{n.type}] {n.query}" + (f" <- {', '.join(n.deps)}" if n.deps else '') for n in self.nodes]
+
+
+def _node_type(raw_type: str, query: str) -> str:
+    node_type = TYPE_ALIASES.get((raw_type or '').lower(), (raw_type or '').lower())
+    if node_type in NODE_TYPES:
+        return node_type
+    q = query.lower()
+    if 'price' in q:
+        return 'price'
+    if 'news' in q:
+        return 'news'
+    return 'analysis'
+
+
+def build_dag(plan: Any) -> TaskDAG:
+    """Parse planner output (DAG object or legacy list) into a canonical, acyclic TaskDAG"""
+    raw_nodes = plan.get('nodes', []) if isinstance(plan, dict) else plan
+    nodes: Dict[str, DAGNode] = {}
+    for i, raw in enumerate(raw_nodes or [], 1):
+        if not isinstance(raw, dict) or not str(raw.get('query', '')).strip():
+            continue
+        node_id = str(raw.get('id') or f'n{i}')
+        if node_id in nodes:
+            node_id = f'{node_id}_{i}'
+        query = str(raw['query']).strip()
+        deps = raw.get('depends_on') or raw.get('deps') or []
+        nodes[node_id] = DAGNode(
+            node_id, _node_type(raw.get('type', ''), query), query,
+            str(raw.get('coin') or '').strip().lower(),
+            [str(d) for d in deps if isinstance(d, (str, int))]
+        )
+
+    # Topological sort (Kahn); unknown deps are dropped, nodes stuck in a cycle lose their edges
+    for node in nodes.values():
+        node.deps = [d for d in dict.fromkeys(node.deps) if d in nodes and d != node.id]
+    ordered, placed = [], set()
+    while len(ordered) < len(nodes):
+        ready = [n for n in nodes.values() if n.id not in placed and all(d in placed for d in n.deps)]
+        if not ready:
+            stuck = next(n for n in nodes.values() if n.id not in placed)
+            print(f"[ROMA-DAG] Cycle at {stuck.id}, dropping its dependencies")
+            stuck.deps = [d for d in stuck.deps if d in placed]
+            continue
+        for node in ready:
+            ordered.append(node)
+            placed.add(node.id)
+
+    # Canonicalize: same type + target + (canonical) inputs -> one node
+    canonical: Dict[str, DAGNode] = {}
+    alias: Dict[str, str] = {}  # original id -> surviving id
+    result = []
+    for node in ordered:
+        node.deps = sorted(dict.fromkeys(alias[d] for d in node.deps))
+        target = node.coin if node.type in ('price', 'news') and node.coin else normalize_key(node.query)
+        dep_keys = sorted(next(n.key for n in result if n.id == d) for d in node.deps)
+        node.key = f"{node.type}:{target}|{','.join(dep_keys)}"
+        existing = canonical.get(node.key)
+        if existing is not None:
+            alias[node.id] = existing.id
+            continue
+        canonical[node.key] = node
+        alias[node.id] = node.id
+        result.append(node)
+
+    merged = len(ordered) - len(result)
+    if merged:
+        print(f"[ROMA-DAG] Merged {merged} duplicate node(s)")
+    return TaskDAG(result, merged)
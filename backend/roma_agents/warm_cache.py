@@ -0,0 +1,223 @@
+"""
+Warm Cache Snapshots
+TTLCache is the shared in-memory LRU+TTL cache (prices, news feeds, coin index,
+plans, answers). WarmCacheSnapshot periodically writes every registered cache to
+WARM_CACHE_DIR and restores them after a restart, so a deploy doesn't start cold:
+
+  manifest.json     version stamp, created_at, section list (written last)
+  <name>.json       TTL cache entries with their original stored_at
+  <name>.npy        numeric tables (live price feed), memory-mapped on load
+
+Restores are lazy: a cache reloads on first access, and a background task warms
+whatever hasn't been touched yet. Snapshots with a different version or older
+than WARM_CACHE_MAX_AGE are ignored; entries past their own TTL are dropped.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Callable, Optional, List, Tuple
+
+import numpy as np
+
+# Bump when a cached value's shape changes so old snapshots are discarded
+SNAPSHOT_VERSION = 2
+
+DEFAULT_DIR = Path(__file__).parent.parent / '.cache' / 'warm'
+
+
+def normalize_key(text: str) -> str:
+    return ' '.join(text.lower().split())
+
+
+class TTLCache:
+    def __init__(self, name: str, ttl: float, capacity: int = 1000):
+        self.name = name
+        self.ttl = ttl
+        self.capacity = capacity
+        self.entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.restored = 0
+        self._restore: Optional[Callable[['TTLCache'], None]] = None  # set by WarmCacheSnapshot
+
+    def _ensure_restored(self):
+        if self._restore is not None:
+            restore, self._restore = self._restore, None
+            restore(self)
+
+    def get(self, key: str) -> Any:
+        self._ensure_restored()
+        entry = self.entries.get(key)
+        if entry is None or time.time() - entry[0] > self.ttl:
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, value: Any):
+        self._ensure_restored()
+        self.entries[key] = (time.time(), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def export(self) -> List[Tuple[str, float, Any]]:
+        now = time.time()
+        return [(k, t, v) for k, (t, v) in self.entries.items() if now - t <= self.ttl]
+
+    def load(self, items: List[List[Any]]):
+        """Merge snapshot entries oldest-first; live entries written since startup win"""
+        now = time.time()
+        for key, stored_at, value in sorted(items, key=lambda item: item[1]):
+            if key not in self.entries and now - stored_at <= self.ttl:
+                self.entries[key] = (stored_at, value)
+                self.entries.move_to_end(key, last=False)
+                self.restored += 1
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses, 'restored': self.restored}
+
+
+class WarmCacheSnapshot:
+    def __init__(self, directory: str = None, interval: float = None, max_age: float = None):
+        self.directory = Path(directory or os.getenv('WARM_CACHE_DIR', DEFAULT_DIR))
+        self.interval = interval or float(os.getenv('WARM_CACHE_INTERVAL', 60))
+        self.max_age = max_age or float(os.getenv('WARM_CACHE_MAX_AGE', 6 * 3600))
+        self.enabled = os.getenv('WARM_CACHE', '1').lower() not in ('0', 'false', 'no')
+
+        self.caches: Dict[str, TTLCache] = {}
+        self.tables: Dict[str, Tuple[Callable, Callable]] = {}  # name -> (export, restore)
+        self._manifest = self._read_manifest() if self.enabled else None
+        self._pending_tables = set()
+        self._task: Optional[asyncio.Task] = None
+        self.saves = 0
+        self.last_save_ms = 0.0
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        try:
+            manifest = json.loads((self.directory / 'manifest.json').read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"[WARM-CACHE] Unreadable manifest: {e}")
+            return None
+        age = time.time() - manifest.get('created_at', 0)
+        if manifest.get('version') != SNAPSHOT_VERSION:
+            print(f"[WARM-CACHE] Snapshot version {manifest.get('version')} != {SNAPSHOT_VERSION}, starting cold")
+            return None
+        if age > self.max_age:
+            print(f"[WARM-CACHE] Snapshot is {age / 60:.0f} min old, starting cold")
+            return None
+        print(f"[WARM-CACHE] Snapshot found ({age:.0f}s old, {len(manifest.get('sections', {}))} sections)")
+        return manifest
+
+    def register_cache(self, cache: TTLCache):
+        self.caches[cache.name] = cache
+        if self._manifest and cache.name in self._manifest['sections']:
+            cache._restore = self._restore_cache
+
+    def register_table(self, name: str, export: Callable[[], Tuple[List[str], List[str], np.ndarray]],
+                       restore: Callable[[List[str], List[str], np.ndarray], None]):
+        """Numeric section: export() -> (row keys, column names, float64 matrix)"""
+        self.tables[name] = (export, restore)
+        if self._manifest and name in self._manifest['sections']:
+            self._pending_tables.add(name)
+
+    def _restore_cache(self, cache: TTLCache):
+        section = self._manifest['sections'][cache.name]
+        try:
+            items = json.loads((self.directory / section['file']).read_text(encoding='utf-8'))
+            cache.load(items)
+            print(f"[WARM-CACHE] Restored {cache.restored} '{cache.name}' entries")
+        except (OSError, ValueError) as e:
+            print(f"[WARM-CACHE] Could not restore '{cache.name}': {e}")
+
+    def _restore_table(self, name: str):
+        self._pending_tables.discard(name)
+        section = self._manifest['sections'][name]
+        try:
+            matrix = np.load(self.directory / section['file'], mmap_mode='r')
+            self.tables[name][1](section['keys'], section['columns'], matrix)
+            print(f"[WARM-CACHE] Restored {len(section['keys'])} '{name}' rows")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[WARM-CACHE] Could not restore '{name}': {e}")
+
+    async def warm_up(self):
+        """Restore everything nobody has touched yet, one section per loop iteration"""
+        for name in list(self._pending_tables):
+            self._restore_table(name)
+            await asyncio.sleep(0)
+        for cache in self.caches.values():
+            cache._ensure_restored()
+            await asyncio.sleep(0)
+
+    def _write(self, path: Path, write: Callable[[Path], None]):
+        tmp = path.with_name(path.name + '.tmp')
+        write(tmp)
+        os.replace(tmp, path)
+
+    def save(self) -> bool:
+        """Write all sections, then the manifest, so a crash never leaves a half-new snapshot visible"""
+        if not self.enabled:
+            return False
+        started = time.perf_counter()
+        sections = {}
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            for name, cache in self.caches.items():
+                cache._ensure_restored()  # never overwrite an unrestored section with an empty one
+                items = cache.export()
+                self._write(self.directory / f'{name}.json',
+                            lambda p: p.write_text(json.dumps(items, ensure_ascii=False), encoding='utf-8'))
+                sections[name] = {'file': f'{name}.json', 'entries': len(items)}
+            for name in list(self._pending_tables):
+                self._restore_table(name)
+            for name, (export, _) in self.tables.items():
+                keys, columns, matrix = export()
+                with open(self.directory / f'{name}.npy.tmp', 'wb') as f:
+                    np.save(f, np.asarray(matrix, dtype=np.float64))
+                os.replace(self.directory / f'{name}.npy.tmp', self.directory / f'{name}.npy')
+                sections[name] = {'file': f'{name}.npy', 'keys': keys, 'columns': columns}
+            manifest = {'version': SNAPSHOT_VERSION, 'created_at': time.time(), 'sections': sections}
+            self._write(self.directory / 'manifest.json',
+                        lambda p: p.write_text(json.dumps(manifest), encoding='utf-8'))
+        except (OSError, TypeError, ValueError) as e:
+            print(f"[WARM-CACHE] Snapshot failed: {e}")
+            return False
+        self.saves += 1
+        self.last_save_ms = (time.perf_counter() - started) * 1000
+        return True
+
+    async def _run(self):
+        await self.warm_up()
+        while True:
+            await asyncio.sleep(self.interval)
+            self.save()
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        """Cancel the periodic task and write a final snapshot (called on shutdown)"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.save():
+            print(f"[WARM-CACHE] Final snapshot written to {self.directory}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'saves': self.saves,
+            'last_save_ms': round(self.last_save_ms, 1),
+            'caches': {name: cache.get_stats() for name, cache in self.caches.items()}
+        }
@@ -0,0 +1,87 @@
+"""
+WebSocket Wire Codec
+Frame encoding negotiated per connection via WebSocket subprotocols:
+- "roma.msgpack": binary MessagePack frames (compact, for mobile / high-frequency pushes)
+- "roma.json" or no subprotocol: JSON text frames (orjson when installed)
+"""
+import json
+import os
+from typing import Any, Dict, List, Union
+
+try:
+    import orjson
+except ImportError:  # Optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # Optional compact encoding
+    msgpack = None
+
+SUBPROTOCOL_JSON = 'roma.json'
+SUBPROTOCOL_MSGPACK = 'roma.msgpack'
+
+
+def supported_subprotocols() -> List[str]:
+    """Subprotocols the server can speak, in preference order"""
+    protocols = []
+    if msgpack is not None:
+        protocols.append(SUBPROTOCOL_MSGPACK)
+    protocols.append(SUBPROTOCOL_JSON)
+    return protocols
+
+
+def select_subprotocol(connection, client_subprotocols) -> Union[str, None]:
+    """First client-offered subprotocol we support; None (plain JSON) instead of rejecting the handshake"""
+    for protocol in client_subprotocols:
+        if protocol in supported_subprotocols():
+            return protocol
+    return None
+
+
+def encode(message: Dict[str, Any], subprotocol: str = None) -> Union[str, bytes]:
+    """Encode an outgoing message: bytes for msgpack (binary frame), str for JSON (text frame)"""
+    if subprotocol == SUBPROTOCOL_MSGPACK and msgpack is not None:
+        return msgpack.packb(message, use_bin_type=True)
+    if orjson is not None:
+        return orjson.dumps(message).decode('utf-8')
+    return json.dumps(message)
+
+
+def decode(frame: Union[str, bytes]) -> Dict[str, Any]:
+    """Decode an incoming frame; raises ValueError on malformed input"""
+    if isinstance(frame, bytes) and msgpack is not None:
+        try:
+            return msgpack.unpackb(frame, raw=False)
+        except Exception as e:
+            raise ValueError(f'Invalid msgpack frame: {e}')
+    if orjson is not None:
+        try:
+            return orjson.loads(frame)
+        except orjson.JSONDecodeError as e:
+            raise ValueError(str(e))
+    try:
+        return json.loads(frame)
+    except json.JSONDecodeError as e:
+        raise ValueError(str(e))
+
+
+def deflate_extensions() -> List[Any]:
+    """
+    permessage-deflate tuned for many idle connections: smaller windows and
+    memLevel trade a little ratio for much less per-connection memory.
+    Returns [] when compression is disabled with WS_DEFLATE=0.
+    """
+    if os.getenv('WS_DEFLATE', '1').lower() in ('0', 'false', 'no'):
+        return []
+
+    from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+
+    window_bits = int(os.getenv('WS_DEFLATE_WINDOW_BITS', 12))
+    return [
+        ServerPerMessageDeflateFactory(
+            server_max_window_bits=window_bits,
+            client_max_window_bits=window_bits,
+            compress_settings={'memLevel': int(os.getenv('WS_DEFLATE_MEM_LEVEL', 5))},
+        )
+    ]
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Modules import each other as `roma_agents.x`, relative to backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
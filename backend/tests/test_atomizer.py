@@ -0,0 +1,69 @@
+import json
+
+import numpy as np
+
+from roma_agents.atomizer import Atomizer, LocalAtomizer, _read_examples, featurize, train
+
+ATOMIC = ['btc price', 'eth price', 'sol price now', 'check bitcoin', 'giá btc', 'doge price', 'ada price today',
+          'bitcoin news', 'eth news', 'xrp price']
+COMPLEX = ['analyze bitcoin and compare it with ethereum', 'research solana ecosystem and its risks',
+           'compare btc eth sol performance and outlook', 'explain defi and analyze top protocols',
+           'deep analysis of ethereum roadmap and competitors', 'phân tích bitcoin và so sánh với eth',
+           'research cardano and compare it with polkadot', 'analyze the market and forecast next month',
+           'evaluate avalanche ecosystem and risks', 'compare layer 2 solutions in depth']
+
+
+def _write_examples(path):
+    lines = [{'query': q, 'atomic': True, 'route': 'coingecko'} for q in ATOMIC]
+    lines += [{'query': q, 'atomic': False, 'route': 'research'} for q in COMPLEX]
+    # Predicted rows from the runtime log carry no label and must be ignored
+    lines.append({'query': 'btc price', 'predicted_atomic': False, 'label_source': 'predicted'})
+    path.write_text('\n'.join(json.dumps(line, ensure_ascii=False) for line in lines), encoding='utf-8')
+
+
+def test_train_save_load_round_trip(tmp_path):
+    data, model_path = tmp_path / 'atomizer.jsonl', tmp_path / 'atomizer.npz'
+    _write_examples(data)
+    train(str(data), str(model_path), dim=2 ** 10, epochs=40, val_fraction=0.3)
+
+    model = LocalAtomizer.load(str(model_path))
+    assert model.atomic_model.classes == ['atomic', 'complex']
+    assert model.route_model.classes == ['coingecko', 'research']
+    assert model.atomic_model.W.shape[0] == 2 ** 10
+
+    copy_path = tmp_path / 'copy.npz'
+    model.save(str(copy_path))
+    reloaded = LocalAtomizer.load(str(copy_path))
+    rows = [featurize(q, 2 ** 10) for q in ATOMIC + COMPLEX]
+    np.testing.assert_allclose(model.atomic_model.predict_proba(rows), reloaded.atomic_model.predict_proba(rows))
+    assert reloaded.predict('bnb price')['atomic']
+    assert not reloaded.predict('analyze polygon and compare it with arbitrum')['atomic']
+    assert reloaded.predict('bnb price')['route'] == 'coingecko'
+
+
+def test_atomizer_uses_trained_model(tmp_path, monkeypatch):
+    data, model_path = tmp_path / 'atomizer.jsonl', tmp_path / 'atomizer.npz'
+    _write_examples(data)
+    train(str(data), str(model_path), dim=2 ** 10, epochs=40, val_fraction=0.3)
+    monkeypatch.setenv('ATOMIZER_LOG_PATH', '')
+
+    atomizer = Atomizer(mode='model', model_path=str(model_path), min_confidence=0.01)
+    decision = atomizer.classify('eth price')
+    assert decision['atomic'] is True
+    assert decision['confidence'] is not None
+
+
+def test_log_rows_are_marked_predicted(tmp_path, monkeypatch):
+    log_path = tmp_path / 'atomizer_log.jsonl'
+    monkeypatch.setenv('ATOMIZER_LOG_PATH', str(log_path))
+    monkeypatch.setenv('ATOMIZER_LOG_BATCH', '2')
+    atomizer = Atomizer(mode='keyword')
+
+    atomizer.log('btc price', True, route='coingecko')
+    assert not log_path.exists()  # buffered until the batch fills
+    atomizer.log('analyze eth', False, route='research', subtask_count=3)  # no event loop: written inline
+
+    rows = [json.loads(line) for line in log_path.read_text(encoding='utf-8').splitlines()]
+    assert [r['query'] for r in rows] == ['btc price', 'analyze eth']
+    assert all(r['label_source'] == 'predicted' and 'atomic' not in r for r in rows)
+    assert _read_examples(str(log_path)) == []
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from roma_agents.atomizer import keyword_is_atomic
+from roma_agents.comparison import compare, top_n
+from roma_agents.crypto_roma_agent import CryptoROMAAgent
+
+QUOTES = {
+    'bitcoin': {'price': 60000.0, 'change_24h': 1.0, 'market_cap': 1.2e12, 'volume': 3.0e10},
+    'ethereum': {'price': 3000.0, 'change_24h': 4.0, 'market_cap': 3.6e11, 'volume': 2.0e10},
+    'solana': {'price': 150.0, 'change_24h': -2.0, 'market_cap': 7.0e10, 'volume': 4.0e10},
+}
+
+
+def test_compare_ranks_each_metric():
+    result = compare(QUOTES)
+    assert result['success']
+    assert result['coins'] == ['bitcoin', 'ethereum', 'solana']  # by market cap
+    rows = {row['coin']: row for row in result['table']}
+    assert rows['ethereum']['ranks'] == {'change_24h': 1, 'market_cap': 2, 'volume': 3}
+    assert rows['solana']['ranks'] == {'change_24h': 3, 'market_cap': 3, 'volume': 1}
+    assert result['leaders'] == {'change_24h': 'ethereum', 'market_cap': 'bitcoin', 'volume': 'solana', 'overall': 'bitcoin'}
+    assert sum(row['mcap_share'] for row in result['table']) == pytest.approx(1.0)
+    assert rows['solana']['turnover'] == pytest.approx(4.0e10 / 7.0e10)
+    assert result['change_spread'] == pytest.approx(6.0)
+
+
+def test_compare_needs_two_priced_coins():
+    assert not compare({'bitcoin': QUOTES['bitcoin'], 'ghost': {'price': 0}})['success']
+
+
+def test_top_n_only_for_rankings_of_coins():
+    assert top_n('top 5 coins', 10) == 5
+    assert top_n('best coins to buy', 10) == 10
+    assert top_n('top news today', 10) is None
+    assert top_n('best wallet for bitcoin', 10) is None
+
+
+class FakeAPI:
+    """Just enough of APIIntegrations for the comparison path, no network"""
+
+    def __init__(self, coin_ids):
+        self.coin_ids = coin_ids
+        self.price_calls = 0
+
+    async def route_query(self, query):
+        return {'success': True, 'api': 'coingecko', 'entities': {'coin_ids': self.coin_ids}}
+
+    async def get_coingecko_prices(self, coin_ids):
+        self.price_calls += 1
+        return {'success': True, 'prices': {c: QUOTES[c] for c in coin_ids if c in QUOTES}}
+
+    async def analyze_with_openai(self, data, prompt):
+        return {'success': False}
+
+
+@pytest.mark.parametrize('query, coin_ids', [
+    ('btc vs eth', ['bitcoin', 'ethereum']),
+    ('bitcoin versus ethereum', ['bitcoin', 'ethereum']),
+    ('eth vs sol price', ['ethereum', 'solana']),
+])
+def test_vs_queries_reach_the_comparison_engine(query, coin_ids):
+    assert keyword_is_atomic(query)[0]  # the atomizer alone would execute these as one coin
+    agent = CryptoROMAAgent()
+    agent.api_integrations = agent.comparison.api_integrations = FakeAPI(coin_ids)
+
+    result = asyncio.run(agent.solve({'query': query, 'type': 'research'}))
+    assert result['success']
+    assert result['api'] == 'ROMA Comparison'
+    assert result['data']['comparison']['coins'] == [c for c in QUOTES if c in coin_ids]
+    assert agent.api_integrations.price_calls == 1
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from roma_agents.market_series import DAY, HOUR, daily_closes, hourly_rows, indicators
+
+T0 = 1_700_000_000 // DAY * DAY  # midnight UTC
+
+
+def _rows(prices):
+    rows = np.zeros((len(prices), 4))
+    rows[:, 0] = T0 + np.arange(len(prices)) * HOUR
+    rows[:, 1] = prices
+    return rows
+
+
+def test_hourly_rows_keeps_last_sample_per_hour():
+    ms = lambda seconds: (T0 + seconds) * 1000
+    chart = {
+        # Unsorted, three samples in the first hour, one in the second
+        'prices': [[ms(3900), 12.0], [ms(600), 10.0], [ms(3000), 11.0], [ms(0), 9.0]],
+        'market_caps': [[ms(0), 90.0], [ms(600), 100.0], [ms(3000), 110.0], [ms(3900), 120.0]],
+        'total_volumes': [[ms(0), 1.0], [ms(600), 2.0], [ms(3000), 3.0], [ms(3900), 4.0]],
+    }
+    rows = hourly_rows(chart)
+    assert rows.shape == (2, 4)
+    np.testing.assert_array_equal(rows[:, 0], [T0 + 3000, T0 + 3900])
+    np.testing.assert_array_equal(rows[:, 1:], [[11.0, 110.0, 3.0], [12.0, 120.0, 4.0]])
+    assert len(np.unique(np.floor(rows[:, 0] / HOUR))) == len(rows)
+
+
+def test_hourly_rows_empty_chart():
+    assert hourly_rows({}).shape == (0, 4)
+
+
+def test_indicators_returns_and_drawdown():
+    # 40 days: +1 per hour up to a peak of 200, then a slide to 150
+    rising = 100.0 + np.arange(101)
+    falling = np.linspace(200.0, 150.0, 40 * 24 - 101 + 1)[1:]
+    rows = _rows(np.concatenate([rising, falling]))
+    prices = rows[:, 1]
+
+    result = indicators(rows)
+    assert result['price'] == pytest.approx(150.0)
+    assert result['return_1d'] == pytest.approx(prices[-1] / prices[-25] - 1)
+    assert result['return_7d'] == pytest.approx(prices[-1] / prices[-1 - 7 * 24] - 1)
+    assert result['return_30d'] == pytest.approx(prices[-1] / prices[-1 - 30 * 24] - 1)
+    assert 'return_90d' not in result  # not enough history
+    assert result['max_drawdown'] == pytest.approx(150.0 / 200.0 - 1)
+    assert result['drawdown'] == pytest.approx(150.0 / 200.0 - 1)
+
+    closes = daily_closes(rows)
+    assert len(closes) == 40
+    assert result['sma_7'] == pytest.approx(closes[-7:].mean())
+    assert result['trend'] == 'down'
+    assert result['volatility_30d'] > 0
+
+
+def test_indicators_flat_series_has_no_drawdown():
+    result = indicators(_rows(np.full(48, 50.0)))
+    assert result['return_1d'] == pytest.approx(0.0)
+    assert result['max_drawdown'] == 0.0
+    assert indicators(_rows([50.0])) == {}
@@ -0,0 +1,72 @@
+import time
+from email.utils import formatdate
+
+import pytest
+
+from roma_agents.news_clusters import NewsClusterIndex, published_ts
+
+NOW = time.time()
+
+
+def _entry(title, link, hours_ago=0.0):
+    return {'title': title, 'link': link, 'published': formatdate(NOW - hours_ago * 3600)}
+
+
+def test_reworded_headline_joins_the_story():
+    index = NewsClusterIndex()
+    index.add([_entry('SEC approves spot Ether ETFs', 'a1', 2)], 'coindesk.com')
+    index.add([_entry("Ethereum's Dencun upgrade goes live on mainnet", 'a2', 2)], 'coindesk.com')
+    index.add([_entry('SEC approves spot Ether ETFs in landmark decision', 'b1', 1)], 'decrypt.co')
+    index.add([_entry('Ethereum Dencun upgrade is live on mainnet', 'b2', 1)], 'decrypt.co')
+
+    stories = list(index.stories())
+    assert len(stories) == 2
+    assert all(story['sources'] == ['coindesk.com', 'decrypt.co'] for story in stories)
+    assert index.get_stats()['merged'] == 2
+
+
+@pytest.mark.parametrize('first, second', [
+    ('ETF sees record outflows', 'ETF sees record inflows'),
+    ('Binance CEO steps down', 'Coinbase CEO steps down'),
+])
+def test_one_word_difference_stays_separate(first, second):
+    index = NewsClusterIndex()
+    index.add([_entry(first, 'a')], 'coindesk.com')
+    index.add([_entry(second, 'b')], 'cointelegraph.com')
+    assert len(index.clusters) == 2
+
+
+def test_merge_refreshes_representative_and_order():
+    index = NewsClusterIndex(capacity=2)
+    index.add([_entry('Solana outage halts block production', 's1', 3)], 'a.com')
+    index.add([_entry('Fed holds rates steady', 'f1', 2)], 'a.com')
+    index.add([_entry('Solana outage halts block production for hours', 's2', 1)], 'b.com')
+    index.add([_entry('Ripple wins case against SEC', 'r1', 0)], 'a.com')
+
+    # The Fed story was the least recently active, so capacity evicted it
+    titles = [story['title'] for story in index.stories()]
+    assert titles == ['Ripple wins case against SEC', 'Solana outage halts block production for hours']
+    assert list(index.stories())[-1]['published_ts'] == pytest.approx(NOW - 3600, abs=1)
+
+
+def test_recency_window_keeps_old_stories_apart():
+    index = NewsClusterIndex()
+    index.add([_entry('Bitcoin halving is here', 'h1', 100)], 'a.com')
+    index.add([_entry('Bitcoin halving is here', 'h2', 0)], 'b.com')
+    assert len(index.clusters) == 2
+
+
+def test_published_ts_parses_rss_and_atom_dates():
+    expected = 1718447400.0  # 2024-06-15T10:30:00Z
+    assert published_ts('Sat, 15 Jun 2024 10:30:00 +0000', 0) == expected
+    assert published_ts('2024-06-15T10:30:00Z', 0) == expected
+    assert published_ts('2024-06-15T12:30:00+02:00', 0) == expected
+    assert published_ts('2024-06-15 10:30:00', 0) == expected  # naive = UTC
+    assert published_ts('not a date', 42.0) == 42.0
+    assert published_ts('', 42.0) == 42.0
+
+
+def test_parsed_timestamp_wins_over_the_string():
+    index = NewsClusterIndex()
+    index.add([{'title': 'Atom entry', 'link': 'x', 'published': '', 'published_ts': 1718447400.0}], 'a.com')
+    assert next(index.stories())['published_ts'] == 1718447400.0
@@ -1,14 +1,12 @@
+import time
+_BOOT_STARTED = time.perf_counter()  # startup phases are reported relative to this
+
 import asyncio
-import json
 import websockets
 import os
 import sys
+import uuid
 from pathlib import Path
-import locale
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()  # Load API keys from .env
 
 # Fix Windows console encoding for Vietnamese characters
 import builtins
@@ -36,9 +34,25 @@ builtins.print = safe_print
 # Add parent directory to path to import roma_agents
 sys.path.append(str(Path(__file__).parent))
 
+# Load environment variables from .env file (once, before any module reads os.getenv)
+from roma_agents import providers
+providers.load_env()
+
 # Import ROMA Framework (REQUIRED)
 from roma_agents.crypto_roma_agent import CryptoROMAAgent
 from roma_agents.api_integrations import APIIntegrations
+from roma_agents.loop_monitor import LoopMonitor
+from roma_agents import wire_codec
+from roma_agents.price_feed import PriceSubscriptionHub
+from roma_agents.feed_scheduler import FeedScheduler
+from roma_agents.broadcaster import Broadcaster
+from roma_agents.image_jobs import ImageJobQueue
+from roma_agents.warm_cache import WarmCacheSnapshot, TTLCache
+from roma_agents.admission import AdmissionController, classify_priority
+from roma_agents.single_flight import SingleFlight
+from roma_agents.warm_cache import normalize_key
+from roma_agents.task_dag import RequestMemo
+_IMPORTS_DONE = time.perf_counter()
 
 print("="*60)
 print("[INIT] 🚀 ROMA Framework ACTIVE")
@@ -48,9 +62,26 @@ print("[INIT] 🔄 Recursive Open Meta-Agent v0.2")
 print("[INIT] 👨‍💻 Author: @trungkts29 (https://x.com/trungkts29)")
 print("="*60)
 USE_ROMA = True
+# Railway terminates TLS in a proxy that appends the real client to X-Forwarded-For; set 0 when exposed directly
+ADMISSION_TRUST_PROXY = os.getenv('ADMISSION_TRUST_PROXY', '1').lower() not in ('0', 'false', 'no')
+
+def _current_rss_bytes():
+    """Resident memory of this process (Linux /proc, falls back to peak RSS)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        return 0
 
 class ResearchWebSocketServer:
-    def __init__(self, host=None, port=None):
+    def __init__(self, host=None, port=None, preflight=None):
+        init_started = time.perf_counter()
         # Railway provides PORT env variable, defaults to 5001 for local dev
         self.host = host or os.getenv('HOST', '0.0.0.0')
         self.port = port or int(os.getenv('PORT', 5001))
@@ -68,32 +99,185 @@ class ResearchWebSocketServer:
             print("[INIT] Using direct API integrations")
         
         self.connected_clients = set()
+        self.started_at = time.time()
+        self.requests_handled = 0
+        self.loop_monitor = LoopMonitor()
+        self.admission = AdmissionController()
+        self.single_flight = SingleFlight()
+        # Per-request subtask results, so a retry only re-runs failed nodes (memory only, not snapshotted)
+        self.checkpoints = TTLCache('checkpoints', float(os.getenv('CHECKPOINT_TTL', 300)))
+        self.broadcaster = Broadcaster()
+        self.price_hub = PriceSubscriptionHub(self.api_integrations, self.broadcaster)
+        # Background news polling: get_rss_news reads clustered stories instead of fetching per request
+        self.feed_scheduler = FeedScheduler(self.api_integrations.ingest_feed)
+        self.api_integrations.feed_scheduler = self.feed_scheduler
+        self.image_jobs = ImageJobQueue(
+            self.api_integrations,
+            self.broadcaster,
+            image_cache=self.roma_agent.image_cache if self.roma_agent else None
+        )
+        if self.roma_agent:
+            self.roma_agent.image_jobs = self.image_jobs
+            self.roma_agent.comparison.snapshot = self.price_hub.last_prices  # fresh live quotes skip the fetch
+        
+        # Snapshot caches to disk so a redeploy starts warm
+        self.warm_cache = WarmCacheSnapshot()
+        for cache in (self.api_integrations.price_cache, self.api_integrations.news_cache, self.api_integrations.coin_index):
+            self.warm_cache.register_cache(cache)
+        if self.roma_agent:
+            self.warm_cache.register_cache(self.roma_agent.plan_cache)
+            self.warm_cache.register_cache(self.roma_agent.answer_cache)
+        self.warm_cache.register_table('price_feed', self.price_hub.export_prices, self.price_hub.restore_prices)
+        
+        # Preflight: load providers, restore caches, resolve upstreams before accepting traffic
+        self.preflight_enabled = preflight if preflight is not None else os.getenv('PREFLIGHT', '').lower() in ('1', 'true', 'yes')
+        self.startup = {
+            'imports_ms': round((_IMPORTS_DONE - _BOOT_STARTED) * 1000, 1),
+            'init_ms': round((time.perf_counter() - init_started) * 1000, 1)
+        }
+    
+    def get_stats(self):
+        """Server state snapshot for monitoring and load tests"""
+        return {
+            'type': 'stats',
+            'uptime': time.time() - self.started_at,
+            'connected_clients': len(self.connected_clients),
+            'requests_handled': self.requests_handled,
+            'conversation_users': len(self.conversation_history),
+            'conversation_messages': sum(len(h) for h in self.conversation_history.values()),
+            'rss_bytes': _current_rss_bytes(),
+            'pending_tasks': len(asyncio.all_tasks()),
+            'loop': self.loop_monitor.get_stats(),
+            'admission': self.admission.get_stats(),
+            'single_flight': self.single_flight.get_stats(),
+            'checkpoints': self.checkpoints.get_stats(),
+            'price_feed': self.price_hub.get_stats(),
+            'broadcast': self.broadcaster.get_stats(),
+            'image_jobs': self.image_jobs.get_stats(),
+            'image_cache': self.roma_agent.image_cache.get_stats() if self.roma_agent else None,
+            'knowledge': self.roma_agent.knowledge.get_stats() if self.roma_agent else None,
+            'market_series': self.roma_agent.market_series.get_stats() if self.roma_agent else None,
+            'comparison': self.roma_agent.comparison.get_stats() if self.roma_agent else None,
+            'synthesis': self.roma_agent.synthesizer.get_stats() if self.roma_agent else None,
+            'routing_batch': self.api_integrations.batch_router.get_stats() if self.api_integrations.batch_router else None,
+            'tokens': self.api_integrations.token_usage.get_stats(),
+            'llm': self.api_integrations.llm.get_stats(),
+            'headlines': self.api_integrations.headline_scorer.get_stats(),
+            'news_clusters': self.api_integrations.news_clusters.get_stats(),
+            'feeds': self.feed_scheduler.get_stats(),
+            'warm_cache': self.warm_cache.get_stats(),
+            'startup': self.startup,
+            'providers': providers.get_stats()
+        }
+    
+    async def send(self, websocket, message):
+        """Send a message using the encoding negotiated for this connection"""
+        await websocket.send(wire_codec.encode(message, websocket.subprotocol))
+    
+    @staticmethod
+    def _client_key(websocket) -> str:
+        """Admission key: the client address, so limits survive reconnects (the 'user' field is client-supplied and shared).
+        Behind Railway's proxy that's the last X-Forwarded-For hop, the one the proxy itself appended"""
+        request = getattr(websocket, 'request', None)
+        forwarded = request.headers.get('X-Forwarded-For', '') if request is not None and ADMISSION_TRUST_PROXY else ''
+        if forwarded.strip():
+            return f"ip-{forwarded.split(',')[-1].strip()}"
+        address = websocket.remote_address
+        return f"ip-{address[0] if address else 'unknown'}"
+    
+    async def _reply(self, websocket, ref, message):
+        """send() a direct reply, echoing the client's 'ref' so it can match replies to requests"""
+        await self.send(websocket, message if ref is None else {**message, 'ref': ref})
+    
+    def broadcast(self, message, recipients=None, coalesce_key=None):
+        """Push a message to connected clients through their bounded send queues"""
+        return self.broadcaster.broadcast(message, recipients, coalesce_key)
     
     async def register_client(self, websocket):
         """Register a new client"""
         self.connected_clients.add(websocket)
+        self.broadcaster.register(websocket)
         print(f"Client connected. Total clients: {len(self.connected_clients)}")
         
     async def unregister_client(self, websocket):
         """Unregister a client"""
         self.connected_clients.discard(websocket)
+        self.price_hub.unsubscribe(websocket)
+        self.image_jobs.cancel_client(websocket)
+        self.broadcaster.unregister(websocket)
         print(f"Client disconnected. Total clients: {len(self.connected_clients)}")
     
     async def handle_message(self, websocket, message_data):
         """Handle incoming messages from clients"""
+        ref = message_data.get('ref') if isinstance(message_data, dict) else None  # client correlation id, echoed on replies
         try:
             message_type = message_data.get('type')
             tool = message_data.get('tool')
             content = message_data.get('content')
-            user = message_data.get('user')
+            user = str(message_data.get('user') or 'default')  # one id for history, checkpoints and retry checks
             
+            if message_type == 'stats':
+                await self._reply(websocket, ref, self.get_stats())
+                return
+            if message_type in ('subscribe', 'unsubscribe'):
+                coins = self.price_hub.parse_coins(message_data.get('coins'))
+                if coins is None:
+                    await self._reply(websocket, ref, {
+                        'type': 'error',
+                        'content': '"coins" phải là danh sách id coin, ví dụ ["bitcoin", "ethereum"].',
+                        'sender': 'ai',
+                        'has_error': True
+                    })
+                elif message_type == 'subscribe':
+                    await self._reply(websocket, ref, await self.price_hub.subscribe(websocket, coins))
+                else:
+                    await self._reply(websocket, ref, self.price_hub.unsubscribe(websocket, coins))
+                return
+            
+            self.requests_handled += 1
             print(f"Processing request - Tool: {tool}, User: {user[:8]}...")
             
+            # Retry of an earlier research request: resume from its checkpoint
+            checkpoint = None
+            if message_type == 'retry':
+                request_id = message_data.get('request_id') or ''
+                checkpoint = self.checkpoints.get(request_id) if USE_ROMA and self.roma_agent else None
+                if checkpoint is None or user not in checkpoint['users']:
+                    await self._reply(websocket, ref, {
+                        'type': 'error',
+                        'content': 'Yêu cầu đã hết hạn, vui lòng gửi lại câu hỏi.',
+                        'request_id': request_id,
+                        'sender': 'ai',
+                        'has_error': True,
+                        'retry_available': False
+                    })
+                    return
+                tool, content = 'research', checkpoint['query']
+            
             # Process based on tool selection (only research tool now)
             if tool == 'research':
+                # Admission control: cheap work first, fast 'busy' instead of piling up ROMA trees
+                decision = await self.admission.acquire(
+                    self._client_key(websocket), classify_priority(content or ''), label=user
+                )
+                if not decision['admitted']:
+                    await self._reply(websocket, ref, {
+                        'type': 'busy',
+                        'content': f"Server đang bận, vui lòng thử lại sau {decision['retry_after']:.0f}s.",
+                        'reason': decision['reason'],
+                        'priority': decision['priority'],
+                        'retry_after': decision['retry_after'],
+                        'sender': 'ai'
+                    })
+                    return
+                
                 # Smart research with API integration + context
-                user_id = message_data.get('user', 'default')
-                response = await self._handle_research_request(content, user_id)
+                try:
+                    response = await self._handle_research_request(
+                        content, user, websocket, degraded=decision['degraded'], checkpoint=checkpoint
+                    )
+                finally:
+                    self.admission.release(decision)
             else:
                 response = {
                     'type': 'error',
@@ -102,7 +286,7 @@ class ResearchWebSocketServer:
                 }
             
             # Send response back to client
-            await websocket.send(json.dumps(response))
+            await self._reply(websocket, ref, response)
             print(f"Response sent for tool: {tool}")
             
         except Exception as e:
@@ -112,7 +296,7 @@ class ResearchWebSocketServer:
                 'content': f'Lỗi xử lý: {str(e)}',
                 'sender': 'ai'
             }
-            await websocket.send(json.dumps(error_response))
+            await self._reply(websocket, ref, error_response)
     
     async def handle_client(self, websocket):
         """Handle individual client connections"""
@@ -121,15 +305,16 @@ class ResearchWebSocketServer:
         try:
             async for message in websocket:
                 try:
-                    message_data = json.loads(message)
-                    await self.handle_message(websocket, message_data)
-                except json.JSONDecodeError:
+                    message_data = wire_codec.decode(message)
+                except ValueError:
                     error_response = {
                         'type': 'error',
-                        'content': 'Invalid JSON format',
+                        'content': 'Invalid message format',
                         'sender': 'ai'
                     }
-                    await websocket.send(json.dumps(error_response))
+                    await self.send(websocket, error_response)
+                    continue
+                await self.handle_message(websocket, message_data)
                     
         except websockets.exceptions.ConnectionClosed:
             print("Connection closed by client")
@@ -138,8 +323,24 @@ class ResearchWebSocketServer:
         finally:
             await self.unregister_client(websocket)
 
-    async def _handle_research_request(self, query: str, user_id: str = 'default'):
+    async def _solve_checkpointed(self, task):
+        """Run ROMA solve and checkpoint its successful subtask results under the request id"""
+        memo = task.setdefault('memo', RequestMemo())
+        result = await self.roma_agent.solve(task)
+        failed = memo.failed_nodes() + (0 if result.get('success') else 1)
+        self.checkpoints.put(task['request_id'], {
+            'request_id': task['request_id'],
+            'query': task['query'],
+            'users': {task['user']},
+            'results': memo.checkpoint()
+        })
+        if memo.replayed:
+            print(f"[CHECKPOINT] {task['request_id']}: replayed {memo.replayed}, re-ran {memo.misses} call(s)")
+        return {**result, 'request_id': task['request_id'], 'failed_nodes': failed}
+    
+    async def _handle_research_request(self, query: str, user_id: str = 'default', websocket=None, degraded: bool = False, checkpoint=None):
         """Handle research requests using ROMA Framework or direct API routing"""
+        request_id = None
         try:
             # Get conversation history for context
             if user_id not in self.conversation_history:
@@ -149,7 +350,7 @@ class ResearchWebSocketServer:
             
             # Add context to query if pronouns detected
             enhanced_query = query
-            if any(word in query.lower() for word in ['it', 'that', 'this', 'them', 'those', 'no', 'nó', 'đó', 'này']):
+            if checkpoint is None and any(word in query.lower() for word in ['it', 'that', 'this', 'them', 'those', 'no', 'nó', 'đó', 'này']):
                 # Use OpenAI to resolve pronoun with context
                 if history:
                     last_coins = [msg.get('coin') for msg in history[-3:] if msg.get('coin')]
@@ -162,14 +363,39 @@ class ResearchWebSocketServer:
                 print(f"[ROMA] Processing query: {enhanced_query[:50]}...")
                 
                 # Create ROMA task
+                request_id = checkpoint['request_id'] if checkpoint else uuid.uuid4().hex[:12]
                 task = {
                     'query': enhanced_query,
                     'type': 'research',
-                    'history': history[-5:] if history else []  # Last 5 messages
+                    'history': history[-5:] if history else [],  # Last 5 messages
+                    'user': user_id,
+                    'client': websocket,  # Lets long-running work (images) stream results back
+                    'degraded': degraded,  # Under load: single atomic step, no planner
+                    'request_id': request_id
                 }
                 
-                # Use ROMA's solve() method
-                result = await self.roma_agent.solve(task)
+                # Use ROMA's solve() method; identical concurrent queries share one solve.
+                # Image requests stay per-user (the job, quota and push target belong to this client),
+                # retries resume from their own checkpoint. classify_priority is only a guess, so shared
+                # solves never get a client: an image the router still sends to fal.ai is generated
+                # inline and shared, instead of queued against the leader's connection and quota.
+                if checkpoint:
+                    print(f"[CHECKPOINT] Retrying {request_id} with {len(checkpoint['results'])} saved result(s)")
+                    task['memo'] = RequestMemo(seed=checkpoint['results'])
+                    result = await self._solve_checkpointed(task)
+                elif classify_priority(enhanced_query) == 'image':
+                    result = await self._solve_checkpointed(task)
+                else:
+                    flight_key = f"{normalize_key(enhanced_query)}|degraded={degraded}"
+                    shared_task = {**task, 'client': None}
+                    result, role = await self.single_flight.run(flight_key, lambda: self._solve_checkpointed(shared_task))
+                    if role != 'leader':
+                        print(f"[SINGLE-FLIGHT] {role} result for: {enhanced_query[:50]}")
+                        # Followers share the leader's checkpoint
+                        shared = self.checkpoints.get(result['request_id'])
+                        if shared is not None:
+                            shared['users'].add(user_id)
+                request_id = result.get('request_id', request_id)
                 
                 if result['success']:
                     data = result.get('data', {})
@@ -239,10 +465,19 @@ class ResearchWebSocketServer:
                         'sender': 'ai',
                         'api_source': api_source,
                         'has_error': False,
-                        'retry_available': False,
+                        'retry_available': result.get('failed_nodes', 0) > 0,
+                        'request_id': request_id,
                         'roma_powered': True
                     }
                     
+                    # Structured comparison table alongside the rendered markdown
+                    if data.get('comparison'):
+                        response['comparison'] = data['comparison']['table']
+                    
+                    # Background image job: the image arrives later as its own message
+                    if data.get('job_id'):
+                        response['job_id'] = data['job_id']
+                    
                     # Add image_url if generated
                     if image_url:
                         response['image_url'] = image_url
@@ -258,7 +493,8 @@ class ResearchWebSocketServer:
                         'sender': 'ai',
                         'api_source': 'ROMA',
                         'has_error': True,
-                        'retry_available': True
+                        'retry_available': True,
+                        'request_id': request_id
                     }
             
             # Fallback to direct API routing
@@ -640,22 +876,71 @@ class ResearchWebSocketServer:
                 'sender': 'ai'
             }
 
+    async def preflight(self):
+        """Warm providers and caches; safe to run before serve() or standalone (--preflight-only)"""
+        timings = await providers.preflight(
+            warm_cache=self.warm_cache,
+            knowledge=self.roma_agent.knowledge if self.roma_agent else None,
+            gemini_api_key=self.api_integrations.gemini_api_key
+        )
+        self.startup['preflight_ms'] = {k: round(v, 1) for k, v in timings.items()}
+    
     async def start(self):
         """Start the WebSocket server"""
+        if self.preflight_enabled:
+            await self.preflight()
+        self.loop_monitor.start()
+        self.warm_cache.start()
+        self.feed_scheduler.start()
+        
+        # Railway stops containers with SIGTERM: exit the serve loop so the final snapshot is written
+        stop = asyncio.get_running_loop().create_future()
+        try:
+            import signal
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: stop.done() or stop.set_result(None))
+        except (NotImplementedError, AttributeError):
+            pass  # Windows: Ctrl+C only
+        
+        extensions = wire_codec.deflate_extensions()
         async with websockets.serve(
             self.handle_client, 
             self.host, 
             self.port,
             # Allow connections from any origin (for development)
-            origins=None  # Accept all origins in development
+            origins=None,  # Accept all origins in development
+            # Clients opt into compact msgpack frames via subprotocol; no subprotocol = JSON
+            subprotocols=wire_codec.supported_subprotocols(),
+            select_subprotocol=wire_codec.select_subprotocol,
+            compression=None,
+            extensions=extensions,
+            # Transport write-buffer high-water mark: send() waits above this, queues absorb the rest
+            write_limit=int(os.getenv('WS_WRITE_LIMIT', 64 * 1024))
         ):
             print(f"WebSocket server started on ws://{self.host}:{self.port}")
+            print(f"[CONFIG] Subprotocols: {wire_codec.supported_subprotocols()} | permessage-deflate: {'on' if extensions else 'off'}")
+            self.startup['ready_ms'] = round((time.perf_counter() - _BOOT_STARTED) * 1000, 1)
+            print(f"[STARTUP] imports {self.startup['imports_ms']:.0f}ms | init {self.startup['init_ms']:.0f}ms | ready after {self.startup['ready_ms']:.0f}ms")
             print("Waiting for connections...")
-            await asyncio.Future()  # run forever
+            try:
+                await stop  # run until SIGTERM / Ctrl+C
+            finally:
+                self.feed_scheduler.stop()
+                self.warm_cache.stop()
+                self.loop_monitor.stop()
+                if self.roma_agent:
+                    await self.roma_agent.atomizer.flush()
+                    await self.roma_agent.image_cache.flush()
 
 # Start WebSocket server
 if __name__ == "__main__":
-    server = ResearchWebSocketServer()
+    # --preflight: warm up before serving; --preflight-only: warm up and exit (build step / import profiling)
+    preflight_only = '--preflight-only' in sys.argv
+    server = ResearchWebSocketServer(preflight=True if '--preflight' in sys.argv or preflight_only else None)
+    
+    if preflight_only:
+        asyncio.run(server.preflight())
+        print(f"[STARTUP] {server.startup}")
+        sys.exit(0)
     
     try:
         asyncio.run(server.start())